@@ -1,61 +1,61 @@
 from flask import Flask, jsonify
 from opentelemetry import trace
 from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry.instrumentation.prometheus import PrometheusMetrics
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.exporter.prometheus import PrometheusMetricsExporter
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.jaeger import JaegerExporter
-import psutil
 import time
-from prometheus_client import start_http_server, Gauge
+from prometheus_client import Histogram
 import sybpydb
 
+from lib.bootstrap import setup_telemetry
+from lib.exemplars import trace_exemplar
+from lib.flaskpool import init_db_pool
+from lib.promsampler import init_metrics, start_cached_http_server
+
 # Initialize Flask App
 app = Flask(__name__)
 
-# Set up tracing
-trace.set_tracer_provider(TracerProvider())
+# Set up tracing to Jaeger and metrics on the Prometheus endpoint
+telemetry = setup_telemetry(service_name="flask_app", traces="jaeger", metrics="prometheus", logs=None)
 tracer = trace.get_tracer(__name__)
 
 # Instrument Flask with OpenTelemetry
 FlaskInstrumentor().instrument_app(app)
 
-# Configure Prometheus metrics exporter
-metrics_exporter = PrometheusMetricsExporter()
-PrometheusMetrics(app, exporter=metrics_exporter)
+# Query latency; each bucket keeps the latest query's trace ID as an exemplar,
+# exposed when Prometheus scrapes in OpenMetrics format
+query_latency_metric = Histogram(
+    'flask_app_query_duration_seconds',
+    'Latency of the check_db sample query',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
 
-# Custom metrics for CPU and Memory
-cpu_metric = Gauge('flask_app_cpu_usage', 'CPU usage of Flask app')
-memory_metric = Gauge('flask_app_memory_usage', 'Memory usage of Flask app')
+# CPU and memory gauges are sampled on a background thread; /metrics serves the last encoded exposition
+METRICS_SAMPLE_INTERVAL = 5  # seconds
+exposition, sampler = init_metrics(app, interval=METRICS_SAMPLE_INTERVAL)
 
-# Configure Jaeger exporter
-jaeger_exporter = JaegerExporter(agent_host_name="localhost", agent_port=6831)
-span_processor = BatchSpanProcessor(jaeger_exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
+# Sybase connection for /check_db
+DB_DSN = "server_name=my_server;database=my_db;chainxacts=0"
+# Requests share pooled logins; a load balancer probing every second costs a query, not a login
+db_pool = init_db_pool(app, lambda: sybpydb.connect(dsn=DB_DSN), sampler)
 
 @app.route("/check_db", methods=["GET"])
 def check_db():
     with tracer.start_as_current_span("check_db_connection"):
         try:
-            conn = sybpydb.connect(dsn="server_name=my_server;database=my_db;chainxacts=0")
-            with tracer.start_as_current_span("run_sample_query"):
+            conn = db_pool.connection()  # Returned to the pool when the request ends
+            with tracer.start_as_current_span("run_sample_query") as span:
+                start_time = time.perf_counter()
                 cursor = conn.cursor()
                 cursor.execute("SELECT COUNT(*) FROM my_table")  # Example query
                 result = cursor.fetchone()
+                cursor.close()
+                query_latency_metric.observe(time.perf_counter() - start_time, exemplar=trace_exemplar(span))
+                exposition.invalidate()
                 return jsonify({"status": "Connected", "query_result": result[0]}), 200
         except Exception as e:
+            db_pool.discard()  # The connection may be broken; log in afresh next time
             trace.get_current_span().record_exception(e)
             return jsonify({"status": "Connection failed", "error": str(e)}), 500
 
-@app.route("/metrics")
-def metrics():
-    # Record system metrics
-    cpu_metric.set(psutil.cpu_percent())
-    memory_metric.set(psutil.virtual_memory().percent)
-    return jsonify({"status": "Metrics recorded"}), 200
-
 if __name__ == "__main__":
-    start_http_server(8000)  # Start Prometheus client
+    start_cached_http_server(exposition, 8000)  # Prometheus scrape endpoint
     app.run(host="0.0.0.0", port=5000)
@@ -6,9 +6,10 @@ from opentelemetry.exporter.prometheus import PrometheusMetricsExporter
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.exporter.jaeger import JaegerExporter
-import psutil
 import pyodbc
-from prometheus_client import start_http_server, Gauge
+
+from lib.flaskpool import init_db_pool
+from lib.promsampler import init_metrics, start_cached_http_server
 
 # Initialize Flask App
 app = Flask(__name__)
@@ -20,9 +21,9 @@ tracer = trace.get_tracer(__name__)
 # Instrument Flask with OpenTelemetry
 FlaskInstrumentor().instrument_app(app)
 
-# Prometheus custom metrics
-cpu_metric = Gauge('flask_app_cpu_usage', 'CPU usage of Flask app')
-memory_metric = Gauge('flask_app_memory_usage', 'Memory usage of Flask app')
+# CPU and memory gauges are sampled on a background thread; /metrics serves the last encoded exposition
+METRICS_SAMPLE_INTERVAL = 5  # seconds
+exposition, sampler = init_metrics(app, interval=METRICS_SAMPLE_INTERVAL)
 
 # Configure Jaeger exporter for traces
 jaeger_exporter = JaegerExporter(agent_host_name="localhost", agent_port=6831)
@@ -49,27 +50,25 @@ def get_db_connection():
     )
     return pyodbc.connect(conn_str)
 
+# Requests share pooled logins; a load balancer probing every second costs a query, not a login
+db_pool = init_db_pool(app, get_db_connection, sampler)
+
 @app.route("/check_db", methods=["GET"])
 def check_db():
     with tracer.start_as_current_span("check_db_connection"):
         try:
-            conn = get_db_connection()
+            conn = db_pool.connection()  # Returned to the pool when the request ends
             with tracer.start_as_current_span("run_sample_query"):
                 cursor = conn.cursor()
                 cursor.execute("SELECT COUNT(*) FROM my_table")  # Example query
                 result = cursor.fetchone()
+                cursor.close()
                 return jsonify({"status": "Connected", "query_result": result[0]}), 200
         except Exception as e:
+            db_pool.discard()  # The connection may be broken; log in afresh next time
             trace.get_current_span().record_exception(e)
             return jsonify({"status": "Connection failed", "error": str(e)}), 500
 
-@app.route("/metrics")
-def metrics():
-    # Record system metrics
-    cpu_metric.set(psutil.cpu_percent())
-    memory_metric.set(psutil.virtual_memory().percent)
-    return jsonify({"status": "Metrics recorded"}), 200
-
 if __name__ == "__main__":
-    start_http_server(8000)  # Start Prometheus client
+    start_cached_http_server(exposition, 8000)  # Prometheus scrape endpoint
     app.run(host="0.0.0.0", port=5000)
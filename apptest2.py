@@ -1,41 +1,46 @@
 import sybpydb
 import time
-from opentelemetry import trace, metrics
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+from opentelemetry import trace
 import logging
 
-# Set up OpenTelemetry Resource
-resource = Resource(attributes={
-    "service.name": "sybase-query-app",
-    "service.instance.id": "instance-1",
-})
+from lib.bootstrap import setup_telemetry
+from lib.cardinality import CardinalityLimitedMeter
+from lib.fingerprint import StatementFingerprinter
+from lib.selfmon import AgentSelfMetrics
 
-# Tracer setup (for traces)
-trace.set_tracer_provider(TracerProvider(resource=resource))
-tracer = trace.get_tracer(__name__)
-
-# Set up OTLP Trace Exporter
-trace_exporter = OTLPSpanExporter(endpoint="http://otel-collector:4317", insecure=True)
-span_processor = BatchSpanProcessor(trace_exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
-
-# Metrics setup (for metrics)
-meter_provider = MeterProvider(resource=resource)
+# Query latencies run from sub-millisecond catalog lookups to multi-second
+# reports. Exponential histograms cover that range with at most 160 buckets per series.
+QUERY_LATENCY_VIEWS = [
+    {"instrument": "query_execution_time", "aggregation": "exponential", "max_size": 160, "max_scale": 20},
+    {"instrument": "query_time_to_first_row", "aggregation": "exponential", "max_size": 160, "max_scale": 20},
+]
 
-# Set up OTLP Metric Exporter
-metric_exporter = OTLPMetricExporter(endpoint="http://otel-collector:4317", insecure=True)
-metric_reader = PeriodicExportingMetricReader(metric_exporter, export_interval_millis=5000)
-meter_provider.add_metric_reader(metric_reader)
-metrics.set_meter_provider(meter_provider)
+# Set up OTLP traces and metrics; logs stay local
+telemetry = setup_telemetry(
+    service_name="sybase-query-app",
+    resource={"service.instance.id": "instance-1"},
+    endpoint="http://otel-collector:4317",
+    metric_interval_millis=5000,
+    logs=None,
+    # At most 50 query spans per second; of those, failed or slow ones and 10% of the rest
+    span_rate_limits={"execute_query": 50},
+    tail_sampling={"slow_threshold_ms": 500, "keep_ratio": 0.1},
+    # Histogram buckets carry their slowest query's trace as an exemplar
+    slowest_exemplars=True,
+    views=QUERY_LATENCY_VIEWS,
+    # Gzip OTLP requests; span batches grow with query load and shrink when the collector slows
+    compression="gzip",
+    batch_queue_size=8192,
+    export_tuning={"min_batch_size": 128, "max_batch_size": 2048, "target_latency_millis": 250},
+)
+tracer = trace.get_tracer(__name__)
+# Span queue depth and drops, plus the batch settings the export tuner chose
+self_metrics = AgentSelfMetrics(telemetry.meter_provider)
+self_metrics.watch_processor(telemetry.span_processor, "traces")
+self_metrics.watch_export_tuners(telemetry)
 
-# Metrics
-meter = metrics.get_meter(__name__)
+# Metrics, at most 500 attribute sets per instrument
+meter = CardinalityLimitedMeter(telemetry.meter, max_series=500)
 query_execution_count = meter.create_counter(
     name="query_execution_count",
     description="Count of Sybase queries executed",
@@ -46,9 +51,29 @@ query_execution_time = meter.create_histogram(
     description="Time taken to execute Sybase queries",
     unit="ms",
 )
+query_rows_fetched = meter.create_counter(
+    name="query_rows_fetched",
+    description="Rows fetched from Sybase query results",
+    unit="rows",
+)
+query_bytes_fetched = meter.create_counter(
+    name="query_bytes_fetched",
+    description="Approximate size of the fetched rows",
+    unit="bytes",
+)
+query_time_to_first_row = meter.create_histogram(
+    name="query_time_to_first_row",
+    description="Time from executing a Sybase query to its first row",
+    unit="ms",
+)
+
+# Rows per fetchmany() round trip when streaming results
+FETCH_ARRAYSIZE = 500
+
+# Normalized statements by query text; db.statement is capped at 1024 characters
+fingerprinter = StatementFingerprinter(max_entries=4096, max_length=1024)
 
 # Logging setup
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def connect_to_sybase(server: str, db: str, user: str, password: str):
@@ -68,30 +93,72 @@ def connect_to_sybase(server: str, db: str, user: str, password: str):
         logger.error(f"Failed to connect to Sybase server: {e}")
         raise
 
+def row_bytes(row) -> int:
+    """
+    Approximate the wire size of a row: text and binary by length, other values as 8 bytes.
+    """
+    size = 0
+    for value in row:
+        if isinstance(value, (str, bytes, bytearray)):
+            size += len(value)
+        elif value is not None:
+            size += 8
+    return size
+
+def stream_query(connection, query: str, arraysize: int = FETCH_ARRAYSIZE):
+    """
+    Execute a Sybase query and yield its rows, fetching arraysize rows at a time.
+
+    Only one chunk is held in memory. The span stays open until iteration
+    finishes or the generator is closed, so it covers the whole transfer.
+    """
+    fingerprint = fingerprinter.fingerprint(query)
+    attributes = {"db.statement.fingerprint": fingerprint.id, "db.operation": fingerprint.operation}
+    span = tracer.start_span("execute_query", attributes=dict(attributes, **{"db.statement": fingerprint.statement}))
+    # Measurements are taken in the span's context so they can carry its trace as an exemplar
+    span_context = trace.set_span_in_context(span)
+    start_time = time.time()
+    rows = 0
+    size = 0
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute(query)
+        chunk = cursor.fetchmany(arraysize)
+        if chunk:
+            first_row = (time.time() - start_time) * 1000
+            query_time_to_first_row.record(first_row, attributes, context=span_context)
+            span.set_attribute("db.time_to_first_row", first_row)
+        while chunk:
+            rows += len(chunk)
+            size += sum(row_bytes(row) for row in chunk)
+            yield from chunk
+            chunk = cursor.fetchmany(arraysize)
+        logger.info(f"Query executed successfully: {fingerprint.statement}")
+    except Exception as e:
+        logger.error(f"Error executing query: {fingerprint.statement}, Error: {e}")
+        span.record_exception(e)
+        span.set_status(trace.status.Status(trace.status.StatusCode.ERROR, str(e)))
+        raise
+    finally:
+        if cursor is not None:
+            cursor.close()
+        end_time = time.time()
+        duration = (end_time - start_time) * 1000  # Convert to milliseconds
+        query_execution_count.add(1, attributes)
+        query_execution_time.record(duration, attributes, context=span_context)
+        query_rows_fetched.add(rows, attributes)
+        query_bytes_fetched.add(size, attributes)
+        span.set_attribute("db.execution_time", duration)
+        span.set_attribute("db.rows_fetched", rows)
+        span.set_attribute("db.bytes_fetched", size)
+        span.end()
+
 def execute_query(connection, query: str):
     """
-    Execute a Sybase query and return the results.
+    Execute a Sybase query and return the results as a list.
     """
-    with tracer.start_as_current_span("execute_query") as span:
-        start_time = time.time()
-        try:
-            cursor = connection.cursor()
-            cursor.execute(query)
-            results = cursor.fetchall()
-            logger.info(f"Query executed successfully: {query}")
-            return results
-        except Exception as e:
-            logger.error(f"Error executing query: {query}, Error: {e}")
-            span.record_exception(e)
-            span.set_status(trace.status.Status(trace.status.StatusCode.ERROR, str(e)))
-            raise
-        finally:
-            end_time = time.time()
-            duration = (end_time - start_time) * 1000  # Convert to milliseconds
-            query_execution_count.add(1)
-            query_execution_time.record(duration)
-            span.set_attribute("db.statement", query)
-            span.set_attribute("db.execution_time", duration)
+    return list(stream_query(connection, query))
 
 def main():
     # Sybase connection details
@@ -105,10 +172,8 @@ def main():
 
     # Execute a query
     query = "SELECT * FROM your_table_name"
-    results = execute_query(connection, query)
-
-    # Print query results
-    for row in results:
+    # Print query results as they stream in
+    for row in stream_query(connection, query):
         print(row)
 
 if __name__ == "__main__":
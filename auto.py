@@ -1,155 +1,406 @@
-import time
-import logging
-from opentelemetry import trace, metrics
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
-from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
-from opentelemetry.sdk.logs import LoggerProvider
-from opentelemetry.sdk.logs.export import BatchLogProcessor
-from opentelemetry.exporter.otlp.proto.grpc.exporter import OTLPLogExporter
-from opentelemetry.instrumentation.system_metrics import SystemMetricsInstrumentation
-from opentelemetry.sdk.resources import Resource
-
-import psutil
+import threading
+from opentelemetry.metrics import Observation
+
 import sybpydb
 
-# Define OpenTelemetry Resource
-resource = Resource(attributes={"service.name": "sybase_app"})
-
-# === Setup Tracing ===
-trace_provider = TracerProvider(resource=resource)
-trace.set_tracer_provider(trace_provider)
-span_exporter = OTLPSpanExporter(endpoint="http://localhost:4317", insecure=True)
-trace_provider.add_span_processor(BatchSpanProcessor(span_exporter))
-tracer = trace.get_tracer("sybase_app")
-
-# === Setup Metrics ===
-metric_exporter = OTLPMetricExporter(endpoint="http://localhost:4317", insecure=True)
-metric_reader = PeriodicExportingMetricReader(metric_exporter)
-meter_provider = MeterProvider(resource=resource, metric_readers=[metric_reader])
-metrics.set_meter_provider(meter_provider)
-meter = metrics.get_meter_provider().get_meter("sybase_app")
-
-# System metrics instrumentation
-SystemMetricsInstrumentation(
-    meter=meter, resource=resource, exporter=metric_exporter, export_interval_millis=10000
-).start()
-
-# === Setup Logging ===
-logger_provider = LoggerProvider(resource=resource)
-log_exporter = OTLPLogExporter(endpoint="http://localhost:4317", insecure=True)
-logger_provider.add_log_processor(BatchLogProcessor(log_exporter))
-logging.basicConfig(level=logging.INFO)
-otel_logger = logger_provider.get_logger("sybase_app_logger", logging.INFO)
+from lib.bootstrap import setup_telemetry
+from lib.breaker import BreakerBoard
+from lib.cardinality import CardinalityLimitedMeter
+from lib.collector import MultiTargetCollector, SybaseTarget
+from lib.config import ConfigWatcher, diff_by_name
+from lib.deltas import SpidCounterStore
+from lib.mda import MdaCollector
+from lib.observe import SharedProbe
+from lib.procsampler import ProcessSampler
+from lib.queryprobes import QueryProbeSet
+from lib.selfmon import AgentSelfMetrics
+from lib.sharding import ShardCoordinator
+from lib.snapshot import take_snapshot
+from lib.views import AGENT_METRIC_VIEWS, SYSTEM_METRIC_VIEWS
+
+# JSON agent config with targets, query probes and exporter settings (see
+# agent_config.example.json). Target and probe changes are applied while the
+# agent runs. None uses the constants below.
+AGENT_CONFIG_FILE = None
+CONFIG_POLL_INTERVAL = 5  # seconds between checks of AGENT_CONFIG_FILE
+# "pull" registers observable instruments that the metric reader samples on its
+# own interval; "push" records from the collector's loop as before.
+COLLECTION_MODE = "pull"
+COLLECTION_INTERVAL = 10  # seconds
+COLLECTION_TIMEOUT = 5  # seconds a pull collection waits for slow targets
+MAX_POLL_WORKERS = 32
+POLL_TIMEOUT = 5  # seconds before a target's running queries are cancelled
+# A target whose poll takes longer than this is polled every 2nd, 4th, ... up to
+# MAX_POLL_BACKOFF-th cycle until it recovers
+POLL_SLOW_THRESHOLD = 2  # seconds
+MAX_POLL_BACKOFF = 8
+# A target that fails this many polls in a row is left alone for BREAKER_RESET_TIMEOUT seconds
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_RESET_TIMEOUT = 60
+# Directory shared by agent replicas; each polls its consistent-hash share of
+# SYBASE_TARGETS. None polls every target from this process.
+SHARD_LEASE_DIR = None
+# A replica that misses renewals for this long loses its targets to the others;
+# None means two collection intervals
+SHARD_LEASE_TTL = None
+AGENT_SELF_METRICS = True  # Set to False to skip the agent's own overhead metrics
+MDA_PROBES = True  # Read the MDA monitoring tables (needs mon_role and enable monitoring)
+MDA_INTERVAL = 60  # seconds between MDA reads per target; doubles while reads take over MDA_SLOW_THRESHOLD
+MDA_SLOW_THRESHOLD = 5  # seconds
+OTEL_ENDPOINT = "http://localhost:4317"
+# Directory for the on-disk export spool; None exports straight to the endpoint
+OTLP_SPOOL_DIR = None
+# Spans and log records repeat the same attribute keys, so gzip shrinks OTLP requests several-fold
+OTLP_COMPRESSION = "gzip"
+# Span and log batch queues; batch size and flush interval follow the load within
+# EXPORT_TUNING's bounds (see lib.export_tuning)
+EXPORT_QUEUE_SIZE = 16384
+EXPORT_TUNING = {"min_batch_size": 256, "max_batch_size": 4096, "max_delay_millis": 5000}
+# Distinct attribute sets each instrument may create before folding into "other"
+MAX_SERIES_PER_METRIC = 500
+# Per-instrument attribute allowlists: key -> None (any value) or allowed values,
+# e.g. {"sybase_mda_activity": {"sybase.server": None, "table": None, "counter": None}}
+METRIC_ALLOWLISTS = {}
+# Root spans per second by name; spans over the limit are never recorded
+SPAN_RATE_LIMITS = {"sybase_statement": 20}
+# Export every failed or slow trace, plus a small share of the rest
+TAIL_SAMPLING = {"slow_threshold_ms": 2000, "keep_ratio": 0.05}
+# Log records wait here for the listener thread; beyond this they are dropped
+LOG_QUEUE_SIZE = 10000
+# Metric views (see lib.views): trimmed system metrics, exponential agent latencies
+METRIC_VIEWS = SYSTEM_METRIC_VIEWS + AGENT_METRIC_VIEWS
+
+# === Agent Config File ===
+config_watcher = ConfigWatcher(AGENT_CONFIG_FILE, poll_interval=CONFIG_POLL_INTERVAL) if AGENT_CONFIG_FILE else None
+agent_config = config_watcher.config if config_watcher is not None else None
+if agent_config is not None:
+    COLLECTION_INTERVAL = agent_config["collection_interval"]
+
+# === Setup Tracing, Metrics and Logging ===
+# The spool backends wrap OTLP with an on-disk write-ahead spool
+otlp_backend = "spool" if OTLP_SPOOL_DIR else "otlp"
+telemetry_config = dict(
+    service_name="sybase_app",
+    endpoint=OTEL_ENDPOINT,
+    traces=otlp_backend,
+    metrics=otlp_backend,
+    logs=otlp_backend,
+    spool_dir=OTLP_SPOOL_DIR,
+    compression=OTLP_COMPRESSION,
+    batch_queue_size=EXPORT_QUEUE_SIZE,
+    export_tuning=EXPORT_TUNING,
+    metric_interval_millis=COLLECTION_INTERVAL * 1000,
+    system_metrics=True,
+    span_rate_limits=SPAN_RATE_LIMITS,
+    tail_sampling=TAIL_SAMPLING,
+    log_queue_size=LOG_QUEUE_SIZE,
+    views=METRIC_VIEWS,
+)
+if agent_config is not None:
+    telemetry_config.update(agent_config["exporter"])
+telemetry = setup_telemetry(telemetry_config)
+tracer = telemetry.tracer
+meter = CardinalityLimitedMeter(telemetry.meter, max_series=MAX_SERIES_PER_METRIC, allowlists=METRIC_ALLOWLISTS)
+otel_logger = telemetry.logger
+
+# === Agent Self-Metrics ===
+self_metrics = AgentSelfMetrics(telemetry.meter_provider, enabled=AGENT_SELF_METRICS)
+self_metrics.watch_processor(telemetry.span_processor, "traces")
+self_metrics.watch_processor(telemetry.log_processor, "logs")
+self_metrics.watch_log_queue(telemetry.log_queue_handler)
+self_metrics.watch_export_tuners(telemetry)
+self_metrics.watch_cardinality(meter)
+self_metrics.watch_sampling(telemetry)
 
 # === Custom Metrics ===
-# Active connections and transaction rate metrics
-active_connections_metric = meter.create_up_down_counter(
-    name="sybase_active_connections",
-    description="Number of active connections to the Sybase database",
-    unit="connections",
-)
+# Synchronous instruments are only needed when the collector loop pushes values
+if COLLECTION_MODE == "push":
+    # Active connections and transaction rate metrics
+    active_connections_metric = meter.create_gauge(
+        name="sybase_active_connections",
+        description="Number of active connections to the Sybase database",
+        unit="connections",
+    )
 
-transaction_rate_metric = meter.create_up_down_counter(
-    name="sybase_transaction_rate",
-    description="Number of transactions processed per minute",
-    unit="transactions/min",
-)
+    transaction_rate_metric = meter.create_gauge(
+        name="sybase_transaction_rate",
+        description="Number of transactions processed per minute",
+        unit="transactions/min",
+    )
 
-# Process metrics
-cpu_usage_metric = meter.create_up_down_counter(
-    name="process_cpu_usage_percent",
-    description="CPU usage percentage of the current process",
-    unit="%",
-)
+    logical_io_metric = meter.create_counter(
+        name="sybase_logical_io",
+        description="Logical reads and writes performed by Sybase sessions",
+        unit="operations",
+    )
 
-memory_usage_metric = meter.create_up_down_counter(
-    name="process_memory_usage_bytes",
-    description="Memory usage of the process in bytes",
-    unit="bytes",
-)
+    process_breakdown_metric = meter.create_gauge(
+        name="sybase_processes",
+        description="Sybase processes broken down by database and status",
+        unit="processes",
+    )
+
+    # Process metrics
+    cpu_usage_metric = meter.create_gauge(
+        name="process_cpu_usage_percent",
+        description="CPU usage percentage of the current process",
+        unit="%",
+    )
+
+    memory_usage_metric = meter.create_gauge(
+        name="process_memory_usage_bytes",
+        description="Memory usage of the process in bytes",
+        unit="bytes",
+    )
+
+
+# === Sybase Targets ===
+# Every server listed here is polled concurrently by one agent process.
+SYBASE_TARGETS = [
+    {
+        "servername": "YOUR_SERVER_NAME",
+        "database": "YOUR_DATABASE_NAME",
+        "user": "YOUR_USERNAME",
+        "password": "YOUR_PASSWORD",
+        "attributes": {"deployment.environment": "prod"},
+    },
+]
 
 
 # === Sybase Database Connection ===
-def connect_to_sybase():
+def connect_to_sybase(servername, database, user, password):
     """Establish a connection to the Sybase database."""
     conn = sybpydb.connect(
-        servername="YOUR_SERVER_NAME",
-        database="YOUR_DATABASE_NAME",
-        user="YOUR_USERNAME",
-        password="YOUR_PASSWORD",
+        servername=servername,
+        database=database,
+        user=user,
+        password=password,
     )
     return conn
 
 
+def build_targets(target_configs):
+    """Turn the SYBASE_TARGETS (or config file) entries into pollable targets."""
+    targets = []
+    for spec in target_configs:
+        config = dict(spec)
+        attributes = config.pop("attributes", None)
+        targets.append(
+            SybaseTarget(
+                name=config["servername"],
+                connect=lambda config=config: connect_to_sybase(**config),
+                attributes=attributes,
+                spec=spec,
+            )
+        )
+    return targets
+
+
 # === Helper Functions ===
-def get_cpu_usage():
-    """Fetch CPU usage percentage of the current process."""
-    return psutil.Process().cpu_percent(interval=None)
+# Long-lived handles for the agent itself and the local Sybase server processes
+process_sampler = ProcessSampler(names=("dataserver", "backupserver"))
 
 
-def get_memory_usage():
-    """Fetch memory usage of the current process in bytes."""
-    return psutil.Process().memory_info().rss
+def process_attributes(sample):
+    """Attributes identifying a sampled process."""
+    return {"process.pid": sample.pid, "process.executable.name": sample.name}
 
 
 def record_process_metrics():
     """Record CPU and memory usage."""
-    cpu_usage = get_cpu_usage()
-    memory_usage = get_memory_usage()
-    cpu_usage_metric.add(cpu_usage)
-    memory_usage_metric.add(memory_usage)
+    for sample in process_sampler.sample():
+        attributes = process_attributes(sample)
+        cpu_usage_metric.set(sample.cpu_percent, attributes)
+        memory_usage_metric.set(sample.rss, attributes)
+
+
+# Previous per-session counters for each target, keyed by server name
+spid_counters = {}
 
 
-def get_active_connections(conn):
-    """Query the Sybase database for active connections."""
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM master..sysprocesses WHERE status = 'active'")
-    active_connections = cursor.fetchone()[0]
-    cursor.close()
-    return active_connections
+def take_counted_snapshot(conn, attributes):
+    """Take a per-SPID snapshot and fold it into the target's delta store."""
+    with self_metrics.time_probe("sysprocesses", attributes):
+        snapshot = take_snapshot(conn, per_spid=True)
+    counters = spid_counters.setdefault(attributes["sybase.server"], SpidCounterStore())
+    counters.update(snapshot.sessions)
+    return snapshot, counters
 
 
-def get_transaction_rate(conn):
-    """Query the Sybase database for transaction rate."""
-    cursor = conn.cursor()
-    cursor.execute("SELECT SUM(logical_reads + writes) FROM master..sysprocesses")
-    transaction_rate = cursor.fetchone()[0]
-    cursor.close()
-    return transaction_rate
+mda_collector = (
+    MdaCollector(meter, tracer, interval=MDA_INTERVAL, slow_threshold=MDA_SLOW_THRESHOLD) if MDA_PROBES else None
+)
+# Query probes declared in AGENT_CONFIG_FILE, each on its own interval, exported as gauges
+query_probes = QueryProbeSet(meter, tracer)
+# Circuit breaker per target; states are exported as sybase_target_circuit_state
+breakers = BreakerBoard(meter, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT)
+
+
+def collect_mda(conn, attributes):
+    """Read only what is new in the MDA tables since the previous cycle."""
+    if mda_collector is not None:
+        with self_metrics.time_probe("mda", attributes):
+            mda_collector.collect(conn, attributes)
+
+
+def forget_target(target):
+    """Drop per-target state once the target moved to another replica."""
+    spid_counters.pop(target.name, None)
+    query_probes.forget(target.name)
+    breakers.forget(target.name)
+    if mda_collector is not None:
+        mda_collector.forget(target.name)
+
+
+def record_sybase_metrics(conn, attributes=None):
+    """Record custom Sybase metrics from a single sysprocesses snapshot."""
+    snapshot, counters = take_counted_snapshot(conn, attributes)
+    active_connections_metric.set(snapshot.active_connections, attributes)
+    transaction_rate_metric.set(counters.rate_per_minute(), attributes)
+    logical_io_metric.add(counters.interval_reads, dict(attributes, **{"io.direction": "read"}))
+    logical_io_metric.add(counters.interval_writes, dict(attributes, **{"io.direction": "write"}))
+    for dbid, status, processes, _, _ in snapshot.breakdown:
+        breakdown_attributes = dict(attributes or {}, dbid=dbid, status=status)
+        process_breakdown_metric.set(processes, breakdown_attributes)
+
+
+def poll_target(conn, attributes):
+    """Collect one target's metrics; runs on a collector worker thread."""
+    with tracer.start_as_current_span("sybase_metrics_collection", attributes=attributes) as span:
+        # Add dynamic operation name
+        span.set_attribute("operation.name", "metrics_collection")
+        with self_metrics.time_cycle("sybase_target"):
+            record_sybase_metrics(conn, attributes)
+            collect_mda(conn, attributes)
+            query_probes.run_due(conn, attributes)
+
+
+def snapshot_target(conn, attributes):
+    """Take one target's snapshot for the observable callbacks."""
+    with tracer.start_as_current_span("sybase_metrics_collection", attributes=attributes) as span:
+        span.set_attribute("operation.name", "metrics_collection")
+        collect_mda(conn, attributes)
+        query_probes.run_due(conn, attributes)
+        return take_counted_snapshot(conn, attributes)
+
+
+# === Observable Metrics ===
+def register_observable_metrics(collector):
+    """Register callbacks that sample only when the metric reader collects."""
+    process_probe = SharedProbe(process_sampler.sample)
+
+    def collect_targets():
+        with self_metrics.time_cycle("sybase_targets"):
+            return collector.collect(timeout=COLLECTION_TIMEOUT)
+
+    sybase_probe = SharedProbe(collect_targets)
+
+    def per_target(extract):
+        return lambda results: [
+            Observation(extract(*result), target.attributes) for target, result in results
+        ]
+
+    def per_process(extract):
+        return lambda samples: [Observation(extract(sample), process_attributes(sample)) for sample in samples]
+
+    def breakdown(results):
+        for target, (snapshot, _) in results:
+            for dbid, status, processes, _, _ in snapshot.breakdown:
+                yield Observation(processes, dict(target.attributes, dbid=dbid, status=status))
+
+    def logical_io(results):
+        for target, (_, counters) in results:
+            yield Observation(counters.total_reads, dict(target.attributes, **{"io.direction": "read"}))
+            yield Observation(counters.total_writes, dict(target.attributes, **{"io.direction": "write"}))
+
+    meter.create_observable_gauge(
+        name="sybase_active_connections",
+        callbacks=[sybase_probe.callback(per_target(lambda snapshot, _: snapshot.active_connections))],
+        description="Number of active connections to the Sybase database",
+        unit="connections",
+    )
+    meter.create_observable_gauge(
+        name="sybase_transaction_rate",
+        callbacks=[sybase_probe.callback(per_target(lambda _, counters: counters.rate_per_minute()))],
+        description="Number of transactions processed per minute",
+        unit="transactions/min",
+    )
+    meter.create_observable_counter(
+        name="sybase_logical_io",
+        callbacks=[sybase_probe.callback(logical_io)],
+        description="Logical reads and writes performed by Sybase sessions",
+        unit="operations",
+    )
+    meter.create_observable_gauge(
+        name="sybase_processes",
+        callbacks=[sybase_probe.callback(breakdown)],
+        description="Sybase processes broken down by database and status",
+        unit="processes",
+    )
+    meter.create_observable_gauge(
+        name="process_cpu_usage_percent",
+        callbacks=[process_probe.callback(per_process(lambda sample: sample.cpu_percent))],
+        description="CPU usage percentage of the agent and local Sybase processes",
+        unit="%",
+    )
+    meter.create_observable_gauge(
+        name="process_memory_usage_bytes",
+        callbacks=[process_probe.callback(per_process(lambda sample: sample.rss))],
+        description="Memory usage of the agent and local Sybase processes in bytes",
+        unit="bytes",
+    )
 
 
-def record_sybase_metrics(conn):
-    """Record custom Sybase metrics."""
-    active_connections = get_active_connections(conn)
-    transaction_rate = get_transaction_rate(conn)
-    active_connections_metric.add(active_connections)
-    transaction_rate_metric.add(transaction_rate)
+# === Config Reload ===
+def apply_config(collector, old, new):
+    """Apply target and probe changes from a reloaded config file."""
+    targets = diff_by_name(old["targets"], new["targets"], key="servername")
+    if any(targets):
+        collector.update_targets(build_targets(new["targets"]))
+        otel_logger.info(
+            f"Targets reloaded: {len(targets.added)} added, {len(targets.removed)} removed, "
+            f"{len(targets.changed)} changed."
+        )
+    query_probes.update(new["probes"])
 
 
 # === Main Application ===
 def main():
     """Main application loop."""
-    conn = connect_to_sybase()
-    otel_logger.info("Connected to Sybase database.")
-
-    while True:
-        with tracer.start_as_current_span("sybase_metrics_collection") as span:
-            # Add dynamic operation name
-            span.set_attribute("operation.name", "metrics_collection")
-
-            # Record system and Sybase metrics
-            record_process_metrics()
-            record_sybase_metrics(conn)
-
-            # Log custom message
-            otel_logger.info("Metrics collected and sent to OpenTelemetry Collector.")
-
-        # Sleep for the collection interval
-        time.sleep(10)
+    pull = COLLECTION_MODE == "pull"
+    shard = None
+    if SHARD_LEASE_DIR:
+        shard = ShardCoordinator(SHARD_LEASE_DIR, ttl=SHARD_LEASE_TTL or 2 * COLLECTION_INTERVAL)
+    collector = MultiTargetCollector(
+        build_targets(agent_config["targets"] if agent_config is not None else SYBASE_TARGETS),
+        poll=snapshot_target if pull else poll_target,
+        interval=COLLECTION_INTERVAL,
+        max_workers=MAX_POLL_WORKERS,
+        on_cycle=None if pull else record_process_metrics,
+        shard=shard,
+        on_release=forget_target,
+        poll_timeout=POLL_TIMEOUT,
+        breakers=breakers,
+        slow_threshold=POLL_SLOW_THRESHOLD,
+        max_backoff=MAX_POLL_BACKOFF,
+    )
+    self_metrics.watch_collector(collector)
+    otel_logger.info(f"Polling {len(collector.targets)} Sybase target(s) in {COLLECTION_MODE} mode.")
+    if shard is not None:
+        otel_logger.info(f"Sharing targets with other replicas as {shard.replica_id} via {SHARD_LEASE_DIR}.")
+    if config_watcher is not None:
+        query_probes.update(agent_config["probes"])
+        config_watcher.on_change = lambda old, new: apply_config(collector, old, new)
+        config_watcher.start()
+        otel_logger.info(f"Watching {AGENT_CONFIG_FILE} for target and probe changes.")
+
+    if pull:
+        # The metric reader's export thread drives every collection
+        register_observable_metrics(collector)
+        threading.Event().wait()
+    else:
+        # Runs until interrupted; each target is polled on its own worker
+        collector.run_forever()
 
 
 if __name__ == "__main__":
@@ -1,76 +1,66 @@
-import time
 import logging
-from opentelemetry import trace, metrics
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
-from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.exporter.otlp.proto.grpc.exporter import OTLPLogExporter
-from opentelemetry.sdk.logs import LoggerProvider, LoggingHandler
-from opentelemetry.sdk.logs.export import BatchLogProcessor
-
-import psutil
-import sybpydb
-
-# Define OpenTelemetry Resource
-resource = Resource(attributes={"service.name": "sybase_app"})
-
-# === Setup Tracing ===
-trace_provider = TracerProvider(resource=resource)
-trace.set_tracer_provider(trace_provider)
-span_exporter = OTLPSpanExporter(endpoint="http://localhost:4317", insecure=True)
-trace_provider.add_span_processor(BatchSpanProcessor(span_exporter))
-tracer = trace.get_tracer("sybase_app")
-
-# === Setup Metrics ===
-metric_exporter = OTLPMetricExporter(endpoint="http://localhost:4317", insecure=True)
-metric_reader = PeriodicExportingMetricReader(metric_exporter)
-meter_provider = MeterProvider(resource=resource, metric_readers=[metric_reader])
-metrics.set_meter_provider(meter_provider)
-meter = metrics.get_meter_provider().get_meter("sybase_app")
 
-# === System Metrics ===
-from opentelemetry.instrumentation.system_metrics import SystemMetricsInstrumentation
-
-SystemMetricsInstrumentation(
-    meter=meter, resource=resource, exporter=metric_exporter, export_interval_millis=10000
-).start()
-
-# === Setup Logging ===
-log_exporter = OTLPLogExporter(endpoint="http://localhost:4317", insecure=True)
-logger_provider = LoggerProvider(resource=resource)
-logger_provider.add_log_processor(BatchLogProcessor(log_exporter))
+import sybpydb
 
-# Set up the Python logging module to work with OpenTelemetry
-logging_handler = LoggingHandler(level=logging.INFO, logger_provider=logger_provider)
-logging.basicConfig(level=logging.INFO, handlers=[logging_handler])
+from lib.bootstrap import setup_telemetry
+from lib.cardinality import CardinalityLimitedMeter
+from lib.procsampler import ProcessSampler
+from lib.scheduler import Probe, ProbeScheduler
+from lib.selfmon import AgentSelfMetrics
+from lib.snapshot import take_snapshot
+from lib.views import SYSTEM_METRIC_VIEWS
+
+# === Setup Tracing, Metrics and Logging ===
+# Python logging records are forwarded to OpenTelemetry by the bootstrap
+# Collection spans are exported when they fail or run slow, plus 5% of the rest
+telemetry = setup_telemetry(
+    service_name="sybase_app",
+    system_metrics=True,
+    views=SYSTEM_METRIC_VIEWS,
+    tail_sampling={"slow_threshold_ms": 2000, "keep_ratio": 0.05},
+    # Gzip OTLP requests and size span/log batches to the load
+    compression="gzip",
+    batch_queue_size=16384,
+    export_tuning={"min_batch_size": 256, "max_batch_size": 4096},
+)
+tracer = telemetry.tracer
+# Queue depth, drops and the batch settings the export tuner chose
+self_metrics = AgentSelfMetrics(telemetry.meter_provider)
+self_metrics.watch_processor(telemetry.span_processor, "traces")
+self_metrics.watch_processor(telemetry.log_processor, "logs")
+self_metrics.watch_export_tuners(telemetry)
+# The process breakdown is capped at 500 dbid/status series
+meter = CardinalityLimitedMeter(telemetry.meter, max_series=500)
 
 # Python logger
 otel_logger = logging.getLogger("sybase_app_logger")
 
 # === Custom Metrics ===
-active_connections_metric = meter.create_up_down_counter(
+active_connections_metric = meter.create_gauge(
     name="sybase_active_connections",
     description="Number of active connections to the Sybase database",
     unit="connections",
 )
 
-transaction_rate_metric = meter.create_up_down_counter(
+transaction_rate_metric = meter.create_gauge(
     name="sybase_transaction_rate",
     description="Number of transactions processed per minute",
     unit="transactions/min",
 )
 
-cpu_usage_metric = meter.create_up_down_counter(
+process_breakdown_metric = meter.create_gauge(
+    name="sybase_processes",
+    description="Sybase processes broken down by database and status",
+    unit="processes",
+)
+
+cpu_usage_metric = meter.create_gauge(
     name="process_cpu_usage_percent",
     description="CPU usage percentage of the current process",
     unit="%",
 )
 
-memory_usage_metric = meter.create_up_down_counter(
+memory_usage_metric = meter.create_gauge(
     name="process_memory_usage_bytes",
     description="Memory usage of the process in bytes",
     unit="bytes",
@@ -88,42 +78,23 @@ def connect_to_sybase():
 
 
 # === Helper Functions ===
-def get_cpu_usage():
-    return psutil.Process().cpu_percent(interval=None)
-
-
-def get_memory_usage():
-    return psutil.Process().memory_info().rss
+# Long-lived handle on this process, so cpu_percent measures between probe runs
+process_sampler = ProcessSampler()
 
 
 def record_process_metrics():
-    cpu_usage = get_cpu_usage()
-    memory_usage = get_memory_usage()
-    cpu_usage_metric.add(cpu_usage)
-    memory_usage_metric.add(memory_usage)
-
-
-def get_active_connections(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM master..sysprocesses WHERE status = 'active'")
-    active_connections = cursor.fetchone()[0]
-    cursor.close()
-    return active_connections
-
-
-def get_transaction_rate(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT SUM(logical_reads + writes) FROM master..sysprocesses")
-    transaction_rate = cursor.fetchone()[0]
-    cursor.close()
-    return transaction_rate
+    process_sampler.sample()
+    sample = process_sampler.latest()
+    cpu_usage_metric.set(sample.cpu_percent)
+    memory_usage_metric.set(sample.rss)
 
 
 def record_sybase_metrics(conn):
-    active_connections = get_active_connections(conn)
-    transaction_rate = get_transaction_rate(conn)
-    active_connections_metric.add(active_connections)
-    transaction_rate_metric.add(transaction_rate)
+    snapshot = take_snapshot(conn)
+    active_connections_metric.set(snapshot.active_connections)
+    transaction_rate_metric.set(snapshot.transaction_rate)
+    for dbid, status, processes, _, _ in snapshot.breakdown:
+        process_breakdown_metric.set(processes, {"dbid": dbid, "status": status})
 
 
 # === Main Application ===
@@ -131,16 +102,19 @@ def main():
     conn = connect_to_sybase()
     otel_logger.info("Connected to Sybase database.")
 
-    while True:
+    def collect_sybase_metrics():
         with tracer.start_as_current_span("sybase_metrics_collection") as span:
             span.set_attribute("operation.name", "metrics_collection")
 
-            record_process_metrics()
             record_sybase_metrics(conn)
 
             otel_logger.info("Metrics collected and sent to OpenTelemetry Collector.")
 
-        time.sleep(10)
+    scheduler = ProbeScheduler([
+        Probe("process", record_process_metrics, interval=10),
+        Probe("sysprocesses", collect_sybase_metrics, interval=10, jitter=1, slow_threshold=2),
+    ])
+    scheduler.run_forever()
 
 
 if __name__ == "__main__":
@@ -40,12 +40,12 @@ SystemMetricsInstrumentation(
 ).start()
 
 # Define custom metrics
-active_connections_metric = meter.create_up_down_counter(
+active_connections_metric = meter.create_gauge(
     name="sybase_active_connections",
     description="Active Sybase database connections",
     unit="connections",
 )
-transaction_rate_metric = meter.create_counter(
+transaction_rate_metric = meter.create_gauge(
     name="sybase_transaction_rate",
     description="Rate of transactions executed",
     unit="transactions",
@@ -67,8 +67,8 @@ def record_custom_metrics():
     transaction_rate = 120  # Replace with actual transaction count logic
 
     # Record metrics
-    active_connections_metric.add(active_connections)
-    transaction_rate_metric.add(transaction_rate)
+    active_connections_metric.set(active_connections)
+    transaction_rate_metric.set(transaction_rate)
 
 # Application loop
 print("Metrics, logs, and traces collection running...")
@@ -1,64 +1,47 @@
-import time
 import psutil
 import logging
-from opentelemetry import trace, metrics
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor, OTLPSpanExporter
-from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
-from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
-from opentelemetry.instrumentation.system_metrics import SystemMetricsInstrumentation
-from opentelemetry.sdk._logs import LogEmitterProvider, BatchLogProcessor
-from opentelemetry.exporter.otlp.proto.grpc._log_exporter import OTLPLogExporter
+from concurrent.futures import ThreadPoolExecutor
+
 import sybpydb  # Sybase driver
 
+from lib.bootstrap import setup_telemetry
+from lib.breaker import BreakerBoard, call_with_deadline
+from lib.scheduler import Probe, ProbeScheduler
+from lib.snapshot import take_snapshot
+from lib.views import SYSTEM_METRIC_VIEWS
+
 # Common OTLP endpoint
 OTEL_ENDPOINT = "http://otel-collector:4317"
 
-# Set up OpenTelemetry resources
-resource = Resource.create(
-    attributes={"service.name": "sybase_app", "host.name": "sybase_host"}
+# Set up tracing, metrics and logging
+telemetry = setup_telemetry(
+    service_name="sybase_app",
+    resource={"host.name": "sybase_host"},
+    endpoint=OTEL_ENDPOINT,
+    system_metrics=True,
+    views=SYSTEM_METRIC_VIEWS,
+    # Export failed or slow collection cycles, plus 5% of the rest
+    tail_sampling={"slow_threshold_ms": 2000, "keep_ratio": 0.05},
+    # Console and OTLP log output happen on a listener thread, not the caller's
+    log_queue_size=10000,
 )
-
-# Configure tracing
-tracer_provider = TracerProvider(resource=resource)
-span_exporter = OTLPSpanExporter(endpoint=OTEL_ENDPOINT, insecure=True)
-tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
-trace.set_tracer_provider(tracer_provider)
-tracer = trace.get_tracer("sybase_app")
-
-# Configure metrics
-metric_exporter = OTLPMetricExporter(endpoint=OTEL_ENDPOINT, insecure=True)
-metric_reader = PeriodicExportingMetricReader(metric_exporter)
-meter_provider = MeterProvider(metric_readers=[metric_reader], resource=resource)
-metrics.set_meter_provider(meter_provider)
-meter = metrics.get_meter_provider().get_meter("sybase_app")
-
-# Add system metrics instrumentation
-SystemMetricsInstrumentation(
-    meter=meter, resource=resource, exporter=metric_exporter, export_interval_millis=10000
-).start()
+tracer = telemetry.tracer
+meter = telemetry.meter
 
 # Define custom metrics
-active_connections_metric = meter.create_up_down_counter(
+active_connections_metric = meter.create_gauge(
     name="sybase_active_connections",
     description="Active Sybase database connections",
     unit="connections",
 )
-transaction_rate_metric = meter.create_counter(
+transaction_rate_metric = meter.create_gauge(
     name="sybase_transaction_rate",
     description="Rate of transactions executed",
     unit="transactions",
 )
 
 # Configure logging
-log_exporter = OTLPLogExporter(endpoint=OTEL_ENDPOINT, insecure=True)
-log_emitter_provider = LogEmitterProvider(resource=resource)
-log_emitter_provider.add_log_processor(BatchLogProcessor(log_exporter))
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("sybase_app")
-logger.addHandler(logging.StreamHandler())
 
 # Sybase connection details
 SYBASE_SERVER = "your_sybase_server"
@@ -66,6 +49,13 @@ SYBASE_USER = "your_username"
 SYBASE_PASSWORD = "your_password"
 SYBASE_DATABASE = "your_database"
 
+# A snapshot still running after this is cancelled and its connection dropped
+QUERY_TIMEOUT = 5  # seconds
+# After 3 failed collections in a row, stop querying the server for 60s
+breakers = BreakerBoard(meter, failure_threshold=3, reset_timeout=60)
+# Snapshots run here so a blocked query can be abandoned; 2 workers leave room for one stuck call
+query_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sybase-query")
+
 # Establish a connection to the Sybase server
 def connect_to_sybase():
     """Connect to the Sybase database."""
@@ -84,41 +74,53 @@ def connect_to_sybase():
 
 # Simulate recording custom metrics
 def record_custom_metrics(connection):
-    """Record active connections and transaction rate."""
-    try:
-        with connection.cursor() as cursor:
-            # Query for active connections
-            cursor.execute("SELECT COUNT(*) FROM master..sysprocesses WHERE dbid = DB_ID()")
-            active_connections = cursor.fetchone()[0]
-
-            # Query for transaction rate
-            cursor.execute(
-                "SELECT COUNT(*) FROM master..syslogshold WHERE dbid = DB_ID()"
-            )
-            transaction_rate = cursor.fetchone()[0]
-
-            # Record metrics
-            active_connections_metric.add(active_connections)
-            transaction_rate_metric.add(transaction_rate)
-
-            logger.info(
-                f"Custom metrics recorded: Active Connections={active_connections}, Transaction Rate={transaction_rate}"
-            )
-    except Exception as e:
-        logger.error(f"Error recording metrics: {e}")
+    """Record active connections and transaction rate; raises QueryTimeout past the deadline."""
+    # One batch covers both sysprocesses and syslogshold
+    snapshot = call_with_deadline(take_snapshot, connection, QUERY_TIMEOUT, query_executor)
+    active_connections = snapshot.connections_in_db()
+    transaction_rate = snapshot.open_transactions
+
+    # Record metrics
+    active_connections_metric.set(active_connections)
+    transaction_rate_metric.set(transaction_rate)
+
+    logger.info(
+        f"Custom metrics recorded: Active Connections={active_connections}, Transaction Rate={transaction_rate}"
+    )
 
 # Main application loop
 def main():
-    connection = connect_to_sybase()
-    while True:
+    breaker = breakers.get(SYBASE_SERVER)
+    state = {"connection": None}
+
+    def collect_metrics():
+        if not breaker.allow():
+            return  # Circuit open; the server gets a trial poll after the reset timeout
         with tracer.start_as_current_span("sybase_operation_execution"):
             try:
                 logger.info("Starting Sybase metrics collection...")
-                record_custom_metrics(connection)
+                if state["connection"] is None:
+                    state["connection"] = connect_to_sybase()
+                record_custom_metrics(state["connection"])
                 logger.info("Metrics collection completed.")
-                time.sleep(10)  # Simulate processing interval
             except Exception as e:
                 logger.error(f"Error in main loop: {e}")
+                breaker.record_failure()
+                # After a timeout or failure the connection state is unknown; reconnect next time
+                connection, state["connection"] = state["connection"], None
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            else:
+                breaker.record_success()
+
+    # sysprocesses and syslogshold share one batch, so they share one probe
+    scheduler = ProbeScheduler([
+        Probe("sysprocesses", collect_metrics, interval=10, jitter=1, slow_threshold=2),
+    ])
+    scheduler.run_forever()
 
 
 if __name__ == "__main__":
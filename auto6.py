@@ -1,132 +1,147 @@
-import time
-import psutil
-from opentelemetry import trace, metrics
-from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
-from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
-from opentelemetry.instrumentation.system_metrics import SystemMetricsInstrumentor
 from pysyb import connect  # Sybase DB connection library
 
-# Import logger and tracer from your `lib` folder
-from lib.logger import logger  # Ensure logger is configured properly in `lib/logger.py`
-from lib.tracer import tracer  # Ensure tracer is configured properly in `lib/tracer.py`
+from lib.bootstrap import setup_telemetry
+from lib.pool import ConnectionPool
+from lib.procsampler import ProcessSampler
+from lib.scheduler import Probe, ProbeScheduler
+from lib.selfmon import AgentSelfMetrics
+from lib.views import AGENT_METRIC_VIEWS, SYSTEM_METRIC_VIEWS
 
-# Configure OpenTelemetry resources
-resource = Resource.create(attributes={"service.name": "sybase_app"})
+# Tracer, meter and logger providers (OTLP to localhost:4317) plus trimmed system
+# metrics; agent latencies use exponential histograms
+telemetry = setup_telemetry(system_metrics=True, views=SYSTEM_METRIC_VIEWS + AGENT_METRIC_VIEWS)
+meter_provider = telemetry.meter_provider
 
-# Metrics Exporter and Provider
-metric_exporter = OTLPMetricExporter(endpoint="http://localhost:4317", insecure=True)
-metric_reader = PeriodicExportingMetricReader(metric_exporter)
-meter_provider = MeterProvider(metric_readers=[metric_reader], resource=resource)
-metrics.set_meter_provider(meter_provider)
-
-# Enable system-level metrics instrumentation
-SystemMetricsInstrumentor().instrument(meter_provider=meter_provider)
+# Import logger and tracer from your `lib` folder; they share the providers above
+from lib.logger import logger  # noqa: E402
+from lib.tracer import tracer  # noqa: E402
 
 # Create a meter for custom metrics
-meter = metrics.get_meter_provider().get_meter("sybase_app")
-
-# Total system memory (in bytes)
-total_memory = psutil.virtual_memory().total
+meter = telemetry.meter
+
+# Agent overhead metrics under their own meter; set to False to disable
+AGENT_SELF_METRICS = True
+self_metrics = AgentSelfMetrics(meter_provider, enabled=AGENT_SELF_METRICS)
+self_metrics.watch_processor(telemetry.span_processor, "traces")
+self_metrics.watch_processor(telemetry.log_processor, "logs")
+
+# Shared Sybase connection pool; each cycle borrows one connection
+SYBASE_DSN = "server=your_server;database=your_db;chainxacts=0"
+sybase_pool = ConnectionPool(
+    lambda: connect(dsn=SYBASE_DSN),
+    min_size=1,
+    max_size=2,
+    idle_timeout=300,
+    meter=meter,
+    name="your_server",
+)
 
-# Tracer
-tracer = trace.get_tracer("sybase_app")
+# Long-lived handle on this process, so cpu_percent measures between probe runs
+process_sampler = ProcessSampler()
 
 # Custom metrics: Process-level instrumentation
-def get_process_cpu_usage():
-    """Fetch CPU usage percentage of the current process."""
-    return psutil.Process().cpu_percent(interval=None)
-
-def get_process_memory_usage_percent():
-    """Fetch memory usage of the current process as a percentage of total system memory."""
-    process_memory = psutil.Process().memory_info().rss
-    return (process_memory / total_memory) * 100
+def get_process_usage():
+    """Fetch CPU usage and memory usage (% of total system memory) of the current process."""
+    process_sampler.sample()
+    sample = process_sampler.latest()
+    return sample.cpu_percent, sample.memory_percent
 
 # Custom metrics: Sybase database metrics
-def get_sybase_active_connections():
+def get_sybase_active_connections(conn):
     """Fetch active connections from Sybase database."""
-    with tracer.start_as_current_span("fetch_sybase_active_connections"):
-        try:
-            with connect(dsn="server=your_server;database=your_db;chainxacts=0") as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT COUNT(*) FROM master..sysprocesses WHERE status='active'")
-                active_connections = cursor.fetchone()[0]
-            return active_connections
-        except Exception as e:
-            logger.error(f"Error fetching active connections: {e}")
-            return 0
-
-def get_sybase_transaction_rate():
+    with tracer.start_as_current_span("fetch_sybase_active_connections"), self_metrics.time_probe("sysprocesses"):
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM master..sysprocesses WHERE status='active'")
+        active_connections = cursor.fetchone()[0]
+        cursor.close()
+        return active_connections
+
+def get_sybase_transaction_rate(conn):
     """Fetch transaction rate from Sybase database."""
-    with tracer.start_as_current_span("fetch_sybase_transaction_rate"):
-        try:
-            with connect(dsn="server=your_server;database=your_db;chainxacts=0") as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT COUNT(*) AS transaction_count 
-                    FROM master..syslogins 
-                    WHERE logindatetime > GETDATE() - 1
-                """)
-                transaction_rate = cursor.fetchone()[0]
-            return transaction_rate
-        except Exception as e:
-            logger.error(f"Error fetching transaction rate: {e}")
-            return 0
+    with tracer.start_as_current_span("fetch_sybase_transaction_rate"), self_metrics.time_probe("syslogins"):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) AS transaction_count 
+            FROM master..syslogins 
+            WHERE logindatetime > GETDATE() - 1
+        """)
+        transaction_rate = cursor.fetchone()[0]
+        cursor.close()
+        return transaction_rate
+
+def get_sybase_metrics():
+    """Fetch both Sybase metrics over a single pooled connection."""
+    try:
+        with sybase_pool.connection() as conn:
+            return get_sybase_active_connections(conn), get_sybase_transaction_rate(conn)
+    except Exception as e:
+        logger.error(f"Error fetching Sybase metrics: {e}")
+        return 0, 0
 
 # Custom Metrics
-process_cpu_metric = meter.create_up_down_counter(
+process_cpu_metric = meter.create_gauge(
     name="custom_process_cpu_usage_percent",
     description="CPU usage percentage of the process",
     unit="%",
 )
 
-process_memory_metric = meter.create_up_down_counter(
+process_memory_metric = meter.create_gauge(
     name="custom_process_memory_usage_percent",
     description="Memory usage percentage of the process",
     unit="%",
 )
 
-sybase_active_connections_metric = meter.create_up_down_counter(
+sybase_active_connections_metric = meter.create_gauge(
     name="sybase_active_connections",
     description="Number of active connections to Sybase",
     unit="connections",
 )
 
-sybase_transaction_rate_metric = meter.create_up_down_counter(
+sybase_transaction_rate_metric = meter.create_gauge(
     name="sybase_transaction_rate",
     description="Transaction rate in Sybase",
     unit="transactions",
 )
 
-# Function to record custom metrics
-def record_custom_metrics():
-    """Record custom metrics for process and Sybase database."""
-    with tracer.start_as_current_span("record_custom_metrics"):
+# Functions to record custom metrics, each scheduled as its own probe
+def record_process_metrics():
+    """Record custom metrics for the process."""
+    with tracer.start_as_current_span("record_process_metrics"):
         try:
-            # Process-level metrics
-            cpu_usage = get_process_cpu_usage()
-            memory_usage = get_process_memory_usage_percent()
-            process_cpu_metric.add(cpu_usage)
-            process_memory_metric.add(memory_usage)
-
-            # Sybase database metrics
-            active_connections = get_sybase_active_connections()
-            transaction_rate = get_sybase_transaction_rate()
-            sybase_active_connections_metric.add(active_connections)
-            sybase_transaction_rate_metric.add(transaction_rate)
+            cpu_usage, memory_usage = get_process_usage()
+            process_cpu_metric.set(cpu_usage)
+            process_memory_metric.set(memory_usage)
 
             # Logging for debugging
             logger.info(f"Process CPU Usage (%): {cpu_usage:.2f}")
             logger.info(f"Process Memory Usage (%): {memory_usage:.2f}")
+
+        except Exception as e:
+            logger.error(f"Error recording process metrics: {e}")
+
+def record_sybase_metrics():
+    """Record custom metrics for the Sybase database."""
+    with tracer.start_as_current_span("record_sybase_metrics"):
+        try:
+            active_connections, transaction_rate = get_sybase_metrics()
+            sybase_active_connections_metric.set(active_connections)
+            sybase_transaction_rate_metric.set(transaction_rate)
+
+            # Logging for debugging
             logger.info(f"Active Connections: {active_connections}")
             logger.info(f"Transaction Rate: {transaction_rate}")
 
         except Exception as e:
-            logger.error(f"Error recording metrics: {e}")
+            logger.error(f"Error recording Sybase metrics: {e}")
+
+# Per-probe intervals (seconds); Sybase probes back off when the server is slow
+scheduler = ProbeScheduler([
+    Probe("process", record_process_metrics, interval=10),
+    Probe("sysprocesses", record_sybase_metrics, interval=10, jitter=1, slow_threshold=2),
+])
+self_metrics.watch_scheduler(scheduler)
 
 # Application run loop
-logger.info("Metrics collection running. Sending to OTLP endpoint...")
-while True:
-    record_custom_metrics()  # Record custom metrics
-    time.sleep(10)  # Adjust the interval as needed
+if __name__ == "__main__":
+    logger.info("Metrics collection running. Sending to OTLP endpoint...")
+    scheduler.run_forever()
@@ -0,0 +1,89 @@
+"""Cycle latency and allocations of the collectors against the fake driver."""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from conftest import default_server, import_script  # noqa: E402
+from lib.collector import MultiTargetCollector  # noqa: E402
+from lib.snapshot import take_snapshot  # noqa: E402
+
+PROCESS_COUNTS = [100, 2000]
+
+
+@pytest.mark.parametrize("per_spid", [False, True])
+@pytest.mark.parametrize("processes", PROCESS_COUNTS)
+def test_snapshot(run_cycle, fake_server, processes, per_spid):
+    server = fake_server(processes=processes)
+    conn = server.connect()
+    snapshot = run_cycle(lambda: take_snapshot(conn, per_spid=per_spid), setup=server.advance)
+    assert snapshot.total_connections == processes
+
+
+@pytest.mark.parametrize("targets", [1, 8])
+def test_auto_pull_cycle(run_cycle, fake_server, targets):
+    """One pull-mode collection across ``targets`` servers, MDA probes included."""
+    auto = import_script("auto")
+    server = fake_server(processes=500, latency=0.002)
+    configs = [
+        {"servername": f"bench{index}", "database": "master", "user": "sa", "password": ""}
+        for index in range(targets)
+    ]
+    collector = MultiTargetCollector(
+        auto.build_targets(configs), poll=auto.snapshot_target, max_workers=auto.MAX_POLL_WORKERS
+    )
+    try:
+        results = run_cycle(lambda: collector.collect(timeout=auto.COLLECTION_TIMEOUT), setup=server.advance)
+    finally:
+        collector.shutdown()
+        for config in configs:
+            auto.spid_counters.pop(config["servername"], None)
+            if auto.mda_collector is not None:
+                auto.mda_collector.forget(config["servername"])
+    assert len(results) == targets
+
+
+def test_auto2_cycle(run_cycle, fake_server):
+    auto2 = import_script("auto2")
+    server = fake_server(processes=500)
+    conn = server.connect()
+    run_cycle(lambda: auto2.record_sybase_metrics(conn), setup=server.advance)
+
+
+def test_auto5_cycle(run_cycle, fake_server):
+    auto5 = import_script("auto5")
+    server = fake_server(processes=500)
+    conn = server.connect()
+    run_cycle(lambda: auto5.record_custom_metrics(conn), setup=server.advance)
+
+
+@pytest.mark.parametrize("script", ["working1", "auto6"])
+def test_pooled_cycle(run_cycle, script):
+    """Scripts that borrow from an import-time pool run against the default server."""
+    module = import_script(script)
+    run_cycle(module.record_sybase_metrics, setup=default_server.advance)
+
+
+@pytest.mark.parametrize("rows", [100, 10000])
+@pytest.mark.parametrize("script", ["apptest", "apptest2"])
+def test_execute_query(run_cycle, fake_server, script, rows):
+    module = import_script(script)
+    server = fake_server(table_rows=rows)
+    conn = server.connect()
+    results = run_cycle(lambda: module.execute_query(conn, "SELECT * FROM bench_rows"))
+    assert len(results) == rows
+
+
+@pytest.mark.parametrize("rows", [100, 10000])
+def test_stream_query(run_cycle, fake_server, rows):
+    """Peak allocation stays flat as the result grows, unlike execute_query."""
+    apptest2 = import_script("apptest2")
+    server = fake_server(table_rows=rows)
+    conn = server.connect()
+
+    def consume():
+        fetched = 0
+        for _ in apptest2.stream_query(conn, "SELECT * FROM bench_rows"):
+            fetched += 1
+        return fetched
+
+    assert run_cycle(consume) == rows
@@ -0,0 +1,80 @@
+"""Export throughput: OTLP encoding of what the collection cycles produce."""
+import gzip
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from opentelemetry.exporter.otlp.proto.common.metrics_encoder import encode_metrics  # noqa: E402
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans  # noqa: E402
+
+from conftest import import_script, telemetry  # noqa: E402
+
+CYCLES = 20
+
+
+@pytest.fixture
+def produced(fake_server):
+    """Run the auto.py pull cycle a few times and return what it exported."""
+    auto = import_script("auto")
+    server = fake_server(processes=500)
+    conn = server.connect()
+    attributes = {"sybase.server": "bench_export", "db.system": "sybase"}
+    telemetry.span_exporter.clear()
+    for _ in range(CYCLES):
+        server.advance()
+        auto.snapshot_target(conn, attributes)
+    telemetry.span_processor.force_flush()
+    spans = telemetry.span_exporter.get_finished_spans()
+    metrics_data = telemetry.metric_readers[0].get_metrics_data()
+    auto.spid_counters.pop("bench_export", None)
+    if auto.mda_collector is not None:
+        auto.mda_collector.forget("bench_export")
+    return spans, metrics_data
+
+
+def test_encode_spans(benchmark, produced):
+    spans, _ = produced
+    request = benchmark(lambda: encode_spans(spans).SerializeToString())
+    benchmark.extra_info["spans"] = len(spans)
+    if benchmark.stats:  # None under --benchmark-disable
+        benchmark.extra_info["spans_per_second"] = len(spans) / benchmark.stats.stats.mean
+    benchmark.extra_info["request_bytes"] = len(request)
+
+
+def test_encode_metrics(benchmark, produced):
+    _, metrics_data = produced
+    points = sum(
+        len(metric.data.data_points)
+        for resource_metrics in metrics_data.resource_metrics
+        for scope_metrics in resource_metrics.scope_metrics
+        for metric in scope_metrics.metrics
+    )
+    request = benchmark(lambda: encode_metrics(metrics_data).SerializeToString())
+    benchmark.extra_info["data_points"] = points
+    if benchmark.stats:
+        benchmark.extra_info["points_per_second"] = points / benchmark.stats.stats.mean
+    benchmark.extra_info["request_bytes"] = len(request)
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+@pytest.mark.parametrize("batch_size", [64, 512, 4096])
+def test_export_settings(benchmark, produced, batch_size, compression):
+    """Request bytes and CPU per span for the batch sizes and compression the export tuner chooses from."""
+    spans, _ = produced
+    spans = (spans * (4096 // len(spans) + 1))[:4096]  # Enough for one full batch at the largest size
+
+    def export_all():
+        sent = 0
+        for start in range(0, len(spans), batch_size):
+            request = encode_spans(spans[start:start + batch_size]).SerializeToString()
+            if compression == "gzip":
+                request = gzip.compress(request, compresslevel=6)  # grpc's default gzip level
+            sent += len(request)
+        return sent
+
+    sent = benchmark(export_all)
+    benchmark.extra_info["spans"] = len(spans)
+    benchmark.extra_info["bytes_per_span"] = sent / len(spans)
+    if benchmark.stats:
+        benchmark.extra_info["cpu_us_per_span"] = benchmark.stats.stats.mean / len(spans) * 1e6
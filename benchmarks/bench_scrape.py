@@ -0,0 +1,41 @@
+"""Prometheus scrape cost: the Flask apps' cached exposition against encoding per scrape."""
+import psutil
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from prometheus_client import CollectorRegistry, Gauge, ProcessCollector, generate_latest  # noqa: E402
+
+from lib.promsampler import ExpositionCache, MetricSampler  # noqa: E402
+
+
+@pytest.fixture
+def registry():
+    """The Flask apps' gauges plus the process collector prometheus_client registers by default."""
+    registry = CollectorRegistry()
+    ProcessCollector(registry=registry)
+    cpu = Gauge("flask_app_cpu_usage", "CPU usage of Flask app", registry=registry)
+    memory = Gauge("flask_app_memory_usage", "Memory usage of Flask app", registry=registry)
+    return registry, cpu, memory
+
+
+def test_scrape_uncached(benchmark, registry):
+    registry, cpu, memory = registry
+
+    def scrape():
+        cpu.set(psutil.cpu_percent())
+        memory.set(psutil.virtual_memory().percent)
+        return generate_latest(registry)
+
+    benchmark.extra_info["response_bytes"] = len(benchmark(scrape))
+
+
+def test_scrape_cached(benchmark, registry):
+    registry, cpu, memory = registry
+    cache = ExpositionCache(registry)
+    sampler = MetricSampler(cache)
+    sampler.add(cpu, psutil.cpu_percent)
+    sampler.add(memory, lambda: psutil.virtual_memory().percent)
+    sampler.sample()  # What the sampler thread does between scrapes
+    body, _ = benchmark(cache.get, "text/plain")
+    benchmark.extra_info["response_bytes"] = len(body)
@@ -0,0 +1,110 @@
+"""Spool replay against a local fake OTLP/gRPC receiver: delivery order across an outage, and drain rate."""
+import socket
+import threading
+from concurrent import futures
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+grpc = pytest.importorskip("grpc")
+
+from lib.spool import TRACE_EXPORT_METHOD, SegmentSpool, SpoolReplayer  # noqa: E402
+
+BATCHES = 50
+REJECTED = b"rejected"  # Payload the fake receiver refuses with INVALID_ARGUMENT
+
+
+class FakeReceiver:
+    """In-process OTLP trace receiver recording raw request bytes in arrival order."""
+
+    def __init__(self, port):
+        self.port = port
+        self.requests = []
+        self.received = threading.Condition()
+        self._server = None
+
+    def _export(self, request, context):
+        if request == REJECTED:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "malformed request")
+        with self.received:
+            self.requests.append(request)
+            self.received.notify_all()
+        return b""  # An empty ExportTraceServiceResponse
+
+    def start(self):
+        service, method = TRACE_EXPORT_METHOD.strip("/").split("/")
+        handler = grpc.method_handlers_generic_handler(
+            service, {method: grpc.unary_unary_rpc_method_handler(self._export)}
+        )
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=2), handlers=[handler])
+        self._server.add_insecure_port(f"127.0.0.1:{self.port}")
+        self._server.start()
+
+    def wait_for(self, count, timeout):
+        with self.received:
+            return self.received.wait_for(lambda: len(self.requests) >= count, timeout)
+
+    def stop(self):
+        if self._server is not None:
+            self._server.stop(None)
+
+
+@pytest.fixture
+def receiver():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    receiver = FakeReceiver(port)
+    yield receiver
+    receiver.stop()
+
+
+def spool_batches(spool, count):
+    """Append ``count`` numbered batches and return them in order."""
+    batches = [f"batch-{i:05d}".encode() * 20 for i in range(count)]
+    for batch in batches:
+        spool.append(batch)
+    return batches
+
+
+def test_replay_after_outage(tmp_path, receiver):
+    """Batches spooled while the receiver is down arrive in order once it is up; a rejected one is skipped."""
+    spool = SegmentSpool(str(tmp_path), segment_bytes=4096)
+    replayer = SpoolReplayer(spool, f"127.0.0.1:{receiver.port}", TRACE_EXPORT_METHOD, timeout=2, max_backoff=1)
+    replayer.start()
+    try:
+        batches = spool_batches(spool, BATCHES)
+        spool.append(REJECTED)
+        batches += spool_batches(spool, 5)
+        replayer.notify()
+        assert not receiver.wait_for(1, timeout=0.5)  # Nothing to deliver to yet
+
+        receiver.start()
+        assert receiver.wait_for(len(batches), timeout=30)
+        assert receiver.requests == batches
+        assert replayer.rejected_records == 1
+    finally:
+        replayer.stop(timeout=5)
+        spool.close()
+
+
+def test_drain_rate(benchmark, tmp_path, receiver):
+    receiver.start()
+    spool = SegmentSpool(str(tmp_path), segment_bytes=64 * 1024)
+    replayer = SpoolReplayer(spool, f"127.0.0.1:{receiver.port}", TRACE_EXPORT_METHOD, timeout=2)
+    expected = []
+
+    def setup():
+        expected.extend(spool_batches(spool, BATCHES))
+
+    def drain():
+        replayer.notify()
+        assert receiver.wait_for(len(expected), timeout=30)
+
+    replayer.start()
+    try:
+        benchmark.pedantic(drain, setup=setup, rounds=5)
+        assert receiver.requests == expected
+    finally:
+        replayer.stop(timeout=5)
+        spool.close()
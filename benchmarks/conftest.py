@@ -0,0 +1,92 @@
+"""Fixtures shared by the benchmarks: in-memory telemetry and fake Sybase drivers.
+
+Both are installed before any collector script is imported. The scripts'
+own ``setup_telemetry()`` calls then return the in-memory setup below, and
+their ``import sybpydb``/``pysyb``/``pyodbc`` pick up the fake drivers.
+"""
+import os
+import sys
+import logging
+import tracemalloc
+import importlib
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fake_sybase  # noqa: E402
+from lib.bootstrap import setup_telemetry  # noqa: E402
+
+ROUNDS = 20
+
+telemetry = setup_telemetry(
+    service_name="sybase_bench",
+    traces="memory",
+    metrics="memory",
+    logs="memory",
+    log_level=logging.WARNING,
+)
+
+# Scripts that build a connection pool at import time keep talking to this one
+default_server = fake_sybase.FakeSybase()
+fake_sybase.install(default_server)
+
+
+def import_script(name):
+    """Import a collector script from the repository root, skipping if it cannot load."""
+    try:
+        return importlib.import_module(name)
+    except Exception as e:
+        pytest.skip(f"{name}.py cannot be imported here: {e}")
+
+
+@pytest.fixture
+def fake_server():
+    """Factory for FakeSybase servers; the last one created receives new connections."""
+
+    def create(**options):
+        server = fake_sybase.FakeSybase(**options)
+        fake_sybase.install(server)
+        return server
+
+    yield create
+    fake_sybase.install(default_server)
+
+
+def measure_allocations(func, setup=None, rounds=ROUNDS):
+    """Average peak and retained bytes allocated by one call of ``func``."""
+    peak = retained = 0
+    tracemalloc.start()
+    try:
+        for _ in range(rounds):
+            if setup is not None:
+                setup()
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func()
+            current, high = tracemalloc.get_traced_memory()
+            peak += high - before
+            retained += current - before
+    finally:
+        tracemalloc.stop()
+    return peak // rounds, retained // rounds
+
+
+@pytest.fixture
+def run_cycle(benchmark):
+    """Benchmark one collection cycle and attach its allocation profile.
+
+    ``setup`` (typically ``server.advance``) runs before every round and is
+    not timed, so delta-based collectors always have new work to do.
+    """
+
+    def run(func, setup=None, rounds=ROUNDS):
+        result = benchmark.pedantic(func, setup=setup, rounds=rounds, warmup_rounds=1)
+        peak, retained = measure_allocations(func, setup, rounds=min(rounds, 5))
+        benchmark.extra_info["alloc_peak_bytes"] = peak
+        benchmark.extra_info["alloc_retained_bytes"] = retained
+        return result
+
+    return run
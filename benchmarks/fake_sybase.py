@@ -0,0 +1,332 @@
+"""In-process stand-in for the sybpydb, pysyb and pyodbc drivers.
+
+``FakeSybase`` keeps synthetic copies of the ASE system and MDA tables the
+collectors read (master..sysprocesses, syslogins, syslogshold, monProcessActivity,
+monOpenObjectActivity, monEngine, monCachePool, monSysStatement) plus a
+plain ``bench_rows`` table, all in a shared in-memory SQLite database.
+Queries are rewritten from Transact-SQL just enough for the collectors'
+statements to run: ``master..`` prefixes, ``DB_ID()``, ``GETDATE()``,
+``SELECT TOP n`` and multi-statement batches (one result set each, walked
+with ``nextset()``). Every execute sleeps ``latency`` seconds to stand in
+for the network round trip, and ``advance()`` grows the counters between
+cycles so delta-based collectors see realistic work.
+"""
+import re
+import sys
+import time
+import types
+import random
+import sqlite3
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+STATUSES = ("active", "running", "runnable", "sleeping", "recv sleep", "send sleep", "lock sleep")
+
+_SCHEMA = """
+CREATE TABLE sysprocesses (
+    spid INTEGER, kpid INTEGER, dbid INTEGER, status TEXT, suid INTEGER,
+    cpu INTEGER, physical_io INTEGER, logical_reads INTEGER, writes INTEGER
+);
+CREATE TABLE syslogins (suid INTEGER, name TEXT, logindatetime REAL);
+CREATE TABLE syslogshold (dbid INTEGER, spid INTEGER, starttime DATETIME, name TEXT);
+CREATE TABLE monProcessActivity (
+    SPID INTEGER, KPID INTEGER, CPUTime INTEGER, WaitTime INTEGER,
+    LogicalReads INTEGER, PhysicalReads INTEGER, PhysicalWrites INTEGER
+);
+CREATE TABLE monOpenObjectActivity (
+    DBID INTEGER, ObjectID INTEGER, IndexID INTEGER, DBName TEXT,
+    LogicalReads INTEGER, PhysicalReads INTEGER, RowsInserted INTEGER,
+    RowsDeleted INTEGER, RowsUpdated INTEGER, LockWaits INTEGER
+);
+CREATE TABLE monEngine (
+    EngineNumber INTEGER, UserCPUTime INTEGER, SystemCPUTime INTEGER, IdleCPUTime INTEGER
+);
+CREATE TABLE monCachePool (
+    CacheName TEXT, IOBufferSize INTEGER, PagesRead INTEGER, PhysicalReads INTEGER, Stalls INTEGER
+);
+CREATE TABLE monSysStatement (
+    SPID INTEGER, KPID INTEGER, DBID INTEGER, BatchID INTEGER, LineNumber INTEGER,
+    StartTime DATETIME, EndTime DATETIME, CpuTime INTEGER, WaitTime INTEGER,
+    LogicalReads INTEGER, PhysicalReads INTEGER
+);
+CREATE INDEX monSysStatement_EndTime ON monSysStatement (EndTime);
+CREATE TABLE bench_rows (id INTEGER PRIMARY KEY, name TEXT, amount REAL, created DATETIME);
+"""
+
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# DATETIME columns come back as datetime objects, like the real drivers return
+sqlite3.register_converter("DATETIME", lambda value: datetime.strptime(value.decode(), _TIMESTAMP_FORMAT))
+
+_instances = itertools.count()
+
+
+class Error(Exception):
+    """DB-API base error raised by the fake drivers."""
+
+
+class FakeSybase:
+    """A synthetic ASE server shared by every connection opened against it."""
+
+    def __init__(self, processes=200, logins=100, open_transactions=5, databases=4,
+                 objects=50, engines=4, statements=200, table_rows=1000, latency=0.0, seed=0):
+        self.processes = processes
+        self.databases = {"master": 1, **{f"db{index}": index for index in range(2, databases + 1)}}
+        self.statements_per_advance = statements
+        self.latency = latency
+        self.executes = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._uri = f"file:fake_sybase_{next(_instances)}?mode=memory&cache=shared"
+        # Keeps the shared in-memory database alive for the server's lifetime
+        self._master = self._open()
+        self._batch = itertools.count(1)
+        self._clock = datetime(2024, 1, 1)
+        self._populate(logins, open_transactions, objects, engines, table_rows)
+
+    def _open(self):
+        return sqlite3.connect(
+            self._uri, uri=True, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES
+        )
+
+    def _populate(self, logins, open_transactions, objects, engines, table_rows):
+        rand = self._random
+        dbids = list(self.databases.values())
+        db = self._master
+        db.executescript(_SCHEMA)
+        db.executemany(
+            "INSERT INTO sysprocesses VALUES (?, ?, ?, ?, ?, 0, 0, ?, ?)",
+            [
+                (spid, spid * 1000, rand.choice(dbids), rand.choice(STATUSES), rand.randint(1, max(logins, 1)),
+                 rand.randint(0, 10000), rand.randint(0, 1000))
+                for spid in range(1, self.processes + 1)
+            ],
+        )
+        now = time.time() / 86400 + 2440587.5  # Julian day, as SQLite's julianday('now')
+        db.executemany(
+            "INSERT INTO syslogins VALUES (?, ?, ?)",
+            [(suid, f"login{suid}", now - rand.uniform(0, 3)) for suid in range(1, logins + 1)],
+        )
+        db.executemany(
+            "INSERT INTO syslogshold VALUES (?, ?, ?, ?)",
+            [
+                (rand.choice(dbids), rand.randint(1, max(self.processes, 1)), self._timestamp(), "$user_transaction")
+                for _ in range(open_transactions)
+            ],
+        )
+        db.executemany(
+            "INSERT INTO monProcessActivity VALUES (?, ?, 0, 0, 0, 0, 0)",
+            [(spid, spid * 1000) for spid in range(1, self.processes + 1)],
+        )
+        names = {dbid: name for name, dbid in self.databases.items()}
+        db.executemany(
+            "INSERT INTO monOpenObjectActivity VALUES (?, ?, 0, ?, 0, 0, 0, 0, 0, 0)",
+            [(dbid, object_id, names[dbid]) for dbid in dbids for object_id in range(objects)],
+        )
+        db.executemany("INSERT INTO monEngine VALUES (?, 0, 0, 0)", [(engine,) for engine in range(engines)])
+        db.executemany(
+            "INSERT INTO monCachePool VALUES (?, ?, 0, 0, 0)",
+            [("default data cache", size) for size in (2048, 16384)],
+        )
+        db.executemany(
+            "INSERT INTO bench_rows VALUES (?, ?, ?, ?)",
+            [(row, f"row{row}", rand.uniform(0, 1000), self._timestamp()) for row in range(table_rows)],
+        )
+        db.commit()
+
+    def _timestamp(self):
+        return self._clock.strftime(_TIMESTAMP_FORMAT)
+
+    def advance(self, seconds=10):
+        """Move the server forward: grow counters and finish a batch of statements."""
+        with self._lock:
+            rand = self._random
+            started = self._clock
+            self._clock += timedelta(seconds=seconds)
+            db = self._master
+            db.execute(
+                "UPDATE sysprocesses SET logical_reads = logical_reads + abs(random() % 500), "
+                "writes = writes + abs(random() % 50), cpu = cpu + abs(random() % 10)"
+            )
+            db.execute(
+                "UPDATE monProcessActivity SET CPUTime = CPUTime + abs(random() % 10), "
+                "WaitTime = WaitTime + abs(random() % 10), LogicalReads = LogicalReads + abs(random() % 500), "
+                "PhysicalReads = PhysicalReads + abs(random() % 20), PhysicalWrites = PhysicalWrites + abs(random() % 20)"
+            )
+            db.execute(
+                "UPDATE monOpenObjectActivity SET LogicalReads = LogicalReads + abs(random() % 100), "
+                "RowsInserted = RowsInserted + abs(random() % 5), LockWaits = LockWaits + abs(random() % 2)"
+            )
+            db.execute(
+                "UPDATE monEngine SET UserCPUTime = UserCPUTime + abs(random() % 100), "
+                "IdleCPUTime = IdleCPUTime + abs(random() % 100)"
+            )
+            db.execute("UPDATE monCachePool SET PagesRead = PagesRead + abs(random() % 1000)")
+            rows = []
+            for line in range(self.statements_per_advance):
+                start = started + timedelta(seconds=rand.uniform(0, seconds))
+                end = start + timedelta(milliseconds=rand.uniform(0, 500))
+                spid = rand.randint(1, max(self.processes, 1))
+                rows.append((
+                    spid, spid * 1000, 1, next(self._batch), line,
+                    start.strftime(_TIMESTAMP_FORMAT), min(end, self._clock).strftime(_TIMESTAMP_FORMAT),
+                    rand.randint(0, 50), rand.randint(0, 50), rand.randint(0, 5000), rand.randint(0, 50),
+                ))
+            db.executemany("INSERT INTO monSysStatement VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            db.commit()
+
+    def connect(self, *args, **kwargs):
+        """Open a connection; accepts the sybpydb/pysyb keywords or an ODBC string."""
+        database = kwargs.get("database") or kwargs.get("db")
+        for value in list(args) + [kwargs.get("dsn", "")]:
+            match = re.search(r"database=([^;]+)", value or "", re.IGNORECASE)
+            if match:
+                database = match.group(1)
+        return FakeConnection(self, self.databases.get(database, 1))
+
+
+class FakeConnection:
+    """DB-API connection onto a FakeSybase; each has its own SQLite handle."""
+
+    def __init__(self, server, dbid):
+        self.server = server
+        self.dbid = dbid
+        self.closed = False
+        self._db = server._open()
+
+    def cursor(self):
+        if self.closed:
+            raise Error("Connection is closed")
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._db.close()
+
+
+class FakeCursor:
+    """Cursor that walks the statements of a batch as successive result sets.
+
+    Rows are stepped out of SQLite as they are fetched, so ``fetchmany``
+    streams a large result instead of materializing it.
+    """
+
+    arraysize = 100
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self._pending = []
+        self._params = ()
+        self._cursor = None
+
+    def execute(self, sql, params=None):
+        server = self.connection.server
+        if server.latency:
+            time.sleep(server.latency)
+        server.executes += 1
+        self._pending = [_translate(statement, self.connection.dbid) for statement in _split_batch(sql)]
+        self._params = params or ()
+        self.nextset()
+        return self
+
+    def nextset(self):
+        """Run the next statement of the batch; returns None when there are no more."""
+        self._close_result()
+        if not self._pending:
+            self.description = None
+            return None
+        try:
+            self._cursor = self.connection._db.execute(self._pending.pop(0), self._params)
+        except sqlite3.Error as e:
+            raise Error(str(e)) from e
+        self.description = self._cursor.description
+        self.rowcount = self._cursor.rowcount
+        return True
+
+    def fetchone(self):
+        return self._cursor.fetchone() if self._cursor is not None else None
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        return self._cursor.fetchmany(size) if self._cursor is not None else []
+
+    def fetchall(self):
+        return self._cursor.fetchall() if self._cursor is not None else []
+
+    def cancel(self):
+        self._pending = []
+        self._close_result()
+
+    def _close_result(self):
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+    def close(self):
+        self.cancel()
+
+
+def _split_batch(sql):
+    """Split a Transact-SQL batch into statements on semicolons and blank lines."""
+    statements = re.split(r";|\n\s*\n", sql)
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def _translate(statement, dbid):
+    statement = statement.replace("master..", "")
+    statement = re.sub(r"\bDB_ID\(\)", str(dbid), statement, flags=re.IGNORECASE)
+    statement = re.sub(r"\bGETDATE\(\)", "julianday('now')", statement, flags=re.IGNORECASE)
+    top = re.match(r"SELECT\s+TOP\s+(\d+)\s+", statement, re.IGNORECASE)
+    if top:
+        statement = f"SELECT {statement[top.end():]} LIMIT {top.group(1)}"
+    return statement
+
+
+DRIVERS = ("sybpydb", "pysyb", "pyodbc")
+
+_active = None
+
+
+def _connect(*args, **kwargs):
+    if _active is None:
+        raise Error("No FakeSybase server is installed")
+    return _active.connect(*args, **kwargs)
+
+
+def install(server):
+    """Route ``connect()`` of the fake driver modules to ``server``.
+
+    Scripts bind ``connect`` when they are imported, so the modules are
+    registered once and later calls only switch the active server.
+    """
+    global _active
+    _active = server
+    for name in DRIVERS:
+        if getattr(sys.modules.get(name), "FAKE", False):
+            continue
+        module = types.ModuleType(name)
+        module.FAKE = True
+        module.connect = _connect
+        module.Error = Error
+        module.apilevel = "2.0"
+        module.paramstyle = "qmark"
+        sys.modules[name] = module
+
+
+def uninstall():
+    """Remove the fake driver modules."""
+    global _active
+    _active = None
+    for name in DRIVERS:
+        if getattr(sys.modules.get(name), "FAKE", False):
+            del sys.modules[name]
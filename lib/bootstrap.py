@@ -0,0 +1,323 @@
+"""Shared telemetry bootstrap: tracer, meter and logger providers from config.
+
+Importing this module is cheap. The SDK and the exporter backends are only
+imported inside ``setup_telemetry``, and only for the backends a config
+selects, so a console-only or OTLP-only probe does not pay for gRPC, Jaeger
+or Prometheus imports it never uses. The time spent importing and
+initializing is recorded in ``Telemetry.timings`` and logged.
+"""
+import time
+import atexit
+import logging
+import importlib
+
+logger = logging.getLogger("sybase_app")
+
+DEFAULT_CONFIG = {
+    "service_name": "sybase_app",
+    "resource": {},  # Extra resource attributes
+    "endpoint": "http://localhost:4317",
+    "insecure": True,
+    "compression": None,  # "gzip" or "deflate" for the OTLP and spool exporters
+    "traces": "otlp",  # "otlp", "console", "jaeger", "spool", "memory" or None
+    "metrics": "otlp",  # "otlp", "console", "prometheus", "spool", "memory" or None
+    "logs": "otlp",  # "otlp", "console", "spool", "memory" or None
+    "metric_interval_millis": 10000,
+    "batch_queue_size": None,  # Span and log batch processor queue capacity; None keeps the SDK default
+    "export_tuning": None,  # AdaptiveBatchTuner options, e.g. {"max_batch_size": 4096}, see lib.export_tuning
+    "spool_dir": None,  # Required by the "spool" backends
+    "jaeger_agent_host": "localhost",
+    "jaeger_agent_port": 6831,
+    "system_metrics": False,
+    "span_rate_limits": None,  # {span name: root spans per second}, see lib.sampling
+    "tail_sampling": None,  # TailSamplingSpanProcessor options, e.g. {"keep_ratio": 0.05}
+    "exemplars": "trace_based",  # Exemplar filter: "trace_based", "always_on" or "always_off"
+    "slowest_exemplars": False,  # Keep the slowest measurement per histogram bucket
+    "views": None,  # Metric view specs, see lib.views
+    "log_level": logging.INFO,
+    "log_queue_size": None,  # Log through a bounded queue and a listener thread, see lib.logpipeline
+}
+
+
+class Telemetry:
+    """The providers built by ``setup_telemetry`` plus handy defaults."""
+
+    def __init__(self, config):
+        self.config = config
+        self.resource = None
+        self.tracer_provider = None
+        self.meter_provider = None
+        self.logger_provider = None
+        self.span_processor = None
+        self.span_exporter = None
+        self.sampler = None
+        self.rate_limiter = None
+        self.tail_sampler = None
+        self.log_processor = None
+        self.log_exporter = None
+        self.log_queue_handler = None
+        self.log_listener = None
+        self.export_tuners = {}  # signal -> AdaptiveBatchTuner
+        self.metric_readers = []
+        self.timings = {"import_ms": 0.0, "init_ms": 0.0}
+
+    @property
+    def tracer(self):
+        from opentelemetry import trace
+
+        return trace.get_tracer(self.config["service_name"])
+
+    @property
+    def meter(self):
+        from opentelemetry import metrics
+
+        return metrics.get_meter(self.config["service_name"])
+
+    @property
+    def logger(self):
+        return logging.getLogger(self.config["service_name"])
+
+
+_telemetry = None
+
+
+def _import(telemetry, module, name=None):
+    """Import ``module`` (or ``module.name``), charging the time to the import budget."""
+    started = time.perf_counter()
+    value = importlib.import_module(module)
+    if name is not None:
+        value = getattr(value, name)
+    telemetry.timings["import_ms"] += (time.perf_counter() - started) * 1000
+    return value
+
+
+# === Backends ===
+def _compression(telemetry):
+    name = telemetry.config["compression"]
+    if name is None:
+        return None
+    compression = _import(telemetry, "grpc", "Compression")
+    if name == "gzip":
+        return compression.Gzip
+    if name == "deflate":
+        return compression.Deflate
+    raise ValueError(f"Unknown compression: {name}")
+
+
+def _span_exporter(telemetry):
+    config = telemetry.config
+    backend = config["traces"]
+    if backend == "otlp":
+        exporter = _import(telemetry, "opentelemetry.exporter.otlp.proto.grpc.trace_exporter", "OTLPSpanExporter")
+        return exporter(endpoint=config["endpoint"], insecure=config["insecure"], compression=_compression(telemetry))
+    if backend == "console":
+        return _import(telemetry, "opentelemetry.sdk.trace.export", "ConsoleSpanExporter")()
+    if backend == "jaeger":
+        exporter = _import(telemetry, "opentelemetry.exporter.jaeger.thrift", "JaegerExporter")
+        return exporter(agent_host_name=config["jaeger_agent_host"], agent_port=config["jaeger_agent_port"])
+    if backend == "spool":
+        exporter = _import(telemetry, "lib.spool", "SpoolingSpanExporter")
+        return exporter(
+            f"{config['spool_dir']}/traces",
+            endpoint=config["endpoint"],
+            insecure=config["insecure"],
+            compression=_compression(telemetry),
+        )
+    if backend == "memory":
+        return _import(telemetry, "opentelemetry.sdk.trace.export.in_memory_span_exporter", "InMemorySpanExporter")()
+    raise ValueError(f"Unknown traces backend: {backend}")
+
+
+def _metric_reader(telemetry):
+    config = telemetry.config
+    backend = config["metrics"]
+    if backend == "prometheus":
+        # Registers with prometheus_client; serve it with start_http_server()
+        return _import(telemetry, "opentelemetry.exporter.prometheus", "PrometheusMetricReader")()
+    if backend == "memory":
+        # Collected on demand with get_metrics_data()
+        return _import(telemetry, "opentelemetry.sdk.metrics.export", "InMemoryMetricReader")()
+    if backend == "otlp":
+        exporter = _import(telemetry, "opentelemetry.exporter.otlp.proto.grpc.metric_exporter", "OTLPMetricExporter")
+        exporter = exporter(
+            endpoint=config["endpoint"], insecure=config["insecure"], compression=_compression(telemetry)
+        )
+    elif backend == "console":
+        exporter = _import(telemetry, "opentelemetry.sdk.metrics.export", "ConsoleMetricExporter")()
+    elif backend == "spool":
+        exporter = _import(telemetry, "lib.spool", "SpoolingMetricExporter")
+        exporter = exporter(
+            f"{config['spool_dir']}/metrics",
+            endpoint=config["endpoint"],
+            insecure=config["insecure"],
+            compression=_compression(telemetry),
+        )
+    else:
+        raise ValueError(f"Unknown metrics backend: {backend}")
+    reader = _import(telemetry, "opentelemetry.sdk.metrics.export", "PeriodicExportingMetricReader")
+    return reader(exporter, export_interval_millis=config["metric_interval_millis"])
+
+
+def _log_exporter(telemetry):
+    config = telemetry.config
+    backend = config["logs"]
+    if backend == "otlp":
+        exporter = _import(telemetry, "opentelemetry.exporter.otlp.proto.grpc._log_exporter", "OTLPLogExporter")
+        return exporter(endpoint=config["endpoint"], insecure=config["insecure"], compression=_compression(telemetry))
+    if backend == "console":
+        return _import(telemetry, "opentelemetry.sdk._logs.export", "ConsoleLogExporter")()
+    if backend == "spool":
+        exporter = _import(telemetry, "lib.spool", "SpoolingLogExporter")
+        return exporter(
+            f"{config['spool_dir']}/logs",
+            endpoint=config["endpoint"],
+            insecure=config["insecure"],
+            compression=_compression(telemetry),
+        )
+    if backend == "memory":
+        export = _import(telemetry, "opentelemetry.sdk._logs.export")
+        # Renamed to InMemoryLogRecordExporter in newer SDKs
+        exporter = getattr(export, "InMemoryLogRecordExporter", None) or export.InMemoryLogExporter
+        return exporter()
+    raise ValueError(f"Unknown logs backend: {backend}")
+
+
+# === Providers ===
+def _batch_processor(telemetry, batch_processor, exporter, signal):
+    """Build a span or log batch processor and, if configured, its export tuner."""
+    config = telemetry.config
+    options = {}
+    if config["batch_queue_size"]:
+        options["max_queue_size"] = config["batch_queue_size"]
+    processor = batch_processor(exporter, **options)
+    if config["export_tuning"] is not None:
+        tuner = _import(telemetry, "lib.export_tuning", "AdaptiveBatchTuner")
+        telemetry.export_tuners[signal] = tuner(processor, signal, **config["export_tuning"])
+        telemetry.export_tuners[signal].start()
+    return processor
+
+
+def _setup_traces(telemetry):
+    trace = _import(telemetry, "opentelemetry.trace")
+    tracer_provider = _import(telemetry, "opentelemetry.sdk.trace", "TracerProvider")
+    batch_processor = _import(telemetry, "opentelemetry.sdk.trace.export", "BatchSpanProcessor")
+    config = telemetry.config
+    if config["span_rate_limits"]:
+        rate_limiter = _import(telemetry, "lib.sampling", "RateLimitingSampler")
+        parent_based = _import(telemetry, "opentelemetry.sdk.trace.sampling", "ParentBased")
+        # Only roots are rate-limited; children follow their root's decision
+        telemetry.rate_limiter = rate_limiter(config["span_rate_limits"])
+        telemetry.sampler = parent_based(root=telemetry.rate_limiter)
+    telemetry.tracer_provider = tracer_provider(resource=telemetry.resource, sampler=telemetry.sampler)
+    if config["traces"]:
+        telemetry.span_exporter = _span_exporter(telemetry)
+        telemetry.span_processor = _batch_processor(telemetry, batch_processor, telemetry.span_exporter, "traces")
+        processor = telemetry.span_processor
+        if config["tail_sampling"] is not None:
+            tail_sampler = _import(telemetry, "lib.sampling", "TailSamplingSpanProcessor")
+            processor = telemetry.tail_sampler = tail_sampler(processor, **config["tail_sampling"])
+        telemetry.tracer_provider.add_span_processor(processor)
+    trace.set_tracer_provider(telemetry.tracer_provider)
+
+
+def _setup_metrics(telemetry):
+    metrics = _import(telemetry, "opentelemetry.metrics")
+    meter_provider = _import(telemetry, "opentelemetry.sdk.metrics", "MeterProvider")
+    config = telemetry.config
+    if config["metrics"]:
+        telemetry.metric_readers.append(_metric_reader(telemetry))
+    exemplar_filter = {
+        "trace_based": "TraceBasedExemplarFilter",
+        "always_on": "AlwaysOnExemplarFilter",
+        "always_off": "AlwaysOffExemplarFilter",
+    }[config["exemplars"]]
+    views = []
+    reservoir_factory = None
+    if config["slowest_exemplars"]:
+        exemplars = _import(telemetry, "lib.exemplars")
+        # Exemplar traces must survive tail sampling to be worth linking to
+        pin = telemetry.tail_sampler.pin if telemetry.tail_sampler is not None else None
+        reservoir_factory = exemplars.slowest_exemplar_reservoir_factory(pin)
+    if config["views"]:
+        build_views = _import(telemetry, "lib.views", "build_views")
+        views = build_views(config["views"], exemplar_reservoir_factory=reservoir_factory)
+    if reservoir_factory is not None:
+        # Histograms no configured view matches still get the exemplar reservoir
+        views.append(exemplars.slowest_exemplar_view(pin, exclude=views))
+    telemetry.meter_provider = meter_provider(
+        resource=telemetry.resource,
+        metric_readers=telemetry.metric_readers,
+        views=views,
+        exemplar_filter=_import(telemetry, "opentelemetry.sdk.metrics", exemplar_filter)(),
+    )
+    metrics.set_meter_provider(telemetry.meter_provider)
+    if telemetry.config["system_metrics"]:
+        instrumentor = _import(telemetry, "opentelemetry.instrumentation.system_metrics", "SystemMetricsInstrumentor")
+        instrumentor().instrument(meter_provider=telemetry.meter_provider)
+
+
+def _setup_logs(telemetry):
+    config = telemetry.config
+    handlers = []
+    if config["logs"]:
+        set_logger_provider = _import(telemetry, "opentelemetry._logs", "set_logger_provider")
+        logger_provider = _import(telemetry, "opentelemetry.sdk._logs", "LoggerProvider")
+        logging_handler = _import(telemetry, "opentelemetry.sdk._logs", "LoggingHandler")
+        batch_processor = _import(telemetry, "opentelemetry.sdk._logs.export", "BatchLogRecordProcessor")
+        telemetry.logger_provider = logger_provider(resource=telemetry.resource)
+        telemetry.log_exporter = _log_exporter(telemetry)
+        telemetry.log_processor = _batch_processor(telemetry, batch_processor, telemetry.log_exporter, "logs")
+        telemetry.logger_provider.add_log_record_processor(telemetry.log_processor)
+        set_logger_provider(telemetry.logger_provider)
+        handlers.append(logging_handler(level=config["log_level"], logger_provider=telemetry.logger_provider))
+
+    root = logging.getLogger()
+    if not config["log_queue_size"]:
+        logging.basicConfig(level=config["log_level"])
+        for handler in handlers:
+            root.addHandler(handler)
+        return
+
+    # The caller only enqueues; console and OTLP handlers run on the listener thread
+    pipeline = _import(telemetry, "lib.logpipeline")
+    console = logging.StreamHandler()
+    console.setFormatter(pipeline.TraceContextFormatter(pipeline.CONSOLE_FORMAT))
+    telemetry.log_queue_handler = pipeline.CorrelatingQueueHandler(config["log_queue_size"])
+    telemetry.log_listener = pipeline.CorrelatingQueueListener(telemetry.log_queue_handler, console, *handlers)
+    root.setLevel(config["log_level"])
+    root.addHandler(telemetry.log_queue_handler)
+    telemetry.log_listener.start()
+    # Registered after the LoggerProvider's own hook, so the queue drains before it shuts down
+    atexit.register(telemetry.log_listener.stop)
+
+
+def setup_telemetry(config=None, **overrides):
+    """Build and install the global providers once; later calls return them.
+
+    ``config`` (a dict) and keyword ``overrides`` are layered over
+    ``DEFAULT_CONFIG``. A backend set to None skips that signal.
+    """
+    global _telemetry
+    if _telemetry is not None:
+        return _telemetry
+
+    started = time.perf_counter()
+    merged = dict(DEFAULT_CONFIG)
+    merged.update(config or {})
+    merged.update(overrides)
+    telemetry = Telemetry(merged)
+    resource = _import(telemetry, "opentelemetry.sdk.resources", "Resource")
+    telemetry.resource = resource.create(
+        dict(telemetry.config["resource"], **{"service.name": telemetry.config["service_name"]})
+    )
+    _setup_traces(telemetry)
+    _setup_metrics(telemetry)
+    _setup_logs(telemetry)
+
+    telemetry.timings["init_ms"] = (time.perf_counter() - started) * 1000 - telemetry.timings["import_ms"]
+    logger.info(
+        f"Telemetry ready in {telemetry.timings['import_ms'] + telemetry.timings['init_ms']:.0f} ms "
+        f"(imports {telemetry.timings['import_ms']:.0f} ms, init {telemetry.timings['init_ms']:.0f} ms)."
+    )
+    _telemetry = telemetry
+    return telemetry
@@ -0,0 +1,194 @@
+"""Bound the time a slow or sick Sybase server can cost the agent.
+
+Two tools. Deadlines cut off a single probe: ``CancellableConnection``
+remembers the cursors opened through it, and ``cancel`` interrupts their
+queries with ``cursor.cancel()``. If the driver has no cancel, the
+connection is closed instead. ``call_with_deadline`` runs a probe on a
+worker thread and gives up waiting after ``timeout`` seconds, so a
+sequential loop moves on even if the driver ignores the cancel. A
+``CircuitBreaker`` per target stops polling a server after
+``failure_threshold`` consecutive failures. Once ``reset_timeout`` seconds
+have passed, a single trial poll is let through (half-open). A success
+closes the circuit and a failure opens it again.
+"""
+import time
+import logging
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from opentelemetry.metrics import Observation
+
+logger = logging.getLogger("sybase_app")
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class QueryTimeout(Exception):
+    """Raised when a probe did not finish before its deadline."""
+
+
+class CircuitOpenError(Exception):
+    """Raised when a target's circuit breaker rejects a call."""
+
+
+class CancellableConnection:
+    """DB-API connection proxy whose running queries can be cancelled from another thread.
+
+    Cursors are remembered until ``cancel`` or ``reset``. A long-lived
+    connection calls ``reset`` at the start of each poll, so only that
+    poll's cursors are kept.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursors = []
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._conn.cursor(*args, **kwargs)
+        with self._lock:
+            self._cursors.append(cursor)
+        return cursor
+
+    def reset(self):
+        """Forget the cursors opened so far, e.g. those of a finished poll."""
+        with self._lock:
+            self._cursors = []
+
+    def cancel(self):
+        """Cancel the queries of every cursor opened so far; close the connection if none could be."""
+        with self._lock:
+            cursors, self._cursors = self._cursors, []
+        cancelled = 0
+        for cursor in cursors:
+            try:
+                cursor.cancel()
+                cancelled += 1
+            except Exception:
+                pass
+        if not cancelled:
+            try:
+                self._conn.close()  # Most drivers unblock the pending call when the socket closes
+            except Exception:
+                pass
+
+
+def call_with_deadline(func, conn, timeout, executor):
+    """Return ``func(conn)`` run on ``executor``, or raise QueryTimeout after ``timeout`` seconds.
+
+    On timeout the queries are cancelled and the worker is abandoned. The
+    connection must not be reused.
+    """
+    cancellable = CancellableConnection(conn)
+    future = executor.submit(func, cancellable)
+    try:
+        return future.result(timeout)
+    except FutureTimeout:
+        if not future.cancel():  # Still queued behind abandoned calls: it never runs
+            cancellable.cancel()
+        raise QueryTimeout(f"{getattr(func, '__name__', 'probe')} exceeded {timeout}s") from None
+
+
+class CircuitBreaker:
+    """Per-target circuit breaker: closed, open after repeated failures, then half-open."""
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=60, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0  # Consecutive failures
+        self.rejected = 0  # Calls refused while open
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go ahead now; at most one trial call runs while half-open."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                logger.info(f"Circuit for {self.name} half-open; sending a trial poll.")
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit for {self.name} closed.")
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = self.clock()
+                logger.warning(
+                    f"Circuit for {self.name} open after {self.failures} consecutive failure(s); "
+                    f"retrying in {self.reset_timeout}s."
+                )
+
+    def call(self, func, *args, **kwargs):
+        """Run ``func`` through the breaker, raising CircuitOpenError while it is open."""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit for {self.name} is open")
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+class BreakerBoard:
+    """One CircuitBreaker per target, with their states reported as a gauge."""
+
+    def __init__(self, meter=None, failure_threshold=3, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {}  # target name -> CircuitBreaker
+        self.timeouts = {}  # target name -> probes cut off by their deadline
+        if meter is not None:
+            meter.create_observable_gauge(
+                name="sybase_target_circuit_state",
+                callbacks=[self._observe_state],
+                description="Circuit breaker state per target: 0 closed, 1 half-open, 2 open",
+                unit="1",
+            )
+            meter.create_observable_counter(
+                name="sybase_probe_timeouts",
+                callbacks=[self._observe_timeouts],
+                description="Probes cancelled or abandoned because they passed their deadline",
+                unit="probes",
+            )
+
+    def get(self, name):
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(name, self.failure_threshold, self.reset_timeout)
+        return self.breakers[name]
+
+    def record_timeout(self, name):
+        self.timeouts[name] = self.timeouts.get(name, 0) + 1
+
+    def forget(self, name):
+        self.breakers.pop(name, None)
+        self.timeouts.pop(name, None)
+
+    def _observe_state(self, options):
+        return [
+            Observation(STATE_VALUES[breaker.state], {"sybase.server": name})
+            for name, breaker in list(self.breakers.items())
+        ]
+
+    def _observe_timeouts(self, options):
+        return [Observation(count, {"sybase.server": name}) for name, count in list(self.timeouts.items())]
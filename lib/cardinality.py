@@ -0,0 +1,217 @@
+"""Cap the number of distinct attribute sets (series) each instrument can create.
+
+Every distinct attribute set is a separate series that the SDK aggregates
+and keeps for the life of the process, so breaking metrics down by login,
+program name or statement can grow memory without bound. A
+``CardinalityLimitedMeter`` wraps a meter. Each instrument it creates
+admits up to ``max_series`` attribute sets. Later ones are folded into an
+overflow series whose values are ``"other"``; only the ``preserve`` keys
+(the target identity) stay. Admitted sets are never evicted, because the SDK
+would keep their storage anyway, so the cap is a hard bound.
+
+Observable counters report cumulative totals, so their overflow series
+keeps the last value of every source folded into it, including sources that
+have stopped reporting. Otherwise the total would drop when one goes away
+and show up as a counter reset.
+"""
+import threading
+
+from opentelemetry.metrics import Observation
+
+OVERFLOW_VALUE = "other"
+DEFAULT_PRESERVE = ("sybase.server", "db.system", "deployment.environment")
+
+
+def _series_key(attributes):
+    try:
+        return frozenset(attributes.items())
+    except TypeError:  # Sequence-valued attributes
+        return frozenset(
+            (key, tuple(value) if isinstance(value, list) else value) for key, value in attributes.items()
+        )
+
+
+class SeriesLimiter:
+    """Admit attribute sets for one instrument until its budget is spent.
+
+    ``allowlist`` maps the attribute keys the instrument may carry to None
+    (any value) or a set of allowed values; other keys are dropped and
+    values outside a set become ``"other"`` before the set is counted.
+    """
+
+    def __init__(self, name, max_series=500, allowlist=None, preserve=DEFAULT_PRESERVE, max_tracked_drops=10000):
+        self.name = name
+        self.max_series = max_series
+        self.allowlist = allowlist
+        self.preserve = frozenset(preserve)
+        self.max_tracked_drops = max_tracked_drops
+        self.overflow_measurements = 0
+        self.untracked_observations = 0  # Observable counter values dropped, see _limited_callback
+        self._series = {}  # series key -> admitted attributes
+        self._dropped = set()  # Hashes of folded series, up to max_tracked_drops
+        self._lock = threading.Lock()
+
+    @property
+    def series(self):
+        return len(self._series)
+
+    @property
+    def dropped_series(self):
+        """Distinct attribute sets folded into overflow; saturates at ``max_tracked_drops``."""
+        return len(self._dropped)
+
+    def _apply_allowlist(self, attributes):
+        allowed = {}
+        for key, value in attributes.items():
+            if key not in self.allowlist:
+                continue
+            values = self.allowlist[key]
+            allowed[key] = value if values is None or value in values else OVERFLOW_VALUE
+        return allowed
+
+    def fold(self, attributes):
+        """Return the attributes to record under: admitted as-is, or the overflow set."""
+        if not attributes:
+            return attributes
+        if self.allowlist is not None:
+            attributes = self._apply_allowlist(attributes)
+        key = _series_key(attributes)
+        admitted = self._series.get(key)
+        if admitted is not None:
+            return admitted
+
+        with self._lock:
+            if key in self._series:
+                return self._series[key]
+            if len(self._series) < self.max_series:
+                self._series[key] = attributes
+                return attributes
+            self.overflow_measurements += 1
+            if len(self._dropped) < self.max_tracked_drops:
+                self._dropped.add(hash(key))
+        return {
+            key: value if key in self.preserve else OVERFLOW_VALUE
+            for key, value in attributes.items()
+        }
+
+
+class _LimitedInstrument:
+    """Synchronous instrument whose attributes pass through a SeriesLimiter."""
+
+    def __init__(self, instrument, limiter):
+        self._instrument = instrument
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        return getattr(self._instrument, name)
+
+    def add(self, amount, attributes=None, context=None):
+        self._instrument.add(amount, self._limiter.fold(attributes), context)
+
+    def record(self, amount, attributes=None, context=None):
+        self._instrument.record(amount, self._limiter.fold(attributes), context)
+
+    def set(self, amount, attributes=None, context=None):
+        self._instrument.set(amount, self._limiter.fold(attributes), context)
+
+
+def _limited_callback(callback, limiter, monotonic=False):
+    """Fold a callback's observations; ones that land in the same series are summed.
+
+    With ``monotonic`` (observable counters), each source folded into a
+    series keeps contributing its last value after it stops reporting, so the
+    series never decreases. Up to ``max_tracked_drops`` sources are
+    remembered; observations of sources beyond that are dropped and counted
+    in ``untracked_observations``.
+    """
+    folded = {}  # series key -> (attributes, {source key -> last value}), for monotonic callbacks
+    tracked = 0  # Sources remembered across every series in ``folded``
+
+    def _callback(options):
+        nonlocal tracked
+        merged = {}
+        for observation in callback(options):
+            attributes = limiter.fold(observation.attributes)
+            key = _series_key(attributes or {})
+            if monotonic and attributes != observation.attributes:
+                series = folded.setdefault(key, (attributes, {}))[1]
+                source = _series_key(observation.attributes)
+                if source not in series:
+                    if tracked >= limiter.max_tracked_drops:
+                        limiter.untracked_observations += 1
+                        continue
+                    tracked += 1
+                series[source] = observation.value
+                continue
+            if key in merged:
+                attributes = merged[key].attributes
+                observation = Observation(merged[key].value + observation.value, attributes)
+            elif attributes is not observation.attributes:
+                observation = Observation(observation.value, attributes)
+            merged[key] = observation
+        for key, (attributes, series) in folded.items():
+            value = sum(series.values())
+            if key in merged:
+                value += merged[key].value
+            merged[key] = Observation(value, attributes)
+        return list(merged.values())
+
+    return _callback
+
+
+class CardinalityLimitedMeter:
+    """Meter wrapper whose instruments each admit at most ``max_series`` series.
+
+    ``allowlists`` maps instrument names to a SeriesLimiter allowlist;
+    ``limits`` overrides ``max_series`` per instrument name.
+    """
+
+    def __init__(self, meter, max_series=500, allowlists=None, limits=None, preserve=DEFAULT_PRESERVE):
+        self._meter = meter
+        self.max_series = max_series
+        self.allowlists = allowlists or {}
+        self.limits = limits or {}
+        self.preserve = preserve
+        self.limiters = {}  # instrument name -> SeriesLimiter
+
+    def __getattr__(self, name):
+        return getattr(self._meter, name)
+
+    def _limiter(self, name):
+        if name not in self.limiters:
+            self.limiters[name] = SeriesLimiter(
+                name,
+                max_series=self.limits.get(name, self.max_series),
+                allowlist=self.allowlists.get(name),
+                preserve=self.preserve,
+            )
+        return self.limiters[name]
+
+    def _synchronous(self, create, name, **kwargs):
+        return _LimitedInstrument(create(name=name, **kwargs), self._limiter(name))
+
+    def _observable(self, create, name, callbacks=None, monotonic=False, **kwargs):
+        limiter = self._limiter(name)
+        callbacks = [_limited_callback(callback, limiter, monotonic) for callback in callbacks or ()]
+        return create(name=name, callbacks=callbacks, **kwargs)
+
+    def create_counter(self, name, **kwargs):
+        return self._synchronous(self._meter.create_counter, name, **kwargs)
+
+    def create_up_down_counter(self, name, **kwargs):
+        return self._synchronous(self._meter.create_up_down_counter, name, **kwargs)
+
+    def create_histogram(self, name, **kwargs):
+        return self._synchronous(self._meter.create_histogram, name, **kwargs)
+
+    def create_gauge(self, name, **kwargs):
+        return self._synchronous(self._meter.create_gauge, name, **kwargs)
+
+    def create_observable_counter(self, name, callbacks=None, **kwargs):
+        return self._observable(self._meter.create_observable_counter, name, callbacks, monotonic=True, **kwargs)
+
+    def create_observable_up_down_counter(self, name, callbacks=None, **kwargs):
+        return self._observable(self._meter.create_observable_up_down_counter, name, callbacks, **kwargs)
+
+    def create_observable_gauge(self, name, callbacks=None, **kwargs):
+        return self._observable(self._meter.create_observable_gauge, name, callbacks, **kwargs)
@@ -0,0 +1,265 @@
+"""Concurrent polling of many Sybase servers from a single agent process."""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from lib.breaker import CancellableConnection
+from lib.scheduler import Probe, ProbeScheduler, adjust_backoff
+
+logger = logging.getLogger("sybase_app")
+
+
+class SybaseTarget:
+    """One Sybase server to poll, plus the attributes stamped on its metrics."""
+
+    def __init__(self, name, connect, attributes=None, spec=None):
+        self.name = name
+        self.connect = connect  # Zero-argument callable returning a DB-API connection
+        self.spec = spec  # The config the target was built from, compared on reload
+        self.attributes = {"db.system": "sybase", "sybase.server": name}
+        self.attributes.update(attributes or {})
+        self.conn = None
+        self.in_flight = None  # Future of the poll currently running, if any
+        self.poll_started = None  # Monotonic start of the latest poll
+        self.timed_out = False  # Whether the latest poll was cancelled at its deadline
+        self.deadline = None  # Timer that cancels the running poll at its deadline
+        self.backoff = 1  # The target is polled every ``backoff`` cycles
+        self.skip_cycles = 0  # Cycles left to skip before the next poll
+
+    def close(self):
+        """Drop the cached connection so the next poll reconnects."""
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+
+class MultiTargetCollector:
+    """Poll a list of targets concurrently on a bounded thread pool.
+
+    ``poll(conn, attributes)`` is called once per target per cycle on a worker
+    thread. A target whose previous poll is still running is skipped for the
+    cycle, so a hung server ties up at most one worker and never delays the
+    others. Cycles are either driven by ``run_forever`` (push) or requested
+    by a metric reader callback through ``collect`` (pull).
+
+    With a ``shard`` (a lib.sharding.ShardCoordinator) only the targets
+    assigned to this replica are polled. A target that moves to another
+    replica has its connection closed and is passed to ``on_release`` so
+    per-target state can be dropped. ``update_targets`` swaps in a new
+    target list the same way, keeping the targets whose spec is unchanged.
+
+    A poll still running after ``poll_timeout`` seconds has its queries
+    cancelled by a timer armed when the poll is submitted, whatever the
+    collection interval. With ``breakers`` (a lib.breaker.BreakerBoard),
+    each target has a circuit breaker, and targets whose circuit is open
+    are not polled.
+
+    With ``slow_threshold``, a target whose poll took longer than that many
+    seconds is polled every other cycle, then every fourth, up to every
+    ``max_backoff`` cycles. It returns to every cycle as its polls get back
+    under half the threshold, so a struggling server gets less load.
+    """
+
+    def __init__(self, targets, poll, interval=10, max_workers=32, on_cycle=None, shard=None, on_release=None,
+                 poll_timeout=None, breakers=None, slow_threshold=None, max_backoff=8):
+        self.targets = list(targets)
+        self.poll = poll
+        self.interval = interval
+        self.on_cycle = on_cycle  # Optional callable run once per cycle on the loop thread
+        self.shard = shard
+        self.on_release = on_release
+        self.poll_timeout = poll_timeout
+        self.breakers = breakers
+        self.slow_threshold = slow_threshold
+        self.max_backoff = max_backoff
+        self.skipped_polls = 0
+        self.rejected_polls = 0  # Polls not started because the target's circuit was open
+        self.backed_off_polls = 0  # Polls left out because the target is backed off
+        self._owned = set()  # Targets polled by this replica since their last release
+        self._retiring = []  # (target, forget) waiting for their last poll to finish
+        self._lock = threading.Lock()  # Guards the target list against update_targets
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sybase-poll"
+        )
+
+    def _poll_target(self, target):
+        try:
+            return self._poll_connected(target)
+        finally:
+            if target.deadline is not None:
+                target.deadline.cancel()
+            self._adjust_backoff(target, time.monotonic() - target.poll_started)
+
+    def _adjust_backoff(self, target, latency):
+        if self.slow_threshold is None:
+            return
+        backoff = adjust_backoff(target.backoff, latency, self.slow_threshold, self.max_backoff)
+        if backoff > target.backoff:
+            logger.warning(
+                f"Poll of Sybase server {target.name} took {latency:.2f}s; polling it every {backoff} cycles."
+            )
+        elif backoff < target.backoff:
+            logger.info(f"Sybase server {target.name} recovered; polling it every {backoff} cycle(s).")
+        target.backoff = backoff
+        target.skip_cycles = backoff - 1
+
+    def _poll_connected(self, target):
+        breaker = self.breakers.get(target.name) if self.breakers is not None else None
+        try:
+            if target.conn is None:
+                conn = target.connect()
+                target.conn = CancellableConnection(conn) if self.poll_timeout is not None else conn
+                logger.info(f"Connected to Sybase server {target.name}.")
+            elif isinstance(target.conn, CancellableConnection):
+                target.conn.reset()  # Only this poll's cursors need cancelling at the deadline
+            result = self.poll(target.conn, target.attributes)
+        except Exception as e:
+            if target.timed_out:
+                logger.error(f"Poll of Sybase server {target.name} cancelled at its deadline: {e}")
+            else:
+                logger.error(f"Error polling Sybase server {target.name}: {e}")
+                if breaker is not None:
+                    breaker.record_failure()
+            target.close()
+            return None
+        if breaker is not None and not target.timed_out:
+            breaker.record_success()
+        return result
+
+    def _enforce_deadline(self, target):
+        """Cancel ``target``'s running poll if it passed ``poll_timeout``; counts as a failure."""
+        if self.poll_timeout is None or target.timed_out or target.poll_started is None:
+            return
+        if target.in_flight is None or target.in_flight.done():
+            return
+        if time.monotonic() - target.poll_started < self.poll_timeout:
+            return
+        target.timed_out = True
+        logger.warning(f"Poll of Sybase server {target.name} exceeded {self.poll_timeout}s; cancelling.")
+        conn = target.conn
+        if conn is not None:
+            conn.cancel()
+        if self.breakers is not None:
+            self.breakers.record_timeout(target.name)
+            self.breakers.get(target.name).record_failure()
+
+    def _retire(self, target, forget):
+        """Close ``target`` once idle; with ``forget``, also hand it to ``on_release``."""
+        self._owned.discard(target)
+        self._retiring.append((target, forget))
+
+    def _close_retired(self):
+        still_running = []
+        for target, forget in self._retiring:
+            if target.in_flight is not None and not target.in_flight.done():
+                still_running.append((target, forget))
+                continue
+            target.close()
+            if forget and self.on_release is not None:
+                self.on_release(target)
+        self._retiring = still_running
+
+    def _assigned(self):
+        """Targets to poll this cycle: all of them, or this replica's shard."""
+        if self.shard is None:
+            return self.targets
+        owned = self.shard.assign(self.targets)
+        for target in self._owned.difference(owned):
+            self._retire(target, forget=True)
+            logger.info(f"Sybase server {target.name} moved to another replica.")
+        self._owned.update(owned)
+        return owned
+
+    def update_targets(self, targets):
+        """Replace the target list, keeping targets whose name and spec are unchanged.
+
+        Kept targets hold on to their connection. A changed target is
+        replaced and its old connection closed, but per-target state stays
+        because it is the same server. Removed targets are passed to
+        ``on_release``.
+        """
+        with self._lock:
+            current = {target.name: target for target in self.targets}
+            updated = []
+            for target in targets:
+                existing = current.pop(target.name, None)
+                if existing is not None and existing.spec == target.spec:
+                    updated.append(existing)
+                    continue
+                if existing is not None:
+                    self._retire(existing, forget=False)
+                updated.append(target)
+            for target in current.values():
+                self._retire(target, forget=True)
+            self.targets = updated
+
+    def _submit_idle(self):
+        with self._lock:
+            self._close_retired()
+            assigned = self._assigned()
+        submitted = []
+        for target in assigned:
+            if target.in_flight is not None and not target.in_flight.done():
+                self.skipped_polls += 1
+                logger.warning(f"Previous poll of {target.name} still running; skipping.")
+                continue
+            if target.skip_cycles > 0:
+                target.skip_cycles -= 1
+                self.backed_off_polls += 1
+                continue
+            if self.breakers is not None and not self.breakers.get(target.name).allow():
+                self.rejected_polls += 1
+                continue
+            target.poll_started = time.monotonic()
+            target.timed_out = False
+            target.in_flight = self._executor.submit(self._poll_target, target)
+            if self.poll_timeout is not None:
+                target.deadline = threading.Timer(self.poll_timeout, self._enforce_deadline, (target,))
+                target.deadline.daemon = True
+                target.deadline.start()
+            submitted.append(target)
+        return submitted
+
+    def run_cycle(self):
+        """Submit one poll per idle target without waiting for the results."""
+        if self.on_cycle is not None:
+            self.on_cycle()
+        self._submit_idle()
+
+    def collect(self, timeout):
+        """Poll idle targets and return ``(target, result)`` for those done in time.
+
+        Targets that miss the deadline keep running in the background and are
+        skipped until they finish, so the caller waits at most ``timeout``.
+        """
+        submitted = self._submit_idle()
+        wait([target.in_flight for target in submitted], timeout=timeout)
+        results = []
+        for target in submitted:
+            if target.in_flight.done() and target.in_flight.result() is not None:
+                results.append((target, target.in_flight.result()))
+        return results
+
+    def run_forever(self):
+        """Run cycles on a wall-clock aligned, fixed-rate schedule until interrupted."""
+        scheduler = ProbeScheduler([Probe("sybase_targets", self.run_cycle, self.interval)])
+        try:
+            scheduler.run_forever()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Stop accepting polls and close every target connection."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for target in self.targets:
+            if target.deadline is not None:
+                target.deadline.cancel()
+            target.close()
+        for target, _ in self._retiring:
+            target.close()
+        if self.shard is not None:
+            self.shard.release()
@@ -0,0 +1,164 @@
+"""Declarative agent configuration, reloaded while the agent runs.
+
+The config file is JSON with four sections:
+
+- ``exporter``: ``setup_telemetry`` keys such as ``endpoint``, ``traces`` or
+  ``spool_dir``.
+- ``collection_interval``: seconds between collections.
+- ``targets``: Sybase servers, each with ``servername``, ``database``,
+  ``user``, ``password`` and optional ``attributes``.
+- ``probes``: SQL probes declared in config, see lib.queryprobes.
+
+``ConfigWatcher`` polls the file and, when it changed and still parses,
+hands the old and new config to a callback. ``diff_by_name`` tells that
+callback which targets or probes were added, removed or changed, so it can
+apply only those. The telemetry pipeline is built once at startup, so
+changes to ``exporter`` and ``collection_interval`` are logged and applied
+on the next restart.
+"""
+import os
+import json
+import copy
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger("sybase_app")
+
+DEFAULT_AGENT_CONFIG = {
+    "exporter": {},
+    "collection_interval": 10,
+    "targets": [],
+    "probes": [],
+}
+RESTART_KEYS = ("exporter", "collection_interval")
+PROBE_KEYS = ("name", "query", "metric")  # Required in every probe spec
+DEFAULT_PROBE_INTERVAL = 60  # seconds, for probe specs without an interval
+
+ConfigDiff = namedtuple("ConfigDiff", ["added", "removed", "changed"])
+
+
+def _check_names(entries, key, section):
+    seen = set()
+    for entry in entries:
+        if key not in entry:
+            raise ValueError(f"Entry in {section} has no {key!r}: {entry}")
+        if entry[key] in seen:
+            raise ValueError(f"Duplicate {key} in {section}: {entry[key]}")
+        seen.add(entry[key])
+
+
+def _check_probes(probes):
+    for probe in probes:
+        missing = [key for key in PROBE_KEYS if not probe.get(key)]
+        if missing:
+            raise ValueError(f"Probe {probe.get('name')!r} is missing {missing}")
+        if not isinstance(probe.get("labels", []), list):
+            raise ValueError(f"Probe {probe['name']!r}: labels must be a list of column names")
+        interval = probe.get("interval", DEFAULT_PROBE_INTERVAL)
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            raise ValueError(f"Probe {probe['name']!r}: interval must be a positive number of seconds")
+
+
+def load_config(path):
+    """Read and validate an agent config file; raises ValueError if it is invalid."""
+    with open(path) as handle:
+        try:
+            loaded = json.load(handle)
+        except ValueError as e:
+            raise ValueError(f"{path} is not valid JSON: {e}") from e
+    unknown = set(loaded) - set(DEFAULT_AGENT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown sections in {path}: {sorted(unknown)}")
+    config = copy.deepcopy(DEFAULT_AGENT_CONFIG)
+    config.update(loaded)
+    _check_names(config["targets"], "servername", "targets")
+    _check_names(config["probes"], "name", "probes")
+    _check_probes(config["probes"])
+    return config
+
+
+def diff_by_name(old, new, key="name"):
+    """Compare two lists of config entries by ``key``.
+
+    ``added`` and ``changed`` hold entries of ``new``; ``removed`` holds
+    entries of ``old``. Unchanged entries appear in none of them.
+    """
+    old_by_name = {entry[key]: entry for entry in old}
+    new_by_name = {entry[key]: entry for entry in new}
+    return ConfigDiff(
+        added=[entry for name, entry in new_by_name.items() if name not in old_by_name],
+        removed=[entry for name, entry in old_by_name.items() if name not in new_by_name],
+        changed=[
+            entry for name, entry in new_by_name.items()
+            if name in old_by_name and old_by_name[name] != entry
+        ],
+    )
+
+
+class ConfigWatcher:
+    """Reload a config file when it changes and call ``on_change(old, new)``.
+
+    The file's modification time and size are checked every
+    ``poll_interval`` seconds. A file that fails to load is logged and
+    ignored; the agent keeps running on the last good config.
+    """
+
+    def __init__(self, path, on_change=None, poll_interval=5, loader=load_config):
+        self.path = path
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.loader = loader
+        self.reloads = 0
+        self.failed_reloads = 0
+        self._signature = self._stat()
+        self.config = loader(path)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self):
+        """Reload if the file changed; return True when a new config was applied."""
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            new = self.loader(self.path)
+        except (OSError, ValueError) as e:
+            self.failed_reloads += 1
+            logger.error(f"Ignoring invalid config {self.path}: {e}")
+            return False
+        old, self.config = self.config, new
+        if new == old:
+            return False
+        for key in RESTART_KEYS:
+            if new[key] != old[key]:
+                logger.warning(f"Config {key!r} changed in {self.path}; it takes effect after a restart.")
+        try:
+            if self.on_change is not None:
+                self.on_change(old, new)
+        except Exception as e:
+            logger.error(f"Error applying config {self.path}: {e}")
+            return False
+        self.reloads += 1
+        logger.info(f"Applied config {self.path}.")
+        return True
+
+    def start(self):
+        """Watch the file on a daemon thread."""
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.poll_interval):
+            self.check()
+
+    def stop(self):
+        self._stopped.set()
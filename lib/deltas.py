@@ -0,0 +1,112 @@
+"""Per-SPID delta computation for cumulative Sybase session counters."""
+import time
+import logging
+from array import array
+
+logger = logging.getLogger("sybase_app")
+
+
+class SpidCounterStore:
+    """Turn per-session cumulative counters into per-interval deltas.
+
+    ``logical_reads`` and ``writes`` in sysprocesses are cumulative per
+    session and vanish when the session disconnects, so their sum is not
+    monotonic. This store remembers the previous counters of every live
+    session, keyed by (spid, kpid) so a reused SPID is seen as a new session,
+    and accumulates only the growth into monotonic ``total_*`` counters.
+
+    Counters live in flat ``array`` slots indexed through a spid -> slot
+    dict; slots of sessions that disappeared are recycled, and at most
+    ``max_sessions`` sessions are tracked. A session that was seen over the
+    limit and only later gets a slot has unknown growth before that point,
+    so its first tracked sample is a baseline and contributes no delta.
+    """
+
+    def __init__(self, max_sessions=16384):
+        self.max_sessions = max_sessions
+        self._slots = {}  # spid -> slot index
+        self._free = []
+        self._kpid = array("q")
+        self._reads = array("q")
+        self._writes = array("q")
+        self._updated_at = None
+        self._untracked = set()  # (spid, kpid) of sessions seen over the limit in the last snapshot
+
+        self.total_reads = 0  # Monotonic totals of observed growth
+        self.total_writes = 0
+        self.interval_reads = 0  # Growth during the last update
+        self.interval_writes = 0
+        self.interval_seconds = 0.0
+        self.untracked_sessions = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _allocate(self, spid):
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._kpid)
+            self._kpid.append(0)
+            self._reads.append(0)
+            self._writes.append(0)
+        self._slots[spid] = slot
+        return slot
+
+    def update(self, sessions, now=None):
+        """Fold one snapshot of ``(spid, kpid, logical_reads, writes)`` rows in."""
+        now = time.monotonic() if now is None else now
+        first_update = self._updated_at is None
+        sessions = list(sessions)
+        reads_delta = writes_delta = 0
+        untracked = set()
+
+        # Forget sessions that disconnected since the previous snapshot
+        live_spids = {row[0] for row in sessions}
+        for spid in [spid for spid in self._slots if spid not in live_spids]:
+            self._free.append(self._slots.pop(spid))
+
+        for spid, kpid, reads, writes in sessions:
+            slot = self._slots.get(spid)
+            if slot is None:
+                if len(self._slots) >= self.max_sessions:
+                    untracked.add((spid, kpid))
+                    continue
+                slot = self._allocate(spid)
+                new_session = True
+            else:
+                new_session = self._kpid[slot] != kpid
+
+            if new_session:
+                # A session's counters start at zero at login, so everything it
+                # has done so far happened since the previous snapshot. On the
+                # very first update there is no previous snapshot to compare to.
+                if not first_update and (spid, kpid) not in self._untracked:
+                    reads_delta += reads
+                    writes_delta += writes
+            else:
+                # A counter that went backwards means it was reset; count from zero
+                previous_reads, previous_writes = self._reads[slot], self._writes[slot]
+                reads_delta += reads - previous_reads if reads >= previous_reads else reads
+                writes_delta += writes - previous_writes if writes >= previous_writes else writes
+
+            self._kpid[slot] = kpid
+            self._reads[slot] = reads
+            self._writes[slot] = writes
+
+        if untracked:
+            logger.warning(f"{len(untracked)} sessions over the {self.max_sessions} limit were not tracked.")
+        self._untracked = untracked
+        self.untracked_sessions = len(untracked)
+        self.interval_seconds = 0.0 if first_update else now - self._updated_at
+        self.interval_reads = reads_delta
+        self.interval_writes = writes_delta
+        self.total_reads += reads_delta
+        self.total_writes += writes_delta
+        self._updated_at = now
+
+    def rate_per_minute(self):
+        """Logical reads plus writes per minute over the last interval."""
+        if self.interval_seconds <= 0:
+            return 0.0
+        return (self.interval_reads + self.interval_writes) * 60 / self.interval_seconds
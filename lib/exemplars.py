@@ -0,0 +1,111 @@
+"""Histogram exemplars that point from slow measurements to their traces.
+
+``SlowestPerBucketExemplarReservoir`` keeps, for every histogram bucket of
+every series, the slowest measurement of the collection interval together
+with the trace and span it was recorded under. Memory is one exemplar per
+bucket per series, so it is bounded by the cardinality limit. Exponential
+histograms have no fixed buckets; ``SlowestExemplarReservoir`` keeps their
+slowest few measurements instead. When a tail sampler is active, ``pin`` is called with the exemplar's trace ID so that
+the trace an exemplar links to is exported.
+"""
+from opentelemetry import trace
+from opentelemetry.sdk.metrics import (
+    AlignedHistogramBucketExemplarReservoir,
+    Histogram,
+    SimpleFixedSizeExemplarReservoir,
+)
+from opentelemetry.sdk.metrics.view import View
+# Signals "do not store this measurement" to FixedSizeExemplarReservoirABC.offer
+from opentelemetry.sdk.metrics._internal.exemplar.exemplar_reservoir import BucketIndexError
+
+from lib.views import FallbackView
+
+
+class SlowestPerBucketExemplarReservoir(AlignedHistogramBucketExemplarReservoir):
+    """Keep the largest measurement per bucket instead of the last one."""
+
+    def __init__(self, boundaries, pin=None, **kwargs):
+        super().__init__(boundaries, **kwargs)
+        self._pin = pin
+        self._largest = {}  # bucket index -> value stored there this interval
+
+    def _find_bucket_index(self, value, time_unix_nano, attributes, context):
+        index = super()._find_bucket_index(value, time_unix_nano, attributes, context)
+        if index in self._largest and value < self._largest[index]:
+            raise BucketIndexError("A slower measurement is already stored")
+        self._largest[index] = value
+        if self._pin is not None:
+            span_context = trace.get_current_span(context).get_span_context()
+            if span_context.is_valid:
+                self._pin(span_context.trace_id)
+        return index
+
+    def _reset(self):
+        super()._reset()
+        self._largest = {}
+
+
+class SlowestExemplarReservoir(SimpleFixedSizeExemplarReservoir):
+    """Keep the ``size`` largest measurements of the interval, for exponential histograms."""
+
+    def __init__(self, size=1, pin=None, **kwargs):
+        super().__init__(size=size, **kwargs)
+        self._pin = pin
+        self._values = []  # Value stored in each slot this interval
+
+    def _find_bucket_index(self, value, time_unix_nano, attributes, context):
+        if len(self._values) < self._size:
+            index = len(self._values)
+            self._values.append(value)
+        else:
+            index = min(range(self._size), key=self._values.__getitem__)
+            if value <= self._values[index]:
+                raise BucketIndexError("Slower measurements fill the reservoir")
+            self._values[index] = value
+        if self._pin is not None:
+            span_context = trace.get_current_span(context).get_span_context()
+            if span_context.is_valid:
+                self._pin(span_context.trace_id)
+        return index
+
+    def _reset(self):
+        super()._reset()
+        self._values = []
+
+
+def slowest_exemplar_reservoir_factory(pin=None):
+    """An ``exemplar_reservoir_factory`` keeping the slowest measurements of histograms."""
+
+    def reservoir(**kwargs):
+        if "boundaries" in kwargs:  # Explicit bucket histogram
+            return SlowestPerBucketExemplarReservoir(pin=pin, **kwargs)
+        if "size" in kwargs:  # Exponential histogram
+            return SlowestExemplarReservoir(pin=pin, **kwargs)
+        return SimpleFixedSizeExemplarReservoir(**kwargs)  # Sums and gauges keep the SDK's sampling
+
+    def reservoir_factory(aggregation_type):
+        return reservoir
+
+    return reservoir_factory
+
+
+def slowest_exemplar_view(pin=None, exclude=()):
+    """A view giving every histogram not matched by ``exclude`` the slowest-per-bucket reservoir."""
+    reservoir_factory = slowest_exemplar_reservoir_factory(pin)
+    if exclude:
+        return FallbackView(exclude, instrument_type=Histogram, exemplar_reservoir_factory=reservoir_factory)
+    return View(instrument_type=Histogram, exemplar_reservoir_factory=reservoir_factory)
+
+
+def trace_exemplar(span=None):
+    """Exemplar labels for prometheus_client ``observe(..., exemplar=...)``.
+
+    Returns None outside a sampled span, so no exemplar is attached.
+    """
+    span_context = (span or trace.get_current_span()).get_span_context()
+    if not span_context.is_valid or not span_context.trace_flags.sampled:
+        return None
+    return {
+        "trace_id": trace.format_trace_id(span_context.trace_id),
+        "span_id": trace.format_span_id(span_context.span_id),
+    }
@@ -0,0 +1,147 @@
+"""Size span and log export batches to the load instead of the SDK defaults.
+
+The SDK batch processors export every ``schedule_delay`` seconds, or sooner
+once ``max_export_batch_size`` items are queued. Each export costs a fixed
+amount of CPU (a request, a channel round trip, resource and scope headers)
+on top of the per-item encoding. So at high span volume, small batches
+spend most of the export CPU on overhead. At low volume, a short delay sends
+many near-empty requests.
+
+``AdaptiveBatchTuner`` times every export of one processor. Every
+``interval`` seconds it adjusts both knobs within bounds:
+
+- Queue more than ``HIGH_FILL`` full: the exporter is falling behind.
+  Batches double and the delay halves.
+- Exports slower than ``target_latency_millis``: the collector is under
+  pressure. Batches halve, so each request finishes within its deadline.
+- Queue under ``LOW_FILL`` full: load is light. The delay grows by half,
+  so fewer, fuller requests go out.
+
+The settings in use are reported through
+``AgentSelfMetrics.watch_export_tuners``. Compression is set separately,
+with the bootstrap's ``compression`` key.
+"""
+import time
+import logging
+import threading
+
+logger = logging.getLogger("sybase_app")
+
+HIGH_FILL = 0.5  # Queue fill above which batches grow and the delay shrinks
+LOW_FILL = 0.1  # Queue fill below which the delay grows
+
+
+def batch_queue(processor):
+    """Return ``(owner, queue, max_size)`` for a Batch*Processor, across SDK versions."""
+    inner = getattr(processor, "_batch_processor", None)
+    if inner is not None:
+        return inner, inner._queue, inner._max_queue_size
+    return processor, processor.queue, processor.max_queue_size
+
+
+class TimedExporter:
+    """Span or log exporter proxy that counts exports, items and time spent exporting."""
+
+    def __init__(self, exporter):
+        self._exporter = exporter
+        self.exports = 0
+        self.items = 0
+        self.seconds = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self._exporter, name)
+
+    def export(self, batch, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._exporter.export(batch, *args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.exports += 1
+            self.items += len(batch)
+
+
+class AdaptiveBatchTuner:
+    """Adjust one batch processor's batch size and flush delay from export latency and queue fill."""
+
+    def __init__(self, processor, signal, min_batch_size=128, max_batch_size=4096, min_delay_millis=200,
+                 max_delay_millis=5000, target_latency_millis=500, interval=5):
+        self.signal = signal
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.min_delay_millis = min_delay_millis
+        self.max_delay_millis = max_delay_millis
+        self.target_latency_millis = target_latency_millis
+        self.interval = interval
+        self._owner, self._queue, self.max_queue_size = batch_queue(processor)
+        # Newer SDKs keep both knobs under private names; older ones on the processor itself
+        self._private = hasattr(self._owner, "_max_export_batch_size")
+        exporter_attribute = "_exporter" if hasattr(self._owner, "_exporter") else "span_exporter"
+        self.exporter = TimedExporter(getattr(self._owner, exporter_attribute))
+        setattr(self._owner, exporter_attribute, self.exporter)
+        self.export_latency_millis = 0.0  # Mean export time over the last interval
+        self._seen = (0, 0.0)  # Exporter (exports, seconds) at the last adjustment
+        self._stopped = threading.Event()
+        self._thread = None
+        self._apply(
+            min(max(self.batch_size, min_batch_size), max_batch_size),
+            min(max(self.delay_millis, min_delay_millis), max_delay_millis),
+        )
+
+    @property
+    def batch_size(self):
+        return self._owner._max_export_batch_size if self._private else self._owner.max_export_batch_size
+
+    @property
+    def delay_millis(self):
+        return self._owner._schedule_delay_millis if self._private else self._owner.schedule_delay_millis
+
+    def _apply(self, batch_size, delay_millis):
+        # Both are read afresh on every worker iteration, so no restart is needed
+        batch_size = min(batch_size, self.max_queue_size)
+        if self._private:
+            self._owner._max_export_batch_size = batch_size
+            self._owner._schedule_delay_millis = delay_millis
+            self._owner._schedule_delay = delay_millis / 1e3
+        else:
+            self._owner.max_export_batch_size = batch_size
+            self._owner.schedule_delay_millis = delay_millis
+
+    def adjust(self):
+        """Apply one tuning step from what happened since the last one."""
+        exports, seconds = self.exporter.exports, self.exporter.seconds
+        seen_exports, seen_seconds = self._seen
+        self._seen = (exports, seconds)
+        if exports > seen_exports:
+            self.export_latency_millis = (seconds - seen_seconds) / (exports - seen_exports) * 1000
+        fill = len(self._queue) / self.max_queue_size
+        batch_size, delay_millis = self.batch_size, self.delay_millis
+        if fill > HIGH_FILL:
+            batch_size = min(batch_size * 2, self.max_batch_size)
+            delay_millis = max(delay_millis / 2, self.min_delay_millis)
+        elif exports > seen_exports and self.export_latency_millis > self.target_latency_millis:
+            batch_size = max(batch_size // 2, self.min_batch_size)
+        elif fill < LOW_FILL:
+            delay_millis = min(delay_millis * 1.5, self.max_delay_millis)
+        if (batch_size, delay_millis) != (self.batch_size, self.delay_millis):
+            logger.debug(
+                f"Export tuning for {self.signal}: batch {self.batch_size} -> {batch_size}, "
+                f"delay {self.delay_millis:.0f} -> {delay_millis:.0f} ms (queue {fill:.0%} full, "
+                f"export {self.export_latency_millis:.0f} ms)"
+            )
+            self._apply(batch_size, delay_millis)
+
+    def start(self):
+        """Tune on a daemon thread every ``interval`` seconds."""
+        self._thread = threading.Thread(target=self._run, name=f"export-tuner-{self.signal}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.adjust()
+            except Exception as e:
+                logger.error(f"Export tuning for {self.signal} failed: {e}")
+
+    def stop(self):
+        self._stopped.set()
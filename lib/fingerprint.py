@@ -0,0 +1,69 @@
+"""Normalize SQL statements into stable, low-cardinality fingerprints.
+
+Literals (quoted strings, hex and numbers) become ``?``, comments are
+dropped, IN-lists and multi-row VALUES collapse to a single element, and
+whitespace is squeezed. Statements that differ only in their literals,
+letter case or spacing therefore share a fingerprint: a short hash of the
+normalized text. The normalized text, truncated to ``max_length``, is what
+gets stored as ``db.statement``, so literal values and huge IN-lists are
+never exported.
+"""
+import re
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+
+MAX_STATEMENT_LENGTH = 1024
+
+Fingerprint = namedtuple("Fingerprint", ["id", "statement", "operation"])
+
+_LITERALS = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+    | '(?:[^']|'')*'                      # string literal, '' escapes a quote
+    | \b0x[0-9a-fA-F]*\b                  # binary literal
+    | (?<![\w.@$])\d+(?:\.\d*)?(?:[eE][-+]?\d+)?\b
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_ROWS = re.compile(r"\bVALUES\s*(\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_OPERATOR_SPACING = re.compile(r" ?([=<>!,()+*/%-]) ?")
+
+
+def _replace_literal(match):
+    return " " if match.group("comment") else "?"
+
+
+def normalize(statement):
+    """Return ``statement`` with literals, comments and list lengths removed."""
+    normalized = _LITERALS.sub(_replace_literal, statement)
+    normalized = _IN_LIST.sub("IN (?)", normalized)
+    normalized = _VALUES_ROWS.sub(r"VALUES \1", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip().rstrip(";").rstrip()
+
+
+class StatementFingerprinter:
+    """Fingerprint statements, memoizing the last ``max_entries`` in an LRU.
+
+    The monitoring and application queries repeat verbatim, so after the
+    first call a statement costs a single cache lookup.
+    """
+
+    def __init__(self, max_entries=4096, max_length=MAX_STATEMENT_LENGTH):
+        self.max_length = max_length
+        self.fingerprint = lru_cache(maxsize=max_entries)(self._fingerprint)
+
+    def _fingerprint(self, statement):
+        normalized = normalize(statement)
+        # Case and spacing around operators do not change the fingerprint
+        canonical = _OPERATOR_SPACING.sub(r"\1", normalized).lower()
+        digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).hexdigest()
+        operation = normalized.split(" ", 1)[0].upper() if normalized else ""
+        if len(normalized) > self.max_length:
+            normalized = normalized[: self.max_length - 3] + "..."
+        return Fingerprint(digest, normalized, operation)
+
+    def cache_info(self):
+        return self.fingerprint.cache_info()
@@ -0,0 +1,84 @@
+"""A ConnectionPool tied to the Flask request lifecycle.
+
+``connection()`` checks a connection out the first time a request asks for
+one and keeps it on ``flask.g`` for the rest of the request. Flask's
+app-context teardown returns it to the pool, even when the view raised.
+A connection that broke during the request is closed instead of reused:
+either the teardown saw an exception, or the view called ``discard()``
+after catching one itself.
+
+``watch_pool`` reports the pool's occupancy as prometheus_client gauges,
+refreshed by a ``lib.promsampler.MetricSampler``. ``init_db_pool`` sets up
+both for a Flask app.
+"""
+from flask import g
+from prometheus_client import Gauge
+
+from lib.pool import ConnectionPool
+
+# Requests share pooled logins; a load balancer probing every second costs a query, not a login
+POOL_SIZE = 4
+POOL_MAX_LIFETIME = 1800  # seconds before a connection is replaced by a fresh login
+POOL_ACQUIRE_TIMEOUT = 5  # seconds a request waits for a free connection
+
+POOL_GAUGES = {
+    "size": "Open pooled database connections, idle plus checked out",
+    "checked_out": "Pooled database connections in use by requests",
+    "idle": "Pooled database connections waiting for a request",
+    "waiters": "Requests waiting for a pooled database connection",
+    "logins": "Database logins performed by the pool since start",
+}
+
+
+class FlaskConnectionPool:
+    """Per-request checkout from a ``ConnectionPool``, returned on app-context teardown."""
+
+    def __init__(self, pool, app=None):
+        self.pool = pool
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.teardown_appcontext(self._teardown)
+
+    def connection(self):
+        """The current request's connection, checked out on first use."""
+        if "db_connection" not in g:
+            g.db_connection = self.pool.acquire()
+            g.db_connection_broken = False
+        return g.db_connection
+
+    def discard(self):
+        """Close the current request's connection at teardown instead of returning it."""
+        if "db_connection" in g:
+            g.db_connection_broken = True
+
+    def _teardown(self, exception):
+        conn = g.pop("db_connection", None)
+        if conn is not None:
+            self.pool.release(conn, discard=exception is not None or g.pop("db_connection_broken", False))
+
+
+def watch_pool(pool, sampler, prefix="flask_app_db_pool"):
+    """Sample ``pool.stats()`` into one gauge per statistic on ``sampler``'s registry."""
+    registry = sampler.cache.registry
+    for stat, description in POOL_GAUGES.items():
+        gauge = Gauge(f"{prefix}_{stat}", description, registry=registry)
+        sampler.add(gauge, lambda stat=stat: pool.stats()[stat])
+
+
+def init_db_pool(app, connect, sampler, max_size=POOL_SIZE, max_lifetime=POOL_MAX_LIFETIME,
+                 acquire_timeout=POOL_ACQUIRE_TIMEOUT, name="flask_app"):
+    """Pool ``connect()`` logins for ``app``'s requests and sample the pool's occupancy on ``sampler``."""
+    db_pool = FlaskConnectionPool(
+        ConnectionPool(
+            connect,
+            max_size=max_size,
+            max_lifetime=max_lifetime,
+            acquire_timeout=acquire_timeout,
+            name=name,
+        ),
+        app,
+    )
+    watch_pool(db_pool.pool, sampler)
+    return db_pool
@@ -0,0 +1,4 @@
+"""Process-wide logger, wired to OpenTelemetry by the shared telemetry bootstrap."""
+from lib.bootstrap import setup_telemetry
+
+logger = setup_telemetry().logger
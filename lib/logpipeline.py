@@ -0,0 +1,77 @@
+"""Asynchronous logging: callers enqueue records, a listener thread handles them.
+
+``CorrelatingQueueHandler`` is the only handler that runs on the logging
+thread. It stamps the record with the current span context and puts it on a
+bounded queue. That costs one context lookup and no formatting. When the
+queue is full, the record is dropped and counted instead of blocking the
+caller. ``CorrelatingQueueListener`` drains the queue on a background
+thread. It re-attaches each record's span context, so the OpenTelemetry
+handler fills the structured trace_id/span_id fields, then passes the
+record to the real handlers (console, OTLP batch processor).
+
+Messages are formatted on the listener thread, so pass immutable arguments
+(or use f-strings as the scripts do) when logging objects that change later.
+"""
+import queue
+import logging
+import logging.handlers
+
+from opentelemetry import context, trace
+
+DEFAULT_QUEUE_SIZE = 10000
+CONSOLE_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# Record attribute carrying the caller's SpanContext to the listener
+SPAN_CONTEXT_ATTRIBUTE = "_otel_span_context"
+
+
+class CorrelatingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records without blocking, tagged with the caller's span context."""
+
+    def __init__(self, max_size=DEFAULT_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize=max_size))
+        self.dropped = 0  # Records discarded because the queue was full
+
+    def prepare(self, record):
+        # QueueHandler.prepare formats the message here; that is left to the listener
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            setattr(record, SPAN_CONTEXT_ATTRIBUTE, span_context)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class CorrelatingQueueListener(logging.handlers.QueueListener):
+    """Hand queued records to ``handlers`` inside the span context they were logged in."""
+
+    def __init__(self, handler, *handlers):
+        super().__init__(handler.queue, *handlers, respect_handler_level=True)
+
+    def handle(self, record):
+        span_context = record.__dict__.pop(SPAN_CONTEXT_ATTRIBUTE, None)
+        if span_context is None:
+            super().handle(record)
+            return
+        token = context.attach(trace.set_span_in_context(trace.NonRecordingSpan(span_context)))
+        try:
+            super().handle(record)
+        finally:
+            context.detach(token)
+
+
+class TraceContextFormatter(logging.Formatter):
+    """Console formatter appending the trace and span IDs of the record's span."""
+
+    def format(self, record):
+        message = super().format(record)
+        span_context = trace.get_current_span().get_span_context()
+        if not span_context.is_valid:
+            return message
+        return (
+            f"{message} trace_id={trace.format_trace_id(span_context.trace_id)} "
+            f"span_id={trace.format_span_id(span_context.span_id)}"
+        )
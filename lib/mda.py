@@ -0,0 +1,279 @@
+"""Incremental readers for the Sybase ASE MDA monitoring tables.
+
+Counter tables (monProcessActivity, monOpenObjectActivity, monEngine,
+monCachePool) hold cumulative values, so each read is turned into deltas
+against the previous read. The historical table monSysStatement is read
+past a per-target high-watermark, so every cycle only fetches statements
+that finished since the last one. Either way the work per cycle depends on
+current activity, not on how long the agent has been running.
+"""
+import time
+import logging
+
+from opentelemetry import trace
+from opentelemetry.context import Context
+
+from lib.scheduler import adjust_backoff
+
+logger = logging.getLogger("sybase_app")
+
+SCHEDULE_SLACK = 1.0  # A read up to this early still counts as due, so aligned polls do not slip a cycle
+
+
+class KeyedDeltaStore:
+    """Previous counter values per row key; keys missing from a read are dropped."""
+
+    def __init__(self):
+        self._previous = {}
+
+    def update(self, rows):
+        """Yield ``(key, deltas)`` for ``rows`` of ``(key, counters)``.
+
+        Rows seen for the first time only set a baseline. A counter that went
+        backwards was reset (object re-opened, server restarted) and counts
+        from zero.
+        """
+        current = {}
+        for key, counters in rows:
+            current[key] = counters
+            previous = self._previous.get(key)
+            if previous is None:
+                continue
+            yield key, tuple(
+                value - before if value >= before else value
+                for value, before in zip(counters, previous)
+            )
+        self._previous = current
+
+
+class CounterTableProbe:
+    """Read one cumulative MDA table and report per-group deltas."""
+
+    def __init__(self, table, key_columns, group_columns, counter_columns):
+        self.table = table
+        self.key_columns = key_columns  # Identify a row across reads
+        self.group_columns = group_columns  # Become metric attributes
+        self.counter_columns = counter_columns
+        columns = list(dict.fromkeys(key_columns + group_columns + counter_columns))
+        self._positions = {column: index for index, column in enumerate(columns)}
+        self.query = f"SELECT {', '.join(columns)} FROM master..{table}"
+        self.deltas = KeyedDeltaStore()
+
+    def read(self, conn):
+        """Return ``{group: {counter: delta}}`` for the growth since the last read."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self.query)
+            fetched = cursor.fetchall()
+        finally:
+            cursor.close()
+
+        positions = self._positions
+        groups = {}
+        rows = []
+        for row in fetched:
+            key = tuple(row[positions[column]] for column in self.key_columns)
+            groups[key] = tuple(_attribute(row[positions[column]]) for column in self.group_columns)
+            rows.append((key, tuple(row[positions[column]] or 0 for column in self.counter_columns)))
+
+        totals = {}
+        for key, deltas in self.deltas.update(rows):
+            group = totals.setdefault(groups[key], [0] * len(self.counter_columns))
+            for index, delta in enumerate(deltas):
+                group[index] += delta
+        return {
+            group: dict(zip(self.counter_columns, values))
+            for group, values in totals.items()
+        }
+
+
+class StatementHistoryProbe:
+    """Read monSysStatement incrementally past a high-watermark.
+
+    The watermark is the (EndTime, SPID, KPID, BatchID, LineNumber) key of
+    the last row read, and rows are read in that order. A page of
+    ``max_rows`` statements that all finished in the same instant therefore
+    still moves the watermark, and the next read continues after the last
+    of them.
+    """
+
+    COLUMNS = (
+        "SPID", "KPID", "DBID", "BatchID", "LineNumber", "StartTime", "EndTime",
+        "CpuTime", "WaitTime", "LogicalReads", "PhysicalReads",
+    )
+    KEY = ("EndTime", "SPID", "KPID", "BatchID", "LineNumber")
+
+    def __init__(self, max_rows=5000):
+        self.max_rows = max_rows
+        self.watermark = None  # Key of the last statement read, in KEY order
+
+    def _query(self):
+        query = f"SELECT TOP {self.max_rows} {', '.join(self.COLUMNS)} FROM master..monSysStatement"
+        if self.watermark is not None:
+            end_time, *rest = self.watermark
+            literals = [f"'{end_time:%Y-%m-%d %H:%M:%S.%f}'"] + [str(int(value)) for value in rest]
+            # Row-value comparison (EndTime, SPID, ...) > (...), spelled out for Transact-SQL
+            terms = []
+            for index, (column, literal) in enumerate(zip(self.KEY, literals)):
+                equal = [f"{key} = {value}" for key, value in zip(self.KEY[:index], literals[:index])]
+                terms.append("(" + " AND ".join(equal + [f"{column} > {literal}"]) + ")")
+            query += f" WHERE EndTime >= {literals[0]} AND ({' OR '.join(terms)})"
+        return query + f" ORDER BY {', '.join(self.KEY)}"
+
+    def read(self, conn):
+        """Return new statement rows as dicts, oldest first."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self._query())
+            fetched = cursor.fetchall()
+        finally:
+            cursor.close()
+
+        statements = [dict(zip(self.COLUMNS, row)) for row in fetched]
+        if statements:
+            self.watermark = tuple(statements[-1][column] for column in self.KEY)
+        return statements
+
+
+def default_counter_probes():
+    """Fresh counter-table probes for one target."""
+    return [
+        CounterTableProbe(
+            "monProcessActivity",
+            key_columns=["SPID", "KPID"],
+            group_columns=[],
+            counter_columns=["CPUTime", "WaitTime", "LogicalReads", "PhysicalReads", "PhysicalWrites"],
+        ),
+        CounterTableProbe(
+            "monOpenObjectActivity",
+            key_columns=["DBID", "ObjectID", "IndexID"],
+            group_columns=["DBName"],
+            counter_columns=["LogicalReads", "PhysicalReads", "RowsInserted", "RowsDeleted", "RowsUpdated", "LockWaits"],
+        ),
+        CounterTableProbe(
+            "monEngine",
+            key_columns=["EngineNumber"],
+            group_columns=["EngineNumber"],
+            counter_columns=["UserCPUTime", "SystemCPUTime", "IdleCPUTime"],
+        ),
+        CounterTableProbe(
+            "monCachePool",
+            key_columns=["CacheName", "IOBufferSize"],
+            group_columns=["CacheName"],
+            counter_columns=["PagesRead", "PhysicalReads", "Stalls"],
+        ),
+    ]
+
+
+def _attribute(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def _nanos(value):
+    return int(value.timestamp() * 1e9)
+
+
+class MdaCollector:
+    """Run the MDA probes for many targets and emit their results.
+
+    With ``interval``, each target's MDA tables are read at most every
+    ``interval`` seconds, however often the target itself is polled. A read
+    slower than ``slow_threshold`` seconds doubles that target's MDA
+    interval, up to ``max_backoff`` times.
+    """
+
+    def __init__(self, meter, tracer=None, max_statements=5000, interval=None, slow_threshold=None, max_backoff=8):
+        self.tracer = tracer or trace.get_tracer("sybase_app")
+        self.max_statements = max_statements
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.max_backoff = max_backoff
+        self._targets = {}  # server name -> (counter probes, statement probe)
+        self._next_run = {}  # server name -> monotonic time the next read is due
+        self._backoff = {}  # server name -> interval multiplier
+        self.activity_metric = meter.create_counter(
+            name="sybase_mda_activity",
+            description="Growth of MDA counter-table columns since the previous read",
+            unit="1",
+        )
+        self.statement_duration_metric = meter.create_histogram(
+            name="sybase_mda_statement_duration",
+            description="Elapsed time of statements read from monSysStatement",
+            unit="ms",
+        )
+
+    def _probes_for(self, server):
+        if server not in self._targets:
+            self._targets[server] = (default_counter_probes(), StatementHistoryProbe(self.max_statements))
+        return self._targets[server]
+
+    def forget(self, server):
+        """Drop delta and watermark state for a target that is no longer polled."""
+        self._targets.pop(server, None)
+        self._next_run.pop(server, None)
+        self._backoff.pop(server, None)
+
+    def collect(self, conn, attributes):
+        """Read every MDA probe for the target, if due, and record what is new."""
+        server = attributes["sybase.server"]
+        started = time.monotonic()
+        if self.interval is not None and self._next_run.get(server, 0) > started + SCHEDULE_SLACK:
+            return
+        try:
+            self._collect(conn, attributes)
+        finally:
+            if self.interval is not None:
+                backoff = self._backoff.get(server, 1)
+                if self.slow_threshold is not None:
+                    latency = time.monotonic() - started
+                    backoff = self._backoff[server] = adjust_backoff(
+                        backoff, latency, self.slow_threshold, self.max_backoff
+                    )
+                self._next_run[server] = started + self.interval * backoff
+
+    def _collect(self, conn, attributes):
+        counter_probes, statement_probe = self._probes_for(attributes["sybase.server"])
+        for probe in counter_probes:
+            try:
+                groups = probe.read(conn)
+            except Exception as e:
+                logger.error(f"Error reading {probe.table}: {e}")
+                continue
+            for group, counters in groups.items():
+                group_attributes = dict(attributes, table=probe.table)
+                group_attributes.update(zip([column.lower() for column in probe.group_columns], group))
+                for counter, delta in counters.items():
+                    if delta:
+                        self.activity_metric.add(delta, dict(group_attributes, counter=counter))
+
+        try:
+            statements = statement_probe.read(conn)
+        except Exception as e:
+            logger.error(f"Error reading monSysStatement: {e}")
+            return
+        for statement in statements:
+            self._emit_statement(statement, attributes)
+
+    def _emit_statement(self, statement, attributes):
+        start, end = statement["StartTime"], statement["EndTime"]
+        self.statement_duration_metric.record((end - start).total_seconds() * 1000, attributes)
+        # Each statement is its own root span; it ran before this cycle started
+        span = self.tracer.start_span(
+            "sybase_statement",
+            context=Context(),
+            start_time=_nanos(start),
+            attributes=dict(
+                attributes,
+                **{
+                    "db.sybase.spid": statement["SPID"],
+                    "db.sybase.dbid": statement["DBID"],
+                    "db.sybase.batch_id": statement["BatchID"],
+                    "db.sybase.line_number": statement["LineNumber"],
+                    "db.sybase.cpu_time": statement["CpuTime"],
+                    "db.sybase.wait_time": statement["WaitTime"],
+                    "db.sybase.logical_reads": statement["LogicalReads"],
+                    "db.sybase.physical_reads": statement["PhysicalReads"],
+                },
+            ),
+        )
+        span.end(end_time=_nanos(end))
@@ -0,0 +1,55 @@
+"""Helpers for callback-driven (pull) collection with observable instruments."""
+import time
+import logging
+import threading
+
+from opentelemetry.metrics import Observation
+
+logger = logging.getLogger("sybase_app")
+
+
+class SharedProbe:
+    """Run a probe at most once per metric collection and share the result.
+
+    The metric reader invokes every observable callback back to back, so a
+    result that finished less than ``max_age`` seconds ago belongs to the
+    collection in progress and is reused instead of querying again, however
+    long the probe itself took. Keep ``max_age`` well below the reader's
+    export interval.
+    """
+
+    def __init__(self, probe, max_age=1.0):
+        self.probe = probe
+        self.max_age = max_age
+        self._value = None
+        self._taken_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the current collection's result, running the probe if needed."""
+        with self._lock:
+            if self._taken_at is None or time.monotonic() - self._taken_at > self.max_age:
+                try:
+                    self._value = self.probe()
+                except Exception as e:
+                    logger.error(f"Probe {getattr(self.probe, '__name__', self.probe)} failed: {e}")
+                    self._value = None
+                # Aged from completion, so a probe slower than max_age still serves the whole collection
+                self._taken_at = time.monotonic()
+            return self._value
+
+    def callback(self, observe):
+        """Build an instrument callback; ``observe(value)`` yields Observations."""
+
+        def _callback(options):
+            value = self.get()
+            if value is None:
+                return []
+            return list(observe(value))
+
+        return _callback
+
+
+def gauge_of(extract, attributes=None):
+    """Shorthand for a single-observation ``observe`` function."""
+    return lambda value: [Observation(extract(value), attributes)]
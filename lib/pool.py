@@ -0,0 +1,215 @@
+"""Thread-safe pool of reusable Sybase connections."""
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from opentelemetry.metrics import Observation
+
+logger = logging.getLogger("sybase_app")
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the wait timeout."""
+
+
+class ConnectionPool:
+    """Hand out DB-API connections, reconnecting and expiring them as needed.
+
+    Idle connections are validated with ``ping_query`` before they are handed
+    out; a failed ping closes the connection and a fresh login replaces it.
+    Connections idle for longer than ``idle_timeout`` are closed, keeping at
+    least ``min_size`` of them open. With ``max_lifetime`` set, a connection
+    logged in longer ago than that is closed when it is next handed out or
+    returned, so server-side session state and failovers are picked up.
+    """
+
+    def __init__(
+        self,
+        connect,
+        min_size=1,
+        max_size=4,
+        idle_timeout=300,
+        max_lifetime=None,
+        acquire_timeout=30,
+        ping_query="SELECT 1",
+        meter=None,
+        name="sybase",
+    ):
+        self._connect = connect  # Zero-argument callable returning a DB-API connection
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.acquire_timeout = acquire_timeout
+        self.ping_query = ping_query
+        self.name = name
+
+        self._idle = deque()  # (connection, last_returned_monotonic)
+        self._opened_at = {}  # id(connection) -> monotonic login time
+        self.logins = 0  # Connections opened since the pool was created
+        self._size = 0  # Open connections, idle plus checked out
+        self._checked_out = 0
+        self._waiters = 0
+        self._closed = False
+        self._lock = threading.Condition()
+
+        self._connect_latency = None
+        if meter is not None:
+            self._register_metrics(meter)
+
+    # === Metrics ===
+    def _register_metrics(self, meter):
+        attributes = {"pool.name": self.name}
+        meter.create_observable_gauge(
+            name="sybase_pool_checked_out",
+            callbacks=[lambda options: [Observation(self._checked_out, attributes)]],
+            description="Connections currently checked out of the pool",
+            unit="connections",
+        )
+        meter.create_observable_gauge(
+            name="sybase_pool_idle",
+            callbacks=[lambda options: [Observation(len(self._idle), attributes)]],
+            description="Idle connections held by the pool",
+            unit="connections",
+        )
+        meter.create_observable_gauge(
+            name="sybase_pool_waiters",
+            callbacks=[lambda options: [Observation(self._waiters, attributes)]],
+            description="Threads waiting for a pooled connection",
+            unit="threads",
+        )
+        self._connect_latency = meter.create_histogram(
+            name="sybase_pool_connect_latency",
+            description="Time taken to log in a new pooled connection",
+            unit="ms",
+        )
+        self._metric_attributes = attributes
+
+    # === Connection lifecycle ===
+    def _open(self):
+        start_time = time.monotonic()
+        conn = self._connect()
+        with self._lock:
+            self._opened_at[id(conn)] = time.monotonic()
+            self.logins += 1
+        duration = (time.monotonic() - start_time) * 1000
+        if self._connect_latency is not None:
+            self._connect_latency.record(duration, self._metric_attributes)
+        logger.info(f"Opened pooled connection to {self.name} in {duration:.1f} ms.")
+        return conn
+
+    def _close_quietly(self, conn):
+        self._opened_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _ping(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.ping_query)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection to {self.name} failed pre-ping: {e}")
+            return False
+
+    def _expired(self, conn):
+        if self.max_lifetime is None:
+            return False
+        opened_at = self._opened_at.get(id(conn))
+        return opened_at is not None and time.monotonic() - opened_at >= self.max_lifetime
+
+    def _expire_idle(self):
+        """Close idle connections past their timeout; caller holds the lock."""
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size:
+            conn, returned_at = self._idle[0]
+            if now - returned_at < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._close_quietly(conn)
+
+    # === Public API ===
+    def acquire(self, timeout=None):
+        """Check out a validated connection, logging in only when needed."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._expire_idle()
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if self._closed or remaining <= 0:
+                    raise PoolTimeout(f"No connection to {self.name} available")
+                self._waiters += 1
+                try:
+                    self._lock.wait(remaining)
+                finally:
+                    self._waiters -= 1
+            if self._closed:
+                raise PoolTimeout(f"Pool for {self.name} is closed")
+            conn = self._idle.pop()[0] if self._idle else None
+            if conn is None:
+                self._size += 1  # Reserve the slot before logging in outside the lock
+            self._checked_out += 1
+
+        try:
+            if conn is not None and (self._expired(conn) or not self._ping(conn)):
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._checked_out -= 1
+                self._lock.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection; ``discard`` closes it instead of reusing it."""
+        with self._lock:
+            self._checked_out -= 1
+            if discard or self._closed or self._expired(conn):
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def stats(self):
+        """Pool occupancy: open, checked out and idle connections, waiters and logins so far."""
+        return {
+            "size": self._size,
+            "checked_out": self._checked_out,
+            "idle": len(self._idle),
+            "waiters": self._waiters,
+            "logins": self.logins,
+        }
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Borrow a connection for a ``with`` block, discarding it on error."""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """Close idle connections; checked-out ones close when released."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._size -= 1
+                self._close_quietly(self._idle.pop()[0])
+            self._lock.notify_all()
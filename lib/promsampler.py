@@ -0,0 +1,170 @@
+"""Prometheus scrapes answered from a pre-encoded buffer.
+
+A ``MetricSampler`` thread sets prometheus_client gauges from psutil (or
+any other callable) every ``interval`` seconds. When a sampled value
+changed, the thread re-encodes the registry into an ``ExpositionCache``.
+Scrapes, whether through ``start_cached_http_server`` or a Flask route
+calling ``ExpositionCache.get``, only hand out the last buffer. No psutil
+call, /proc read or registry walk runs on the request thread.
+
+Instruments updated elsewhere, such as a request-latency histogram, call
+``invalidate`` so the next tick re-encodes. Collectors whose values the
+sampler cannot see, like the default process collector or the
+OpenTelemetry Prometheus reader, are re-encoded at least every ``max_age``
+seconds.
+
+``init_metrics`` wires this into a Flask app: the app's CPU and memory
+gauges on a started sampler, and a ``/metrics`` route serving the cache.
+"""
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psutil
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, Gauge, generate_latest
+from prometheus_client.openmetrics import exposition as openmetrics
+
+logger = logging.getLogger("sybase_app")
+
+
+class ExpositionCache:
+    """The registry's text exposition, encoded once per change rather than once per scrape.
+
+    The OpenMetrics encoding, which carries exemplars, is kept as well once
+    a scraper has asked for it.
+    """
+
+    def __init__(self, registry=REGISTRY):
+        self.registry = registry
+        self.refreshes = 0
+        self.refreshed_at = None  # monotonic time of the last encoding
+        self._text = b""
+        self._openmetrics = b""
+        self._openmetrics_wanted = False
+        self._dirty = True
+        self._lock = threading.Lock()  # Serializes encodings; readers never take it
+
+    @property
+    def stale(self):
+        return self._dirty
+
+    def invalidate(self):
+        """Have the next sampler tick re-encode, e.g. after observing a histogram."""
+        self._dirty = True
+
+    def refresh(self):
+        """Re-encode the registry now."""
+        with self._lock:
+            self._dirty = False
+            text = generate_latest(self.registry)
+            openmetrics_text = openmetrics.generate_latest(self.registry) if self._openmetrics_wanted else b""
+            # Swapped in one assignment each, so a scrape sees either the old or the new buffer
+            self._text, self._openmetrics = text, openmetrics_text
+            self.refreshes += 1
+            self.refreshed_at = time.monotonic()
+
+    def get(self, accept=None):
+        """Return ``(body, content_type)`` for a scrape with the given Accept header."""
+        if accept and "application/openmetrics-text" in accept:
+            if not self._openmetrics_wanted:
+                self._openmetrics_wanted = True
+                self._dirty = True  # Served as plain text until the next tick encodes it
+            elif self._openmetrics:
+                return self._openmetrics, openmetrics.CONTENT_TYPE_LATEST
+        return self._text, CONTENT_TYPE_LATEST
+
+
+class MetricSampler:
+    """Refresh gauges on a fixed interval and re-encode the exposition when they change."""
+
+    def __init__(self, cache, interval=5, max_age=60):
+        self.cache = cache
+        self.interval = interval
+        self.max_age = max_age
+        self._samples = []  # (gauge, callable returning its value)
+        self._last = {}  # gauge -> last value set
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, gauge, sample):
+        """Set ``gauge`` to ``sample()`` on every tick."""
+        self._samples.append((gauge, sample))
+
+    def sample(self):
+        """Run one tick: set every gauge, then re-encode if anything changed."""
+        changed = False
+        for gauge, sample in self._samples:
+            try:
+                value = sample()
+            except Exception as e:
+                logger.error(f"Sampling {gauge.describe()[0].name} failed: {e}")
+                continue
+            if self._last.get(gauge) != value:
+                self._last[gauge] = value
+                gauge.set(value)
+                changed = True
+        refreshed_at = self.cache.refreshed_at
+        if changed or self.cache.stale or refreshed_at is None or time.monotonic() - refreshed_at >= self.max_age:
+            self.cache.refresh()
+
+    def start(self):
+        """Take a first sample now, then keep sampling on a daemon thread."""
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name="metric-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Metric sampler tick failed: {e}")
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start_cached_http_server(cache, port, addr="0.0.0.0"):
+    """Serve ``cache`` over HTTP on a daemon thread, in place of ``prometheus_client.start_http_server``."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body, content_type = cache.get(self.headers.get("Accept"))
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # One line per scrape is noise
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def init_metrics(app, interval=5, max_age=60, registry=REGISTRY, prefix="flask_app"):
+    """Sample ``app``'s CPU and memory gauges on a daemon thread and serve ``/metrics`` from the cache.
+
+    Returns ``(cache, sampler)``; more gauges can be added with ``sampler.add``.
+    """
+    from flask import Response, request  # Only the Flask apps need Flask
+
+    cache = ExpositionCache(registry)
+    sampler = MetricSampler(cache, interval=interval, max_age=max_age)
+    cpu_metric = Gauge(f"{prefix}_cpu_usage", "CPU usage of Flask app", registry=registry)
+    memory_metric = Gauge(f"{prefix}_memory_usage", "Memory usage of Flask app", registry=registry)
+    sampler.add(cpu_metric, psutil.cpu_percent)  # CPU use since the previous tick
+    sampler.add(memory_metric, lambda: psutil.virtual_memory().percent)
+
+    def metrics():
+        # Pre-encoded by the sampler thread; nothing is measured here
+        body, content_type = cache.get(request.headers.get("Accept"))
+        return Response(body, content_type=content_type)
+
+    app.add_url_rule("/metrics", "metrics", metrics)
+    sampler.start()
+    return cache, sampler
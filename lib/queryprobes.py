@@ -0,0 +1,146 @@
+"""SQL probes declared in config and exported as gauges.
+
+A probe spec looks like::
+
+    {"name": "blocked_processes",
+     "query": "SELECT COUNT(*) FROM master..sysprocesses WHERE blocked > 0",
+     "metric": "sybase_blocked_processes", "unit": "processes",
+     "description": "Processes waiting on a lock", "interval": 60}
+
+The last column of each row is the value. The columns before it become
+attributes named by the spec's ``labels`` list. Rows whose value is NULL,
+as aggregates over empty tables return, are skipped and counted in
+``null_rows``. Probes run inside a
+target's poll, on the connection the poll already holds, whenever their
+interval has elapsed for that target. One observable gauge per metric
+reports the latest values. ``update`` applies a new probe list. Added
+probes run on the next poll. Removed probes stop, and their series are no
+longer reported. Untouched probes keep their schedule and values.
+"""
+import time
+import logging
+import threading
+
+from opentelemetry.metrics import Observation
+
+from lib.config import DEFAULT_PROBE_INTERVAL, diff_by_name
+
+logger = logging.getLogger("sybase_app")
+
+
+class QueryProbe:
+    """One config-declared query and how its rows map to a metric."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = spec["name"]
+        self.query = spec["query"]
+        self.metric = spec["metric"]
+        self.interval = spec.get("interval", DEFAULT_PROBE_INTERVAL)
+        self.labels = tuple(spec.get("labels", ()))
+        self.null_rows = 0  # Rows skipped because their value was NULL
+
+    def run(self, conn):
+        """Return ``[(attributes, value)]`` for the query's rows."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self.query)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        results = []
+        for row in rows:
+            if row[-1] is None:
+                self.null_rows += 1
+                continue
+            results.append((dict(zip(self.labels, row[:-1])), row[-1] if isinstance(row[-1], int) else float(row[-1])))
+        return results
+
+
+class QueryProbeSet:
+    """The probes currently configured, their per-target schedule and latest values."""
+
+    def __init__(self, meter, tracer=None):
+        self.meter = meter
+        self.tracer = tracer
+        self.probes = {}  # name -> QueryProbe
+        self._gauges = set()  # Metric names with a registered gauge; the SDK cannot remove one
+        self._values = {}  # (probe name, server) -> [(attributes, value)]
+        self._next_run = {}  # (probe name, server) -> monotonic time the probe is due
+        self._lock = threading.Lock()
+
+    def update(self, specs):
+        """Apply a new list of probe specs and return the ConfigDiff."""
+        diff = diff_by_name([probe.spec for probe in self.probes.values()], specs)
+        with self._lock:
+            for spec in diff.removed + diff.changed:
+                self._drop(spec["name"])
+            for spec in diff.added + diff.changed:
+                probe = self.probes[spec["name"]] = QueryProbe(spec)
+                if probe.metric not in self._gauges:
+                    self._register_gauge(probe)
+        for spec in diff.added:
+            logger.info(f"Started query probe {spec['name']}.")
+        for spec in diff.removed:
+            logger.info(f"Stopped query probe {spec['name']}.")
+        return diff
+
+    def _drop(self, name):
+        self.probes.pop(name, None)
+        for key in [key for key in self._values if key[0] == name]:
+            del self._values[key]
+        for key in [key for key in self._next_run if key[0] == name]:
+            del self._next_run[key]
+
+    def _register_gauge(self, probe):
+        self._gauges.add(probe.metric)
+        self.meter.create_observable_gauge(
+            name=probe.metric,
+            callbacks=[lambda options, metric=probe.metric: self._observe(metric)],
+            description=probe.spec.get("description", f"Result of the {probe.name} query probe"),
+            unit=probe.spec.get("unit", "1"),
+        )
+
+    def _observe(self, metric):
+        with self._lock:
+            return [
+                Observation(value, attributes)
+                for (name, _), rows in self._values.items()
+                if self.probes[name].metric == metric
+                for attributes, value in rows
+            ]
+
+    def run_due(self, conn, attributes):
+        """Run every probe whose interval has elapsed for this target."""
+        server = attributes["sybase.server"]
+        now = time.monotonic()
+        with self._lock:
+            probes = list(self.probes.values())
+        for probe in probes:
+            key = (probe.name, server)
+            with self._lock:
+                if self._next_run.get(key, 0) > now:
+                    continue
+                self._next_run[key] = now + probe.interval
+            try:
+                if self.tracer is not None:
+                    with self.tracer.start_as_current_span("sybase_query_probe", attributes={"probe": probe.name}):
+                        rows = probe.run(conn)
+                else:
+                    rows = probe.run(conn)
+            except Exception as e:
+                logger.error(f"Query probe {probe.name} failed on {server}: {e}")
+                with self._lock:
+                    self._values.pop(key, None)  # Report nothing rather than a stale value
+                continue
+            with self._lock:
+                if self.probes.get(probe.name) is probe:  # Not removed or replaced meanwhile
+                    self._values[key] = [(dict(attributes, **labels), value) for labels, value in rows]
+
+    def forget(self, server):
+        """Drop schedule and values for a target that is no longer polled."""
+        with self._lock:
+            for key in [key for key in self._values if key[1] == server]:
+                del self._values[key]
+            for key in [key for key in self._next_run if key[1] == server]:
+                del self._next_run[key]
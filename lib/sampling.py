@@ -0,0 +1,176 @@
+"""Span sampling: a per-name rate limit at the head, and local tail sampling.
+
+``RateLimitingSampler`` caps how many root spans of each name start per
+second with a token bucket. Spans over the limit are never recorded, so it
+is meant for bursty, high-frequency names. ``TailSamplingSpanProcessor``
+sits in front of the exporting processor and buffers each trace until its
+local root span ends. It then keeps the whole trace if any span failed or
+ran longer than the latency threshold, or if it was pinned (an exemplar
+links to it), keeps a small random share of the rest, and drops the others.
+"""
+import time
+import random
+import threading
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.sdk.trace.sampling import Decision, Sampler, SamplingResult
+
+
+class TokenBucket:
+    """Allow ``rate`` events per second on average, with bursts up to ``burst``."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.clock = clock
+        self.tokens = self.burst
+        self._updated = clock()
+
+    def take(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class RateLimitingSampler(Sampler):
+    """Sample at most ``rates[name]`` spans per second for each span name.
+
+    Names without an entry use ``default_rate``; None means unlimited. Use
+    it as the root of a ``ParentBased`` sampler so children follow their
+    root's decision.
+    """
+
+    def __init__(self, rates, default_rate=None, burst=None):
+        self.rates = dict(rates)
+        self.default_rate = default_rate
+        self.burst = burst
+        self.limited = {}  # span name -> spans not sampled
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, name):
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            rate = self.rates.get(name, self.default_rate)
+            if rate is None:
+                return None
+            bucket = self._buckets[name] = TokenBucket(rate, self.burst)
+        return bucket
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None):
+        parent_state = trace.get_current_span(parent_context).get_span_context().trace_state
+        with self._lock:
+            bucket = self._bucket(name)
+            if bucket is None or bucket.take():
+                return SamplingResult(Decision.RECORD_AND_SAMPLE, attributes, parent_state)
+            self.limited[name] = self.limited.get(name, 0) + 1
+        return SamplingResult(Decision.DROP, None, parent_state)
+
+    def get_description(self):
+        return f"RateLimitingSampler{{{self.rates}, default={self.default_rate}}}"
+
+
+class _PendingTrace:
+    __slots__ = ("started", "spans", "error", "slow", "pinned")
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.spans = []
+        self.error = False
+        self.slow = False
+        self.pinned = False
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """Decide per trace, once its local root ends, whether ``processor`` sees it.
+
+    At most ``max_traces`` traces and ``max_spans_per_trace`` spans per trace
+    are buffered. A trace whose root has not ended after ``decision_wait``
+    seconds, or that is evicted to make room, is decided on the spans seen
+    so far.
+    """
+
+    def __init__(self, processor, slow_threshold_ms=1000, keep_ratio=0.05,
+                 max_traces=2048, max_spans_per_trace=512, decision_wait=30):
+        self.processor = processor
+        self.slow_threshold_ns = slow_threshold_ms * 1e6
+        self.keep_ratio = keep_ratio
+        self.max_traces = max_traces
+        self.max_spans_per_trace = max_spans_per_trace
+        self.decision_wait = decision_wait
+        self.kept_traces = 0
+        self.dropped_traces = 0
+        self.dropped_spans = 0
+        self._traces = {}  # trace_id -> _PendingTrace, oldest first
+        self._lock = threading.Lock()
+
+    def on_start(self, span, parent_context=None):
+        self.processor.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span):
+        decided = []
+        with self._lock:
+            trace_id = span.context.trace_id
+            pending = self._traces.get(trace_id)
+            if pending is None:
+                pending = self._traces[trace_id] = _PendingTrace()
+            if len(pending.spans) < self.max_spans_per_trace:
+                pending.spans.append(span)
+            else:
+                self.dropped_spans += 1
+            if span.status.status_code is trace.StatusCode.ERROR:
+                pending.error = True
+            if span.end_time - span.start_time >= self.slow_threshold_ns:
+                pending.slow = True
+
+            if span.parent is None or span.parent.is_remote:
+                decided.append(self._traces.pop(trace_id))
+            decided.extend(self._expire())
+
+        for pending in decided:
+            self._decide(pending)
+
+    def pin(self, trace_id):
+        """Keep ``trace_id`` whatever else is decided, e.g. because an exemplar links to it."""
+        with self._lock:
+            pending = self._traces.get(trace_id)
+            if pending is None:
+                pending = self._traces[trace_id] = _PendingTrace()
+            pending.pinned = True
+
+    def _expire(self):
+        """Pop traces that waited too long or overflow the buffer; caller holds the lock."""
+        expired = []
+        deadline = time.monotonic() - self.decision_wait
+        while self._traces:
+            trace_id = next(iter(self._traces))
+            if self._traces[trace_id].started > deadline and len(self._traces) <= self.max_traces:
+                break
+            expired.append(self._traces.pop(trace_id))
+        return expired
+
+    def _decide(self, pending):
+        if not pending.spans:
+            return  # Pinned after its spans were already decided
+        if pending.error or pending.slow or pending.pinned or random.random() < self.keep_ratio:
+            self.kept_traces += 1
+            for span in pending.spans:
+                self.processor.on_end(span)
+        else:
+            self.dropped_traces += 1
+            self.dropped_spans += len(pending.spans)
+
+    def shutdown(self):
+        with self._lock:
+            pending, self._traces = list(self._traces.values()), {}
+        for waiting in pending:
+            self._decide(waiting)
+        self.processor.shutdown()
+
+    def force_flush(self, timeout_millis=30000):
+        return self.processor.force_flush(timeout_millis)
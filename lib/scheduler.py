@@ -0,0 +1,119 @@
+"""Fixed-rate, wall-clock aligned scheduling of independent collection probes."""
+import math
+import time
+import random
+import logging
+import threading
+
+logger = logging.getLogger("sybase_app")
+
+
+def adjust_backoff(backoff, latency, slow_threshold, max_backoff):
+    """Return the next backoff factor: doubled after a slow run, halved once runs are fast again."""
+    if latency > slow_threshold and backoff < max_backoff:
+        return min(backoff * 2, max_backoff)
+    if latency < slow_threshold / 2 and backoff > 1:
+        return backoff // 2
+    return backoff
+
+
+class Probe:
+    """A collection function with its own interval, jitter and backoff.
+
+    Ticks fall on multiples of the interval in wall-clock time (a 10s probe
+    runs at :00, :10, :20, ...), plus up to ``jitter`` seconds of random
+    delay so many agents do not hit a server in lockstep. When a run takes
+    longer than ``slow_threshold`` seconds the effective interval doubles,
+    up to ``max_backoff`` times the base interval, and it halves again once
+    runs are back under half the threshold.
+    """
+
+    def __init__(self, name, func, interval, jitter=0.0, slow_threshold=None, max_backoff=8):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.slow_threshold = slow_threshold
+        self.max_backoff = max_backoff
+
+        self.backoff = 1
+        self.runs = 0
+        self.missed_ticks = 0
+        self.last_latency = None
+        self.next_tick = None  # Aligned tick the next run belongs to
+        self.next_run = None  # next_tick plus this tick's jitter
+
+    @property
+    def effective_interval(self):
+        return self.interval * self.backoff
+
+    def schedule(self, now):
+        """Move to the first aligned tick after ``now``, counting skipped ones."""
+        interval = self.effective_interval
+        tick = math.floor(now / interval) * interval + interval
+        if self.next_tick is not None:
+            missed = int((tick - self.next_tick) / interval) - 1
+            if missed > 0:
+                self.missed_ticks += missed
+                logger.warning(f"Probe {self.name} missed {missed} tick(s).")
+        self.next_tick = tick
+        self.next_run = tick + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def run(self, clock=time.time):
+        """Run the probe once, then adjust backoff from its latency."""
+        started = clock()
+        try:
+            self.func()
+        except Exception as e:
+            logger.error(f"Probe {self.name} failed: {e}")
+        self.last_latency = clock() - started
+        self.runs += 1
+
+        if self.slow_threshold is not None:
+            backoff = adjust_backoff(self.backoff, self.last_latency, self.slow_threshold, self.max_backoff)
+            if backoff > self.backoff:
+                logger.warning(
+                    f"Probe {self.name} took {self.last_latency:.2f}s; "
+                    f"backing off to every {self.interval * backoff}s."
+                )
+            self.backoff = backoff
+        self.schedule(clock())
+
+
+class ProbeScheduler:
+    """Run each registered probe on its own fixed-rate schedule."""
+
+    def __init__(self, probes=(), clock=time.time, on_run=None):
+        self.clock = clock
+        self.on_run = on_run  # Optional callable(probe) invoked after every run
+        self.probes = []
+        self._stopped = threading.Event()
+        for probe in probes:
+            self.add(probe)
+
+    def add(self, probe):
+        probe.schedule(self.clock())
+        self.probes.append(probe)
+        return probe
+
+    def remove(self, name):
+        self.probes = [probe for probe in self.probes if probe.name != name]
+
+    def run_pending(self):
+        """Run every probe whose tick has arrived; return seconds until the next one."""
+        for probe in list(self.probes):
+            if probe.next_run <= self.clock():
+                probe.run(self.clock)
+                if self.on_run is not None:
+                    self.on_run(probe)
+        if not self.probes:
+            return 1.0
+        return max(0.0, min(probe.next_run for probe in self.probes) - self.clock())
+
+    def run_forever(self):
+        """Loop until ``stop`` is called."""
+        while not self._stopped.is_set():
+            self._stopped.wait(self.run_pending())
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,249 @@
+"""Self-instrumentation: what the collector agent itself costs."""
+import time
+from contextlib import contextmanager
+
+import psutil
+from opentelemetry.metrics import NoOpMeter, Observation
+
+from lib.export_tuning import batch_queue
+
+SELF_METER_NAME = "sybase_agent.self"
+
+
+class AgentSelfMetrics:
+    """Metrics about the agent's own overhead, under a dedicated meter.
+
+    With ``enabled=False`` every instrument is a no-op and nothing is timed,
+    so the hooks can stay in the collection path at no cost.
+    """
+
+    def __init__(self, meter_provider, enabled=True):
+        self.enabled = enabled
+        meter = meter_provider.get_meter(SELF_METER_NAME) if enabled else NoOpMeter(SELF_METER_NAME)
+        self._queues = []  # (signal, queue)
+        self._dropped = {}  # signal -> dropped item count
+        self._drop_sources = []  # (signal, callable returning a cumulative drop count)
+        self._overrun_sources = []  # Callables returning a cumulative overrun count
+        self._limited_meters = []  # CardinalityLimitedMeters whose drops are reported
+        self._samplers = []  # (stage, callable returning spans sampled out)
+        self._shards = []  # ShardCoordinators of watched collectors
+        self._tuners = []  # AdaptiveBatchTuners of the span and log processors
+        self._process = psutil.Process()
+
+        self.probe_latency = meter.create_histogram(
+            name="agent_probe_query_latency",
+            description="Latency of each monitoring query issued by the agent",
+            unit="ms",
+        )
+        self.cycle_duration = meter.create_histogram(
+            name="agent_cycle_duration",
+            description="Wall time of one collection cycle",
+            unit="ms",
+        )
+        meter.create_observable_counter(
+            name="agent_cycle_overruns",
+            callbacks=[self._observe_overruns],
+            description="Collection cycles skipped because the previous one overran",
+            unit="cycles",
+        )
+        meter.create_observable_gauge(
+            name="agent_exporter_queue_depth",
+            callbacks=[self._observe_queue_depth],
+            description="Items waiting in the batch processor queues",
+            unit="items",
+        )
+        meter.create_observable_counter(
+            name="agent_exporter_dropped",
+            callbacks=[self._observe_dropped],
+            description="Spans and log records dropped because a batch or log queue was full",
+            unit="items",
+        )
+        meter.create_observable_counter(
+            name="agent_metric_series_dropped",
+            callbacks=[self._observe_series_dropped],
+            description="Distinct attribute sets folded into an instrument's overflow series",
+            unit="series",
+        )
+        meter.create_observable_counter(
+            name="agent_spans_sampled_out",
+            callbacks=[self._observe_sampled_out],
+            description="Spans not exported because a head or tail sampler dropped them",
+            unit="spans",
+        )
+        meter.create_observable_gauge(
+            name="agent_shard_targets",
+            callbacks=[self._observe_shard_targets],
+            description="Sybase targets assigned to this replica",
+            unit="targets",
+        )
+        meter.create_observable_gauge(
+            name="agent_shard_replicas",
+            callbacks=[self._observe_shard_replicas],
+            description="Live agent replicas sharing the target list",
+            unit="replicas",
+        )
+        meter.create_observable_gauge(
+            name="agent_export_batch_size",
+            callbacks=[self._observe_export_batch_size],
+            description="Maximum export batch size chosen by the export tuner",
+            unit="items",
+        )
+        meter.create_observable_gauge(
+            name="agent_export_schedule_delay",
+            callbacks=[self._observe_export_schedule_delay],
+            description="Flush interval chosen by the export tuner",
+            unit="ms",
+        )
+        meter.create_observable_gauge(
+            name="agent_export_latency",
+            callbacks=[self._observe_export_latency],
+            description="Mean time per export call over the export tuner's last interval",
+            unit="ms",
+        )
+        meter.create_observable_counter(
+            name="agent_cpu_time",
+            callbacks=[self._observe_cpu_time],
+            description="CPU time consumed by the agent process",
+            unit="s",
+        )
+        meter.create_observable_gauge(
+            name="agent_memory_rss",
+            callbacks=[lambda options: [Observation(self._process.memory_info().rss)]],
+            description="Resident memory of the agent process",
+            unit="bytes",
+        )
+
+    # === Timing hooks ===
+    @contextmanager
+    def time_probe(self, probe, attributes=None):
+        """Time one monitoring query."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            self.probe_latency.record(duration, dict(attributes or {}, probe=probe))
+
+    @contextmanager
+    def time_cycle(self, cycle):
+        """Time one whole collection cycle."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.cycle_duration.record((time.perf_counter() - started) * 1000, {"cycle": cycle})
+
+    # === Sources ===
+    def watch_processor(self, processor, signal):
+        """Report queue depth and drops of a BatchSpanProcessor/BatchLogProcessor."""
+        if not self.enabled or processor is None:
+            return
+        owner, queue, max_size = batch_queue(processor)
+        self._queues.append((signal, queue))
+        self._dropped.setdefault(signal, 0)
+        method_name = "emit" if hasattr(owner, "emit") else "on_end"
+        original = getattr(owner, method_name)
+
+        def counted(item, *args, **kwargs):
+            if len(queue) >= max_size:
+                self._dropped[signal] += 1
+            return original(item, *args, **kwargs)
+
+        setattr(owner, method_name, counted)
+
+    def watch_export_tuners(self, telemetry):
+        """Report the batch size and flush interval the bootstrap's export tuners chose."""
+        if self.enabled:
+            self._tuners.extend(telemetry.export_tuners.values())
+
+    def watch_log_queue(self, handler):
+        """Report depth and overflow drops of a CorrelatingQueueHandler's queue."""
+        if not self.enabled or handler is None:
+            return
+        self._queues.append(("log_queue", handler.queue.queue))
+        self._drop_sources.append(("log_queue", lambda: handler.dropped))
+
+    def watch_scheduler(self, scheduler):
+        """Record each scheduled probe run as a cycle and count missed ticks."""
+        if not self.enabled:
+            return
+
+        def on_run(probe):
+            self.cycle_duration.record(probe.last_latency * 1000, {"cycle": probe.name})
+
+        scheduler.on_run = on_run
+        self._overrun_sources.append(lambda: sum(probe.missed_ticks for probe in scheduler.probes))
+
+    def watch_collector(self, collector):
+        """Count skipped target polls and, when sharded, report the shard size."""
+        if not self.enabled:
+            return
+        self._overrun_sources.append(lambda: collector.skipped_polls)
+        if collector.shard is not None:
+            self._shards.append(collector.shard)
+
+    def watch_cardinality(self, limited_meter):
+        """Report the series each instrument of a CardinalityLimitedMeter dropped."""
+        if self.enabled:
+            self._limited_meters.append(limited_meter)
+
+    def watch_sampling(self, telemetry):
+        """Count spans dropped by the bootstrap's rate-limiting and tail samplers."""
+        if not self.enabled:
+            return
+        if telemetry.rate_limiter is not None:
+            limited = telemetry.rate_limiter.limited
+            self._samplers.append(("head", lambda: sum(limited.values())))
+        if telemetry.tail_sampler is not None:
+            self._samplers.append(("tail", lambda: telemetry.tail_sampler.dropped_spans))
+
+    # === Callbacks ===
+    def _observe_overruns(self, options):
+        return [Observation(sum(source() for source in self._overrun_sources))]
+
+    def _observe_queue_depth(self, options):
+        return [Observation(len(queue), {"signal": signal}) for signal, queue in self._queues]
+
+    def _observe_dropped(self, options):
+        observations = [Observation(count, {"signal": signal}) for signal, count in self._dropped.items()]
+        observations.extend(Observation(source(), {"signal": signal}) for signal, source in self._drop_sources)
+        return observations
+
+    def _observe_series_dropped(self, options):
+        return [
+            Observation(limiter.dropped_series, {"instrument": name})
+            for limited_meter in self._limited_meters
+            for name, limiter in limited_meter.limiters.items()
+            if limiter.dropped_series
+        ]
+
+    def _observe_sampled_out(self, options):
+        return [Observation(source(), {"stage": stage}) for stage, source in self._samplers]
+
+    def _observe_shard_targets(self, options):
+        return [Observation(shard.owned) for shard in self._shards]
+
+    def _observe_shard_replicas(self, options):
+        return [Observation(len(shard.ring.members)) for shard in self._shards]
+
+    def _observe_export_batch_size(self, options):
+        return [Observation(tuner.batch_size, {"signal": tuner.signal}) for tuner in self._tuners]
+
+    def _observe_export_schedule_delay(self, options):
+        return [Observation(tuner.delay_millis, {"signal": tuner.signal}) for tuner in self._tuners]
+
+    def _observe_export_latency(self, options):
+        return [Observation(tuner.export_latency_millis, {"signal": tuner.signal}) for tuner in self._tuners]
+
+    def _observe_cpu_time(self, options):
+        cpu_times = self._process.cpu_times()
+        return [
+            Observation(cpu_times.user, {"cpu.mode": "user"}),
+            Observation(cpu_times.system, {"cpu.mode": "system"}),
+        ]
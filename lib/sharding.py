@@ -0,0 +1,142 @@
+"""Split the target list across agent replicas without double-polling.
+
+Each replica holds a lease: a small file in a directory all replicas share
+(local disk, or a network filesystem for replicas on several hosts whose
+clocks agree). The lease is renewed every collection cycle. The live
+replicas, those whose lease has not expired, are placed on a consistent-hash
+ring with ``vnodes`` points each. A target belongs to the first replica
+clockwise from the target's hash. Every replica computes the same ring
+from the same lease directory, so no other coordination is needed.
+
+When a replica stops renewing, its lease expires after ``ttl`` seconds.
+The others take over its targets on their next cycle. A replica that shuts
+down cleanly removes its lease, so its targets move at once. Adding or
+removing one of N replicas moves about 1/N of the targets. Virtual nodes
+keep each replica's share close to 1/N.
+"""
+import os
+import json
+import time
+import socket
+import bisect
+import hashlib
+import logging
+
+logger = logging.getLogger("sybase_app")
+
+LEASE_SUFFIX = ".lease"
+STALE_LEASE_TTLS = 10  # Expired leases are deleted after this many TTLs
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent-hash ring mapping keys to members through virtual nodes."""
+
+    def __init__(self, members, vnodes=512):
+        self.members = frozenset(members)
+        self.vnodes = vnodes
+        points = sorted((_hash(f"{member}#{index}"), member) for member in self.members for index in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key):
+        """The member responsible for ``key``, or None on an empty ring."""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class LeaseDirectory:
+    """Replica leases stored as one JSON file per replica."""
+
+    def __init__(self, directory, replica_id, ttl):
+        self.directory = directory
+        self.replica_id = replica_id
+        self.ttl = ttl
+        self.path = os.path.join(directory, f"{replica_id}{LEASE_SUFFIX}")
+        os.makedirs(directory, exist_ok=True)
+
+    def renew(self):
+        """Extend this replica's lease by ``ttl`` seconds from now."""
+        lease = {"replica": self.replica_id, "host": socket.gethostname(), "pid": os.getpid(),
+                 "expires": time.time() + self.ttl}
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as handle:
+            json.dump(lease, handle)
+        os.replace(temporary, self.path)  # Readers never see a half-written lease
+
+    def live_replicas(self):
+        """IDs of the replicas whose lease has not expired."""
+        now = time.time()
+        replicas = set()
+        for name in os.listdir(self.directory):
+            if not name.endswith(LEASE_SUFFIX):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as handle:
+                    lease = json.load(handle)
+            except (OSError, ValueError):
+                continue  # Removed or replaced while listing
+            expires = lease.get("expires", 0)
+            if expires > now:
+                replicas.add(lease["replica"])
+            elif expires < now - STALE_LEASE_TTLS * self.ttl:
+                self._remove(os.path.join(self.directory, name))  # Left behind by a crashed replica
+        return replicas
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def release(self):
+        """Give up the lease so the other replicas take over immediately."""
+        self._remove(self.path)
+
+
+class ShardCoordinator:
+    """Decide which targets this replica polls, from the shared lease directory.
+
+    Call ``assign`` once per cycle: it renews the lease, rebuilds the ring
+    when the set of live replicas changed, and returns the targets owned here.
+    """
+
+    def __init__(self, directory, replica_id=None, ttl=30, vnodes=512):
+        self.replica_id = replica_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.leases = LeaseDirectory(directory, self.replica_id, ttl)
+        self.vnodes = vnodes
+        self.ring = HashRing([self.replica_id], vnodes)
+        self.owned = 0  # Targets assigned to this replica in the last cycle
+
+    def refresh(self):
+        """Renew this replica's lease and pick up membership changes."""
+        try:
+            self.leases.renew()
+            replicas = self.leases.live_replicas()
+        except OSError as e:
+            # Keep the previous ring; the lease lapses if this persists
+            logger.error(f"Lease directory {self.leases.directory} unavailable: {e}")
+            return
+        replicas.add(self.replica_id)
+        if replicas != self.ring.members:
+            logger.info(f"Shard membership changed: {len(replicas)} replica(s) {sorted(replicas)}.")
+            self.ring = HashRing(replicas, self.vnodes)
+
+    def owns(self, key):
+        return self.ring.owner(key) == self.replica_id
+
+    def assign(self, targets):
+        """Refresh the lease and return the targets this replica should poll."""
+        self.refresh()
+        owned = [target for target in targets if self.owns(target.name)]
+        self.owned = len(owned)
+        return owned
+
+    def release(self):
+        self.leases.release()
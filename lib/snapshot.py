@@ -0,0 +1,98 @@
+"""One-round-trip snapshot of master..sysprocesses and syslogshold."""
+from collections import defaultdict
+
+# A single batch: one grouped scan of sysprocesses, then the open-transaction
+# count for the current database. Totals are derived from the grouped rows in
+# memory, so sysprocesses is read exactly once per cycle.
+SNAPSHOT_SQL = """
+SELECT dbid, status, COUNT(*), SUM(logical_reads), SUM(writes)
+FROM master..sysprocesses
+GROUP BY dbid, status
+
+SELECT DB_ID(), COUNT(*)
+FROM master..syslogshold
+WHERE dbid = DB_ID()
+"""
+
+# Same batch, but with one row per session so per-SPID counter deltas can be
+# computed; the dbid/status breakdown is then aggregated in memory.
+SPID_SNAPSHOT_SQL = """
+SELECT spid, kpid, dbid, status, logical_reads, writes
+FROM master..sysprocesses
+
+SELECT DB_ID(), COUNT(*)
+FROM master..syslogshold
+WHERE dbid = DB_ID()
+"""
+
+
+class SysprocessesSnapshot:
+    """In-memory view of one snapshot that every instrument reads from."""
+
+    def __init__(self, breakdown, current_dbid, open_transactions, sessions=None):
+        # breakdown: list of (dbid, status, processes, logical_reads, writes)
+        # sessions: list of (spid, kpid, logical_reads, writes), per-SPID only
+        self.breakdown = breakdown
+        self.sessions = sessions
+        self.current_dbid = current_dbid
+        self.open_transactions = open_transactions
+
+    @property
+    def total_connections(self):
+        return sum(row[2] for row in self.breakdown)
+
+    @property
+    def active_connections(self):
+        return sum(row[2] for row in self.breakdown if row[1] == "active")
+
+    @property
+    def logical_reads(self):
+        return sum(row[3] for row in self.breakdown)
+
+    @property
+    def writes(self):
+        return sum(row[4] for row in self.breakdown)
+
+    @property
+    def transaction_rate(self):
+        return self.logical_reads + self.writes
+
+    def connections_in_db(self, dbid=None):
+        """Count processes in ``dbid``, defaulting to the connection's database."""
+        dbid = self.current_dbid if dbid is None else dbid
+        return sum(row[2] for row in self.breakdown if row[0] == dbid)
+
+
+def _aggregate(rows):
+    groups = defaultdict(lambda: [0, 0, 0])
+    sessions = []
+    for spid, kpid, dbid, status, reads, writes in rows:
+        reads, writes = reads or 0, writes or 0
+        group = groups[(dbid, (status or "").strip())]
+        group[0] += 1
+        group[1] += reads
+        group[2] += writes
+        sessions.append((spid, kpid, reads, writes))
+    breakdown = [(dbid, status, *totals) for (dbid, status), totals in groups.items()]
+    return breakdown, sessions
+
+
+def take_snapshot(conn, per_spid=False):
+    """Run the snapshot batch on ``conn`` and return a SysprocessesSnapshot."""
+    cursor = conn.cursor()
+    sessions = None
+    try:
+        if per_spid:
+            cursor.execute(SPID_SNAPSHOT_SQL)
+            breakdown, sessions = _aggregate(cursor.fetchall())
+        else:
+            cursor.execute(SNAPSHOT_SQL)
+            breakdown = [
+                (dbid, (status or "").strip(), count, reads or 0, writes or 0)
+                for dbid, status, count, reads, writes in cursor.fetchall()
+            ]
+        cursor.nextset()
+        current_dbid, open_transactions = cursor.fetchone()
+    finally:
+        cursor.close()
+    return SysprocessesSnapshot(breakdown, current_dbid, open_transactions, sessions)
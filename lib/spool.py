@@ -0,0 +1,322 @@
+"""Write-ahead disk spool for OTLP exports that survives collector outages.
+
+The spooling exporters encode each batch to its OTLP protobuf request and
+append it to size-bounded segment files; ``export()`` never waits on the
+network. A background replayer sends the spooled requests to the collector
+in order, one at a time, and only moves on once the collector accepted a
+request, backing off while it is unreachable or timing out. A request the
+collector rejects for any other reason (malformed, oversized, unsupported)
+would never be accepted, so it is logged and dropped instead of blocking
+everything behind it. When the spool exceeds its disk budget the oldest
+segments are evicted first. Delivery is at-least-once: a request may be
+resent if the agent restarts mid-segment.
+"""
+import os
+import time
+import struct
+import logging
+import threading
+from urllib.parse import urlparse
+
+import grpc
+from opentelemetry.exporter.otlp.proto.common._log_encoder import encode_logs
+from opentelemetry.exporter.otlp.proto.common.metrics_encoder import encode_metrics
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk._logs.export import LogExporter, LogExportResult
+from opentelemetry.sdk.metrics.export import MetricExporter, MetricExportResult
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+logger = logging.getLogger("sybase_app")
+
+_LENGTH = struct.Struct(">I")
+_SEGMENT_SUFFIX = ".seg"
+
+TRACE_EXPORT_METHOD = "/opentelemetry.proto.collector.trace.v1.TraceService/Export"
+METRICS_EXPORT_METHOD = "/opentelemetry.proto.collector.metrics.v1.MetricsService/Export"
+LOGS_EXPORT_METHOD = "/opentelemetry.proto.collector.logs.v1.LogsService/Export"
+
+# Failures worth retrying the same request for; any other status drops it
+RETRYABLE_CODES = frozenset((grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED))
+
+
+class SegmentSpool:
+    """Length-prefixed records in numbered segment files under one directory."""
+
+    def __init__(self, directory, segment_bytes=8 * 1024 * 1024, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.evicted_segments = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._segments = sorted(
+            int(name[: -len(_SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(_SEGMENT_SUFFIX)
+        )
+        self._sizes = {seq: os.path.getsize(self._path(seq)) for seq in self._segments}
+        self._active = None  # (seq, file) currently appended to
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f"{seq:012d}{_SEGMENT_SUFFIX}")
+
+    def _roll(self):
+        """Close the active segment so the replayer may read it; caller holds the lock."""
+        if self._active is not None:
+            self._active[1].close()
+            self._active = None
+
+    def append(self, record):
+        """Append one encoded request, rolling and evicting segments as needed."""
+        with self._lock:
+            if self._active is not None and self._sizes[self._active[0]] >= self.segment_bytes:
+                self._roll()
+            if self._active is None:
+                seq = self._segments[-1] + 1 if self._segments else 0
+                self._active = (seq, open(self._path(seq), "ab"))
+                self._segments.append(seq)
+                self._sizes[seq] = 0
+            seq, segment = self._active
+            segment.write(_LENGTH.pack(len(record)) + record)
+            segment.flush()
+            self._sizes[seq] += _LENGTH.size + len(record)
+            self._evict()
+
+    def _evict(self):
+        """Drop the oldest closed segments while over budget; caller holds the lock."""
+        while sum(self._sizes.values()) > self.max_bytes and len(self._segments) > 1:
+            seq = self._segments.pop(0)
+            self._sizes.pop(seq)
+            self._remove(seq)
+            self.evicted_segments += 1
+            logger.warning(f"Spool over {self.max_bytes} bytes; evicted segment {seq}.")
+
+    def _remove(self, seq):
+        try:
+            os.remove(self._path(seq))
+        except FileNotFoundError:
+            pass
+
+    def oldest(self):
+        """Return ``(seq, records)`` of the oldest segment, or None when empty.
+
+        The active segment is rolled first so that a caught-up replayer also
+        drains the most recent records. A truncated trailing record, left by
+        a crash mid-write, is ignored.
+        """
+        with self._lock:
+            if not self._segments:
+                return None
+            seq = self._segments[0]
+            if self._active is not None and self._active[0] == seq:
+                self._roll()
+            path = self._path(seq)
+        try:
+            with open(path, "rb") as segment:
+                data = segment.read()
+        except FileNotFoundError:
+            return seq, []
+        records = []
+        offset = 0
+        while offset + _LENGTH.size <= len(data):
+            (length,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            if offset + length > len(data):
+                break
+            records.append(data[offset : offset + length])
+            offset += length
+        return seq, records
+
+    def discard(self, seq):
+        """Delete a fully delivered segment."""
+        with self._lock:
+            if seq in self._sizes:
+                self._segments.remove(seq)
+                self._sizes.pop(seq)
+            self._remove(seq)
+
+    def is_empty(self):
+        with self._lock:
+            return not self._segments
+
+    def close(self):
+        with self._lock:
+            self._roll()
+
+
+class SpoolReplayer(threading.Thread):
+    """Send spooled requests to an OTLP/gRPC endpoint in order."""
+
+    def __init__(self, spool, endpoint, method, insecure=True, timeout=10, max_backoff=60, compression=None):
+        super().__init__(name="otlp-spool-replay", daemon=True)
+        self.spool = spool
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.rejected_records = 0
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+
+        target = urlparse(endpoint).netloc if "://" in endpoint else endpoint
+        if insecure:
+            self._channel = grpc.insecure_channel(target, compression=compression)
+        else:
+            self._channel = grpc.secure_channel(target, grpc.ssl_channel_credentials(), compression=compression)
+        # Records are already serialized requests, so bytes pass straight through
+        self._send = self._channel.unary_unary(method)
+
+    def notify(self):
+        self._wake.set()
+
+    def run(self):
+        backoff = 1
+        while not self._stopped.is_set():
+            segment = self.spool.oldest()
+            if segment is None:
+                self._wake.wait(1)
+                self._wake.clear()
+                continue
+            seq, records = segment
+            delivered = 0
+            retry = None
+            for record in records:
+                try:
+                    self._send(record, timeout=self.timeout)
+                except grpc.RpcError as e:
+                    if e.code() in RETRYABLE_CODES:
+                        retry = e
+                        break
+                    self.rejected_records += 1
+                    logger.error(f"OTLP endpoint rejected a spooled request, dropping it: {e.code()} {e.details()}")
+                delivered += 1
+            if retry is not None:
+                logger.warning(f"OTLP endpoint unavailable, retrying in {backoff}s: {retry.code()}")
+                if delivered:
+                    self._requeue(seq, records[delivered:])
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = 1
+            self.spool.discard(seq)
+
+    def _requeue(self, seq, remaining):
+        """Rewrite a partly delivered segment so delivered records are not resent.
+
+        If the rewrite fails the segment is left as it was, and its
+        delivered records are sent again.
+        """
+        path = self.spool._path(seq)
+        temporary = path + ".tmp"
+        try:
+            with open(temporary, "wb") as segment:
+                for record in remaining:
+                    segment.write(_LENGTH.pack(len(record)) + record)
+            with self.spool._lock:
+                if seq not in self.spool._sizes:
+                    os.remove(temporary)  # Evicted meanwhile
+                    return
+                os.replace(temporary, path)
+                self.spool._sizes[seq] = os.path.getsize(path)
+        except OSError as e:
+            logger.error(f"Could not rewrite spool segment {seq}: {e}")
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wake.set()
+        self.join(timeout)
+        self._channel.close()
+
+
+class _Spooling:
+    """Shared plumbing for the three signal-specific spooling exporters."""
+
+    def _start_spool(self, directory, endpoint, method, insecure, segment_bytes, max_bytes, compression):
+        self.spool = SegmentSpool(directory, segment_bytes=segment_bytes, max_bytes=max_bytes)
+        self.replayer = SpoolReplayer(self.spool, endpoint, method, insecure=insecure, compression=compression)
+        self.replayer.start()
+
+    def _append(self, request):
+        try:
+            self.spool.append(request.SerializeToString())
+        except OSError as e:
+            logger.error(f"Could not spool OTLP batch: {e}")
+            return False
+        self.replayer.notify()
+        return True
+
+    def _drain(self, timeout_millis):
+        deadline = time.monotonic() + timeout_millis / 1000
+        self.replayer.notify()
+        while not self.spool.is_empty():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _stop(self):
+        self.replayer.stop(timeout=5)
+        self.spool.close()
+
+
+class SpoolingSpanExporter(_Spooling, SpanExporter):
+    """Span exporter that spools OTLP requests to disk before sending them."""
+
+    def __init__(self, directory, endpoint="http://localhost:4317", insecure=True,
+                 segment_bytes=8 * 1024 * 1024, max_bytes=256 * 1024 * 1024, compression=None):
+        self._start_spool(directory, endpoint, TRACE_EXPORT_METHOD, insecure, segment_bytes, max_bytes, compression)
+
+    def export(self, spans):
+        ok = self._append(encode_spans(spans))
+        return SpanExportResult.SUCCESS if ok else SpanExportResult.FAILURE
+
+    def force_flush(self, timeout_millis=30000):
+        return self._drain(timeout_millis)
+
+    def shutdown(self):
+        self._stop()
+
+
+class SpoolingMetricExporter(_Spooling, MetricExporter):
+    """Metric exporter that spools OTLP requests to disk before sending them."""
+
+    def __init__(self, directory, endpoint="http://localhost:4317", insecure=True,
+                 segment_bytes=8 * 1024 * 1024, max_bytes=256 * 1024 * 1024,
+                 preferred_temporality=None, preferred_aggregation=None, compression=None):
+        MetricExporter.__init__(
+            self,
+            preferred_temporality=preferred_temporality,
+            preferred_aggregation=preferred_aggregation,
+        )
+        self._start_spool(directory, endpoint, METRICS_EXPORT_METHOD, insecure, segment_bytes, max_bytes, compression)
+
+    def export(self, metrics_data, timeout_millis=10000, **kwargs):
+        ok = self._append(encode_metrics(metrics_data))
+        return MetricExportResult.SUCCESS if ok else MetricExportResult.FAILURE
+
+    def force_flush(self, timeout_millis=10000):
+        return self._drain(timeout_millis)
+
+    def shutdown(self, timeout_millis=30000, **kwargs):
+        self._stop()
+
+
+class SpoolingLogExporter(_Spooling, LogExporter):
+    """Log exporter that spools OTLP requests to disk before sending them."""
+
+    def __init__(self, directory, endpoint="http://localhost:4317", insecure=True,
+                 segment_bytes=8 * 1024 * 1024, max_bytes=256 * 1024 * 1024, compression=None):
+        self._start_spool(directory, endpoint, LOGS_EXPORT_METHOD, insecure, segment_bytes, max_bytes, compression)
+
+    def export(self, batch):
+        ok = self._append(encode_logs(batch))
+        return LogExportResult.SUCCESS if ok else LogExportResult.FAILURE
+
+    def force_flush(self, timeout_millis=30000):
+        return self._drain(timeout_millis)
+
+    def shutdown(self):
+        self._stop()
@@ -0,0 +1,4 @@
+"""Process-wide tracer, built by the shared telemetry bootstrap."""
+from lib.bootstrap import setup_telemetry
+
+tracer = setup_telemetry().tracer
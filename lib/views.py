@@ -0,0 +1,124 @@
+"""Metric views built from plain config.
+
+Each spec is a dict. ``instrument`` selects instruments by name, and
+wildcards are allowed. ``meter`` and ``type`` (a key of ``INSTRUMENT_TYPES``)
+narrow the match further. The rest of the spec shapes what is exported:
+
+- ``aggregation``: ``"exponential"`` is a base-2 exponential histogram with
+  at most ``max_size`` buckets per sign and a starting ``max_scale``.
+  ``"explicit"`` takes ``boundaries``. ``"sum"`` and ``"last_value"`` are
+  also accepted, and ``"drop"`` stops exporting the instrument.
+- ``attributes``: the attribute keys to keep. Series that differ only in
+  other keys are merged before aggregation.
+- ``rename`` and ``description``.
+
+An exponential histogram never grows past ``max_size`` buckets. It lowers
+its scale to fit the observed range instead, so memory per series is fixed
+and the relative error of any percentile is bounded by the final scale.
+"""
+from opentelemetry.sdk.metrics import (
+    Counter,
+    Histogram,
+    ObservableCounter,
+    ObservableGauge,
+    ObservableUpDownCounter,
+    UpDownCounter,
+    _Gauge,  # The synchronous gauge is still exported under its private name
+)
+from opentelemetry.sdk.metrics.view import (
+    DropAggregation,
+    ExplicitBucketHistogramAggregation,
+    ExponentialBucketHistogramAggregation,
+    LastValueAggregation,
+    SumAggregation,
+    View,
+)
+
+DEFAULT_MAX_SIZE = 160
+DEFAULT_MAX_SCALE = 20
+
+INSTRUMENT_TYPES = {
+    "counter": Counter,
+    "up_down_counter": UpDownCounter,
+    "histogram": Histogram,
+    "gauge": _Gauge,
+    "observable_counter": ObservableCounter,
+    "observable_up_down_counter": ObservableUpDownCounter,
+    "observable_gauge": ObservableGauge,
+}
+
+# Trims what SystemMetricsInstrumentor exports for a database host. Per-core CPU
+# time is summed per state, and per-connection-state network counts and
+# interpreter internals are dropped because the agent's own metrics cover them.
+SYSTEM_METRIC_VIEWS = [
+    {"instrument": "system.cpu.time", "attributes": ["state"]},
+    {"instrument": "system.network.connections", "aggregation": "drop"},
+    {"instrument": "process.*", "aggregation": "drop"},
+    {"instrument": "cpython.*", "aggregation": "drop"},
+]
+
+# Agent self-metrics span sub-millisecond probes to multi-second cycles
+AGENT_METRIC_VIEWS = [
+    {"instrument": "agent_probe_query_latency", "aggregation": "exponential"},
+    {"instrument": "agent_cycle_duration", "aggregation": "exponential"},
+]
+
+
+def _aggregation(spec):
+    kind = spec.get("aggregation")
+    if kind is None:
+        return None
+    if kind == "exponential":
+        return ExponentialBucketHistogramAggregation(
+            max_size=spec.get("max_size", DEFAULT_MAX_SIZE),
+            max_scale=spec.get("max_scale", DEFAULT_MAX_SCALE),
+        )
+    if kind == "explicit":
+        return ExplicitBucketHistogramAggregation(boundaries=spec["boundaries"])
+    if kind == "sum":
+        return SumAggregation()
+    if kind == "last_value":
+        return LastValueAggregation()
+    if kind == "drop":
+        return DropAggregation()
+    raise ValueError(f"Unknown aggregation in view for {spec.get('instrument')}: {kind}")
+
+
+def build_view(spec, exemplar_reservoir_factory=None):
+    """Turn one view spec into a ``View``."""
+    instrument_type = spec.get("type")
+    if instrument_type is not None:
+        if instrument_type not in INSTRUMENT_TYPES:
+            raise ValueError(f"Unknown instrument type in view for {spec.get('instrument')}: {instrument_type}")
+        instrument_type = INSTRUMENT_TYPES[instrument_type]
+    attributes = spec.get("attributes")
+    return View(
+        instrument_type=instrument_type,
+        instrument_name=spec.get("instrument"),
+        meter_name=spec.get("meter"),
+        name=spec.get("rename"),
+        description=spec.get("description"),
+        attribute_keys=set(attributes) if attributes is not None else None,
+        aggregation=_aggregation(spec),
+        exemplar_reservoir_factory=exemplar_reservoir_factory,
+    )
+
+
+def build_views(specs, exemplar_reservoir_factory=None):
+    """Turn view specs into ``View`` objects, all sharing one exemplar reservoir factory."""
+    return [build_view(spec, exemplar_reservoir_factory) for spec in specs]
+
+
+class FallbackView(View):
+    """A view that applies only to instruments none of ``views`` match.
+
+    The SDK creates one stream per matching view, so a catch-all view next
+    to specific ones would export those instruments twice.
+    """
+
+    def __init__(self, views, **kwargs):
+        super().__init__(**kwargs)
+        self._views = list(views)
+
+    def _match(self, instrument):
+        return super()._match(instrument) and not any(view._match(instrument) for view in self._views)
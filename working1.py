@@ -1,5 +1,3 @@
-import time
-import psutil
 from opentelemetry import metrics
 from opentelemetry.sdk.metrics import MeterProvider
 from opentelemetry.sdk.resources import Resource
@@ -8,6 +6,10 @@ from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExp
 from opentelemetry.instrumentation.system_metrics import SystemMetricsInstrumentor
 from pysyb import connect  # Sybase DB connection library
 
+from lib.pool import ConnectionPool
+from lib.procsampler import ProcessSampler
+from lib.scheduler import Probe, ProbeScheduler
+
 # Configure OpenTelemetry resources
 resource = Resource.create(attributes={"service.name": "sybase_app"})
 
@@ -23,84 +25,104 @@ SystemMetricsInstrumentor().instrument(meter_provider=meter_provider)
 # Create a meter for custom metrics
 meter = metrics.get_meter_provider().get_meter("sybase_app")
 
-# Total system memory (in bytes)
-total_memory = psutil.virtual_memory().total
+# Shared Sybase connection pool; each cycle borrows one connection
+SYBASE_DSN = "server=your_server;database=your_db;chainxacts=0"
+sybase_pool = ConnectionPool(
+    lambda: connect(dsn=SYBASE_DSN),
+    min_size=1,
+    max_size=2,
+    idle_timeout=300,
+    meter=meter,
+    name="your_server",
+)
 
-# Custom metrics: Process-level instrumentation
-def get_process_cpu_usage():
-    """Fetch CPU usage percentage of the current process."""
-    return psutil.Process().cpu_percent(interval=None)
+# Long-lived handle on this process, so cpu_percent measures between probe runs
+process_sampler = ProcessSampler()
 
-def get_process_memory_usage_percent():
-    """Fetch memory usage of the current process as a percentage of total system memory."""
-    process_memory = psutil.Process().memory_info().rss
-    return (process_memory / total_memory) * 100
+# Custom metrics: Process-level instrumentation
+def get_process_usage():
+    """Fetch CPU usage and memory usage (% of total system memory) of the current process."""
+    process_sampler.sample()
+    sample = process_sampler.latest()
+    return sample.cpu_percent, sample.memory_percent
 
 # Custom metrics: Sybase database metrics
-def get_sybase_active_connections():
+def get_sybase_active_connections(conn):
     """Fetch active connections from Sybase database."""
-    with connect(dsn="server=your_server;database=your_db;chainxacts=0") as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM master..sysprocesses WHERE status='active'")
-        active_connections = cursor.fetchone()[0]
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM master..sysprocesses WHERE status='active'")
+    active_connections = cursor.fetchone()[0]
+    cursor.close()
     return active_connections
 
-def get_sybase_transaction_rate():
+def get_sybase_transaction_rate(conn):
     """Fetch transaction rate from Sybase database."""
-    with connect(dsn="server=your_server;database=your_db;chainxacts=0") as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT COUNT(*) AS transaction_count 
-            FROM master..syslogins 
-            WHERE logindatetime > GETDATE() - 1
-        """)
-        transaction_rate = cursor.fetchone()[0]
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COUNT(*) AS transaction_count 
+        FROM master..syslogins 
+        WHERE logindatetime > GETDATE() - 1
+    """)
+    transaction_rate = cursor.fetchone()[0]
+    cursor.close()
     return transaction_rate
 
 # Custom Metrics
-process_cpu_metric = meter.create_up_down_counter(
+process_cpu_metric = meter.create_gauge(
     name="custom_process_cpu_usage_percent",
     description="CPU usage percentage of the process",
     unit="%",
 )
 
-process_memory_metric = meter.create_up_down_counter(
+process_memory_metric = meter.create_gauge(
     name="custom_process_memory_usage_percent",
     description="Memory usage percentage of the process",
     unit="%",
 )
 
-sybase_active_connections_metric = meter.create_up_down_counter(
+sybase_active_connections_metric = meter.create_gauge(
     name="sybase_active_connections",
     description="Number of active connections to Sybase",
     unit="connections",
 )
 
-sybase_transaction_rate_metric = meter.create_up_down_counter(
+sybase_transaction_rate_metric = meter.create_gauge(
     name="sybase_transaction_rate",
     description="Transaction rate in Sybase",
     unit="transactions",
 )
 
-# Function to record custom metrics
-def record_custom_metrics():
-    """Record custom metrics for process and Sybase database."""
-    # Process-level metrics
-    process_cpu_metric.add(get_process_cpu_usage())
-    process_memory_metric.add(get_process_memory_usage_percent())
+# Functions to record custom metrics, each scheduled as its own probe
+def record_process_metrics():
+    """Record custom metrics for the process."""
+    cpu_usage, memory_usage = get_process_usage()
+    process_cpu_metric.set(cpu_usage)
+    process_memory_metric.set(memory_usage)
 
-    # Sybase database metrics
-    sybase_active_connections_metric.add(get_sybase_active_connections())
-    sybase_transaction_rate_metric.add(get_sybase_transaction_rate())
+    # Logging for debugging
+    print(f"Process CPU Usage (%): {cpu_usage:.2f}")
+    print(f"Process Memory Usage (%): {memory_usage:.2f}")
+
+def record_sybase_metrics():
+    """Record custom metrics for the Sybase database."""
+    # Both queries on one pooled connection
+    with sybase_pool.connection() as conn:
+        active_connections = get_sybase_active_connections(conn)
+        transaction_rate = get_sybase_transaction_rate(conn)
+    sybase_active_connections_metric.set(active_connections)
+    sybase_transaction_rate_metric.set(transaction_rate)
 
     # Logging for debugging
-    print(f"Process CPU Usage (%): {get_process_cpu_usage():.2f}")
-    print(f"Process Memory Usage (%): {get_process_memory_usage_percent():.2f}")
-    print(f"Active Connections: {get_sybase_active_connections()}")
-    print(f"Transaction Rate: {get_sybase_transaction_rate()}")
+    print(f"Active Connections: {active_connections}")
+    print(f"Transaction Rate: {transaction_rate}")
+
+# Per-probe intervals (seconds); Sybase probes back off when the server is slow
+scheduler = ProbeScheduler([
+    Probe("process", record_process_metrics, interval=10),
+    Probe("sysprocesses", record_sybase_metrics, interval=10, jitter=1, slow_threshold=2),
+])
 
 # Application run loop
-print("Metrics collection running. Sending to OTLP endpoint...")
-while True:
-    record_custom_metrics()  # Record custom metrics
-    time.sleep(10)  # Adjust the interval as needed
+if __name__ == "__main__":
+    print("Metrics collection running. Sending to OTLP endpoint...")
+    scheduler.run_forever()